@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+プラグインの読み込み時間のベンチマーク
+Kritaの起動時に読み込まれるパッケージと、最初にダイアログを開いた時に読み込まれる
+モジュールの読み込み時間を、別のPythonプロセスの-X importtimeで計測する。
+計測値は環境によって大きく変わるため、テストではなく目安として表示する
+（起動時に読み込まないモジュールの確認はtest_import_time.pyで行う）。
+
+使い方:
+    python bench_import_time.py [--repeat 5]
+"""
+
+import sys
+import os
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 計測するモジュール（Kritaの起動時／最初にダイアログを開いた時）
+MODULES = ("r_vertical_text", "r_vertical_text.r_vertical_text")
+
+
+def cumulative_import_time_ms(stderr, module):
+    """-X importtimeの出力からモジュールの読み込み時間（子モジュールを含む）を取得"""
+    # 各行は「import time: 自身(us) | 累計(us) | モジュール名」
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module:
+            return int(cumulative) / 1000.0
+    return None
+
+
+def measure(module, repeat):
+    """別のプロセスでrepeat回読み込んだ時間（ミリ秒）の最小値"""
+    best = None
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, timeout=60)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        elapsed = cumulative_import_time_ms(result.stderr, module)
+        if elapsed is not None:
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="プラグインの読み込み時間のベンチマーク")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    args = parser.parse_args()
+
+    print(f"{'モジュール':<36} {'最小(ms)':>10}")
+    print("-" * 48)
+    for module in MODULES:
+        try:
+            elapsed = measure(module, args.repeat)
+        except RuntimeError as e:
+            print(f"{module:<36} 読み込めません: {str(e).strip().splitlines()[-1]}")
+            continue
+        print(f"{module:<36} {elapsed:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+SVG書き出し方式（fast / etree）のベンチマーク
+PyQt5やKritaが無い環境でも実行可能
+
+使い方:
+    python bench_svg_writer.py [--sizes 1000 10000 100000] [--repeat 5]
+"""
+
+import sys
+import os
+import argparse
+import time
+import tracemalloc
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from layout import compute_layout
+from svg_writer import generate_svg_from_layout, clear_svg_cache, SVG_WRITERS
+
+SAMPLE_TEXT = "吾輩は猫である。名前はまだ無い。どこで生れたかとんと見当がつかぬ。「何でも薄暗いじめじめした所で」ニャーニャー泣いていた事だけは記憶している。\n"
+
+
+def make_corpus(size):
+    """指定した文字数の日本語テキストを作成"""
+    repeat = size // len(SAMPLE_TEXT) + 1
+    return (SAMPLE_TEXT * repeat)[:size]
+
+
+def measure(layout, writer, repeat):
+    """書き出し時間（最小値）とピークメモリを計測
+
+    fastの列ごとのキャッシュの効果を除くため、毎回キャッシュを空にしてから計測する。
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        clear_svg_cache()
+        start = time.perf_counter()
+        generate_svg_from_layout(layout, "Noto Serif CJK JP", 400, "#000000", False, writer)
+        best = min(best, time.perf_counter() - start)
+
+    clear_svg_cache()
+    tracemalloc.start()
+    svg_content = generate_svg_from_layout(layout, "Noto Serif CJK JP", 400, "#000000", False, writer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, svg_content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SVG書き出し方式のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="テキストの文字数")
+    parser.add_argument("--line-feed", type=int, default=20, help="強制改行文字数")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    args = parser.parse_args()
+
+    print(f"{'文字数':>10} {'方式':>6} {'時間(ms)':>10} {'ピーク(KiB)':>12}")
+    print("-" * 44)
+    for size in args.sizes:
+        layout = compute_layout(make_corpus(size), 24, 1.2, 1.2, args.line_feed)
+        outputs = {}
+        for writer in SVG_WRITERS:
+            elapsed, peak, outputs[writer] = measure(layout, writer, args.repeat)
+            print(f"{size:>10} {writer:>6} {elapsed * 1000:>10.2f} {peak / 1024:>12.1f}")
+        if len(set(outputs.values())) != 1:
+            print(f"❌ {size}文字: 書き出し方式によって出力が異なります")
+            return 1
+    print("✅ すべての方式で同一の出力が得られました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
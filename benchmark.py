@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+縦書きテキスト生成のベンチマーク
+
+行分割（レイアウトの計算時に行うiter_line_spans）、SVG生成（generateVerticalTextSVG）、
+プレビュー描画（svgToPixmap）の所要時間を、10〜1,000,000文字の日本語テキストと
+複数の強制改行文字数で計測し、結果をJSONに保存する。
+ダイアログのメソッドはいずれもコアモジュールの関数を呼び出すだけのため、
+Kritaを使わずにコアの関数を直接計測する。プレビューはoffscreenプラットフォームで描画する。
+
+使い方:
+    python benchmark.py [--sizes 10 1000 100000] [--line-feeds 10 40] [--output result.json]
+    python benchmark.py --compare before.json   # 以前の結果と比較
+"""
+
+import sys
+import os
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import time
+
+# 画面の無い環境でもQtを使えるようにする
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from bench_svg_writer import make_corpus
+from layout import iter_line_spans, compute_layout
+from svg_writer import generate_vertical_text_svg, clear_svg_cache
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+DEFAULT_LINE_FEEDS = [5, 20, 80]
+STAGES = ("split_lines", "svg", "preview")
+
+FONT_SIZE = 24
+LINE_SPACING = 1.2
+CHAR_SPACING = 1.2
+FONT_FAMILY = "Noto Serif CJK JP"
+PREVIEW_SIZE = 350
+
+
+def clear_caches():
+    """キャッシュの効果を除くため、計測の前にキャッシュを空にする"""
+    compute_layout.cache_clear()
+    clear_svg_cache()
+
+
+def bench_split_lines(text, line_feed):
+    # レイアウトと同じく行の範囲だけを求める（行の文字列は作らない）
+    for _ in iter_line_spans(text, line_feed):
+        pass
+
+
+def bench_svg(text, line_feed):
+    generate_vertical_text_svg(text, FONT_SIZE, LINE_SPACING, CHAR_SPACING, line_feed,
+                               FONT_FAMILY, 400, "#000000", False)
+
+
+def make_preview_bench():
+    """プレビュー描画の計測関数を作成（PyQt5が無い場合はNone）"""
+    try:
+        from PyQt5.QtGui import QGuiApplication
+        from preview import PreviewParams, renderPreviewImage
+    except ImportError:
+        return None
+
+    app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+
+    def bench_preview(text, line_feed):
+        layout = compute_layout(text, FONT_SIZE, LINE_SPACING, CHAR_SPACING, line_feed)
+        params = PreviewParams(layout, FONT_FAMILY, 400, "#000000")
+        renderPreviewImage(params, PREVIEW_SIZE, PREVIEW_SIZE)
+
+    bench_preview.app = app
+    return bench_preview
+
+
+def measure(func, text, line_feed, repeat):
+    """repeat回実行した所要時間（ミリ秒）の一覧"""
+    samples = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        func(text, line_feed)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def environment():
+    """計測環境の情報"""
+    info = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "qt_platform": os.environ.get("QT_QPA_PLATFORM"),
+    }
+    try:
+        from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+        info["qt"] = QT_VERSION_STR
+        info["pyqt"] = PYQT_VERSION_STR
+    except ImportError:
+        info["qt"] = None
+    return info
+
+
+def run(sizes, line_feeds, stages, repeat):
+    """すべての組み合わせを計測して結果の一覧を返す"""
+    benches = {"split_lines": bench_split_lines, "svg": bench_svg}
+    if "preview" in stages:
+        preview = make_preview_bench()
+        if preview is None:
+            print("PyQt5が無いためプレビューの計測を省略します")
+        else:
+            benches["preview"] = preview
+
+    results = []
+    print(f"{'段階':<12} {'文字数':>9} {'改行':>5} {'最小(ms)':>11} {'中央値(ms)':>11} {'MB/s':>8}")
+    print("-" * 64)
+    for size in sizes:
+        text = make_corpus(size)
+        for line_feed in line_feeds:
+            for stage in stages:
+                func = benches.get(stage)
+                if func is None:
+                    continue
+                # 大きなテキストは1回でも十分に長いため繰り返しを減らす
+                count = repeat if size < 100000 else max(1, min(repeat, 2))
+                samples = measure(func, text, line_feed, count)
+                best = min(samples)
+                throughput = len(text.encode("utf-8")) / 1e6 / (best / 1000.0) if best else 0.0
+                results.append({
+                    "stage": stage,
+                    "size": size,
+                    "line_feed": line_feed,
+                    "repeat": count,
+                    "min_ms": best,
+                    "median_ms": statistics.median(samples),
+                    "mean_ms": statistics.fmean(samples),
+                    "samples_ms": samples,
+                })
+                print(f"{stage:<12} {size:>9} {line_feed:>5} {best:>11.3f} "
+                      f"{statistics.median(samples):>11.3f} {throughput:>8.2f}")
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    """以前の結果と比較し、threshold倍以上遅くなった組み合わせを表示"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["stage"], r["size"], r["line_feed"]): r for r in baseline["results"]}
+
+    regressions = 0
+    print()
+    print(f"{'段階':<12} {'文字数':>9} {'改行':>5} {'以前(ms)':>11} {'今回(ms)':>11} {'比率':>7}")
+    print("-" * 64)
+    for result in results:
+        old = previous.get((result["stage"], result["size"], result["line_feed"]))
+        if old is None or not old["min_ms"]:
+            continue
+        ratio = result["min_ms"] / old["min_ms"]
+        mark = " ❌" if ratio >= threshold else ""
+        regressions += ratio >= threshold
+        print(f"{result['stage']:<12} {result['size']:>9} {result['line_feed']:>5} "
+              f"{old['min_ms']:>11.3f} {result['min_ms']:>11.3f} {ratio:>7.2f}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="縦書きテキスト生成のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="テキストの文字数")
+    parser.add_argument("--line-feeds", type=int, nargs="+", default=DEFAULT_LINE_FEEDS,
+                        help="強制改行文字数")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+                        help="計測する段階")
+    parser.add_argument("--repeat", type=int, default=5, help="繰り返し回数")
+    parser.add_argument("--output", default="benchmark_results.json", help="結果を保存するJSONファイル")
+    parser.add_argument("--compare", metavar="JSON", help="比較する以前の結果")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="性能低下とみなす比率（--compare使用時）")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.line_feeds, args.stages, args.repeat)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f,
+                  ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"❌ {regressions}件の組み合わせで性能が低下しています")
+            return 1
+        print("✅ 性能の低下はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
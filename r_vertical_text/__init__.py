@@ -1 +1,24 @@
-from .r_vertical_text import *
\ No newline at end of file
+"""
+縦書きテキスト生成プラグイン
+
+Kritaの起動を遅くしないよう、ここでは拡張機能の登録に必要なモジュールだけを
+インポートする。ダイアログ（VerticalTextDialog）は最初に参照された時に読み込む。
+PyQt5が無い環境（バッチ処理など）でもQtに依存しないlayout/svg_writerなどは利用できる。
+"""
+
+import importlib
+
+from .extension import RVerticalText, registerExtension
+
+# 最初に参照された時にダイアログのモジュールから読み込む名前
+_DIALOG_ATTRIBUTES = ("VerticalTextDialog",)
+
+
+def __getattr__(name):
+    if name in _DIALOG_ATTRIBUTES:
+        module = importlib.import_module(".r_vertical_text", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+registerExtension()
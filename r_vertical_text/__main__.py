@@ -0,0 +1,7 @@
+"""python -m r_vertical_text でコマンドラインから縦書きテキストを生成"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,258 @@
+"""
+台本ファイルからの一括生成
+
+JSONまたはCSVのマニフェストに並べたテキストを、プロセスプールで並列に
+SVG（とPNG）へ変換する。ワーカーは生成したファイルをその場で書き出すため、
+終わったものから順にディスクへ保存され、メインプロセスへは結果の概要だけが返る。
+出力ファイル名はマニフェストの順番（またはname）で決まり、結果の一覧も
+マニフェストの順番で返す。
+
+    python -m r_vertical_text --manifest volume1.csv --jobs 8 -o out/
+
+マニフェストの形式:
+    JSON: [{"text": "台詞", "name": "p001", "font_size": 32}, ...]
+          または {"defaults": {...}, "entries": [...]}
+    CSV:  1行目が見出し（text, name, font_size, ...）。空欄は初期値を使う
+設定のキーはDEFAULT_TEXT_PARAMSと同じ。
+"""
+
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    from .svg_writer import DEFAULT_TEXT_PARAMS
+    from .cli import render_svg, render_png
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from svg_writer import DEFAULT_TEXT_PARAMS
+    from cli import render_svg, render_png
+
+# 1回の受け渡しでワーカーに渡すエントリー数（プロセス間通信の回数を減らす）
+BULK_CHUNK_SIZE = 32
+
+# 実行中にしておくチャンク数（ワーカー数に対する倍率）。マニフェスト全体を一度に投入しない
+BULK_PENDING_PER_WORKER = 2
+
+# エントリーの設定以外の列
+TEXT_KEY = "text"
+NAME_KEY = "name"
+
+BulkEntry = namedtuple("BulkEntry", ["index", "name", "text", "params"])
+BulkResult = namedtuple("BulkResult", ["index", "name", "paths", "chars", "bytes"])
+
+
+class BulkReport:
+    """一括生成の結果と処理速度"""
+
+    def __init__(self, results, elapsed, workers):
+        self.results = results
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def count(self):
+        return len(self.results)
+
+    @property
+    def chars(self):
+        return sum(result.chars for result in self.results)
+
+    @property
+    def bytes(self):
+        return sum(result.bytes for result in self.results)
+
+    @property
+    def entries_per_second(self):
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def chars_per_second(self):
+        return self.chars / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        """処理速度を1行で表した文字列"""
+        return (f"{self.count}件 {self.chars}文字を{self.elapsed:.2f}秒で生成しました"
+                f"（{self.workers}プロセス, {self.entries_per_second:.1f}件/秒, "
+                f"{self.chars_per_second:.0f}文字/秒, {self.bytes / 1e6:.2f}MB）")
+
+
+def _convert_value(key, value):
+    """マニフェストの値を初期値と同じ型に変換（CSVの値は文字列のため）"""
+    default = DEFAULT_TEXT_PARAMS[key]
+    if not isinstance(value, str) or isinstance(default, str):
+        return value
+    if isinstance(default, bool):
+        lowered = value.strip().lower()
+        if lowered in ("1", "true", "yes", "on"):
+            return True
+        if lowered in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"{key}の値が不正です: {value}")
+    try:
+        return type(default)(value)
+    except ValueError:
+        raise ValueError(f"{key}の値が不正です: {value}") from None
+
+
+def entry_name(value, index):
+    """マニフェストの名前を出力ファイル名に使える文字列にする
+
+    省略した場合はマニフェストの順番から付ける。数値などは文字列に変換し、
+    出力先のディレクトリの外を指す名前（パスの区切り、..、ドライブ名）はValueErrorとする。
+    """
+    if value is None or value == "":
+        return f"{index + 1:05d}"
+    name = str(value)
+    if (any(separator and separator in name for separator in ("/", "\\", os.sep, os.altsep))
+            or name in (".", "..") or os.path.splitdrive(name)[0]):
+        raise ValueError(f"名前にパスは指定できません: {name}")
+    return name
+
+
+def make_entries(records, defaults=None):
+    """マニフェストの各行（辞書）からBulkEntryの一覧を作成
+
+    空の値は初期値を使う。名前を省略した場合はマニフェストの順番から付ける。
+    名前が重複した場合、名前がパスの場合、不明な設定がある場合、行が辞書でない場合
+    （CSVの列が見出しより多い場合を含む）はValueErrorを送出する。
+    """
+    base = dict(DEFAULT_TEXT_PARAMS)
+    base.update(defaults or {})
+    entries = []
+    names = set()
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"{index + 1}件目が設定の一覧（オブジェクト）ではありません")
+        if None in record:
+            # CSVで見出しより列が多い行はcsv.DictReaderがNoneのキーにまとめる
+            raise ValueError(f"{index + 1}件目の列が見出しより多くなっています")
+        if TEXT_KEY not in record or record[TEXT_KEY] is None:
+            raise ValueError(f"{index + 1}件目にtextがありません")
+        unknown = set(record).difference(DEFAULT_TEXT_PARAMS, (TEXT_KEY, NAME_KEY))
+        if unknown:
+            raise ValueError(f"不明な設定です: {', '.join(sorted(unknown))}")
+
+        params = dict(base)
+        for key, value in record.items():
+            if key in DEFAULT_TEXT_PARAMS and value not in (None, ""):
+                params[key] = _convert_value(key, value)
+
+        name = entry_name(record.get(NAME_KEY), index)
+        if name in names:
+            raise ValueError(f"名前が重複しています: {name}")
+        names.add(name)
+        entries.append(BulkEntry(index, name, record[TEXT_KEY], params))
+    return entries
+
+
+def load_manifest(path, encoding="utf-8", defaults=None):
+    """JSONまたはCSVのマニフェストを読み込む（拡張子で判別）
+
+    defaultsはマニフェストで省略した設定の値。JSONのdefaultsはこれより優先する。
+    """
+    defaults = dict(defaults or {})
+    if os.path.splitext(path)[1].lower() == ".csv":
+        with open(path, "r", encoding=encoding, newline="") as f:
+            return make_entries(csv.DictReader(f), defaults)
+
+    with open(path, "r", encoding=encoding) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        manifest_defaults = data.get("defaults")
+        if manifest_defaults is None:
+            manifest_defaults = {}
+        if not isinstance(manifest_defaults, dict):
+            raise ValueError("defaultsが設定の一覧（オブジェクト）ではありません")
+        defaults.update(manifest_defaults)
+        data = data.get("entries", [])
+    if not isinstance(data, list):
+        raise ValueError("エントリーの一覧（配列）がありません")
+    return make_entries(data, defaults)
+
+
+def _render_chunk(chunk, output_dir, formats, writer, background, metrics_for):
+    """ワーカーで複数のエントリーを生成してファイルに書き出す"""
+    results = []
+    for entry in chunk:
+        text = entry.text.rstrip("\n")
+        paths = []
+        size = 0
+        if "svg" in formats:
+            data = render_svg(text, entry.params, writer, metrics_for).encode("utf-8")
+            paths.append(_write_file(output_dir, entry.name + ".svg", data))
+            size += len(data)
+        if "png" in formats:
+            data = render_png(text, entry.params, background, metrics_for)
+            paths.append(_write_file(output_dir, entry.name + ".png", data))
+            size += len(data)
+        results.append(BulkResult(entry.index, entry.name, paths, len(text), size))
+    return results
+
+
+def _write_file(output_dir, filename, data):
+    path = os.path.join(output_dir, filename)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _chunks(entries, size):
+    for start in range(0, len(entries), size):
+        yield entries[start:start + size]
+
+
+def render_bulk(entries, output_dir, formats=("svg",), workers=None, writer=None,
+                background=None, chunk_size=BULK_CHUNK_SIZE, progress=None, metrics_for=None):
+    """エントリーを並列に生成してoutput_dirに書き出し、BulkReportを返す
+
+    workersを省略した場合はCPUの数、1の場合はプロセスを作らずに生成する。
+    progressを指定すると、チャンクが終わるたびに(完了数, 総数)で呼び出す。
+    metrics_forはSVGとPNGのキャンバスを求める送り幅のメトリクス（cli.render_svgを参照）。
+    ワーカーへ渡すため、モジュールの関数（cli.measure_font_metricsなど）を指定する。
+    """
+    entries = list(entries)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries) or 1))
+    # エントリーが少ない場合もワーカーに行き渡るようにチャンクを小さくする
+    chunk_size = max(1, min(chunk_size, -(-len(entries) // workers)))
+    formats = tuple(formats)
+    results = [None] * len(entries)
+    done = 0
+
+    def collect(chunk_results):
+        nonlocal done
+        for result in chunk_results:
+            results[result.index] = result
+        done += len(chunk_results)
+        if progress is not None:
+            progress(done, len(entries))
+
+    # マニフェストのindexをそのまま結果の位置に使うため、並び順を0からに揃える
+    entries = [entry._replace(index=index) for index, entry in enumerate(entries)]
+
+    start = time.perf_counter()
+    if workers == 1:
+        for chunk in _chunks(entries, chunk_size):
+            collect(_render_chunk(chunk, output_dir, formats, writer, background, metrics_for))
+    else:
+        chunks = _chunks(entries, chunk_size)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            max_pending = workers * BULK_PENDING_PER_WORKER
+            while True:
+                for chunk in chunks:
+                    pending.add(executor.submit(_render_chunk, chunk, output_dir, formats,
+                                                writer, background, metrics_for))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    collect(future.result())
+    elapsed = time.perf_counter() - start
+    return BulkReport(results, elapsed, workers)
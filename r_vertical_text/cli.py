@@ -0,0 +1,267 @@
+"""
+コマンドラインからの縦書きテキストの生成
+
+Kritaを起動せずに、標準入力またはファイルのテキストからSVG（とPNG）を生成する。
+
+    python -m r_vertical_text --font-size 32 --line-feed 8 < serif.txt > serif.svg
+    python -m r_vertical_text --format both --output-dir out/ page1/*.txt
+    python -m r_vertical_text --manifest volume1.csv --jobs 8 --output-dir out/
+
+マニフェストを指定した場合はbulkモジュールで並列に生成する。
+
+PNGはoffscreenプラットフォームのQtでプレビューと同じ方法で描画する。
+"""
+
+import argparse
+import os
+import sys
+
+try:
+    from .layout import compute_layout
+    from .svg_writer import (generate_svg_from_layout, primary_font_family, DEFAULT_TEXT_PARAMS,
+                             SVG_MARGIN, SVG_WRITERS)
+    from .vertical_forms import apply_vertical_forms, VERTICAL_FORMS_MODES
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from layout import compute_layout
+    from svg_writer import (generate_svg_from_layout, primary_font_family, DEFAULT_TEXT_PARAMS,
+                            SVG_MARGIN, SVG_WRITERS)
+    from vertical_forms import apply_vertical_forms, VERTICAL_FORMS_MODES
+
+OUTPUT_FORMATS = ("svg", "png", "both")
+
+# 標準入力から読み込んだテキストの出力ファイル名
+STDIN_NAME = "stdin"
+
+
+def layout_for(text, params):
+    """設定の辞書（DEFAULT_TEXT_PARAMSと同じキー）からレイアウトを計算"""
+    text = apply_vertical_forms(text, params["vertical_forms"])
+    return compute_layout(text, params["font_size"], params["line_spacing"],
+                          params["char_spacing"], params["line_feed"], params["text_direction"])
+
+
+def metrics_for_params(params, metrics_for=None):
+    """設定のフォントの送り幅のメトリクス（metrics_forを省略した場合はNone）"""
+    if metrics_for is None:
+        return None
+    return metrics_for(params["font_family"], params["font_weight"])
+
+
+def render_svg(text, params, writer=None, metrics_for=None):
+    """テキストのSVGを生成
+
+    metrics_for(フォントファミリー, ウェイト)で送り幅のメトリクスを返す関数を指定すると、
+    ダイアログと同じくフォントの送り幅からキャンバスを求める（measure_font_metricsを参照）。
+    省略した場合はQtを使わず、すべての文字を1em送りとみなす。
+    """
+    layout = layout_for(text, params)
+    return generate_svg_from_layout(layout, params["font_family"], params["font_weight"],
+                                    params["text_color"], params["force_monospace"], writer,
+                                    metrics_for_params(params, metrics_for),
+                                    params["vertical_forms"])
+
+
+_qt_app = None
+
+
+def ensure_qt_application():
+    """画面の無い環境でも描画できるよう、offscreenプラットフォームでQtを初期化"""
+    global _qt_app
+    from PyQt5.QtGui import QGuiApplication
+    app = QGuiApplication.instance()
+    if app is None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        app = _qt_app = QGuiApplication(sys.argv[:1])
+    return app
+
+
+def measure_font_metrics(font_family, font_weight):
+    """フォントから測った送り幅のメトリクス（PyQt5が無い場合はNoneで、1em送りとみなす）
+
+    Qtのアプリケーションを作成するため、--measure-fontsを指定した場合だけ使う。
+    """
+    try:
+        ensure_qt_application()
+        try:
+            from .font_model import advanceMetricsFor
+        except ImportError:
+            from font_model import advanceMetricsFor
+    except ImportError:
+        return None
+    return advanceMetricsFor(primary_font_family(font_family), font_weight)
+
+
+def render_png(text, params, background=None, metrics_for=None):
+    """テキストをPNGのバイト列に描画
+
+    キャンバスはrender_svgと同じく、metrics_forのメトリクスで求めた大きさに同じ余白を付ける。
+    """
+    ensure_qt_application()
+    from PyQt5.QtCore import QBuffer, QByteArray, QIODevice, Qt
+    from PyQt5.QtGui import QColor
+    try:
+        from .preview import PreviewParams, renderPreviewImage
+    except ImportError:
+        from preview import PreviewParams, renderPreviewImage
+
+    layout = layout_for(text, params)
+    content_width, content_height = layout.content_size(metrics_for_params(params, metrics_for))
+    width = int(content_width + SVG_MARGIN * 2 + 0.5)
+    height = int(content_height + SVG_MARGIN * 2 + 0.5)
+    preview_params = PreviewParams(layout, params["font_family"], params["font_weight"],
+                                   params["text_color"])
+    image = renderPreviewImage(preview_params, width, height,
+                               background=Qt.transparent if background is None else QColor(background))
+
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    buffer.close()
+    return bytes(data)
+
+
+def build_parser():
+    """コマンドライン引数の定義"""
+    defaults = DEFAULT_TEXT_PARAMS
+    parser = argparse.ArgumentParser(
+        prog="python -m r_vertical_text",
+        description="縦書きテキストのSVG/PNGを生成します（Krita不要）")
+    parser.add_argument("inputs", nargs="*", metavar="FILE",
+                        help="テキストファイル（省略時または - は標準入力）")
+    parser.add_argument("--font-size", type=int, default=defaults["font_size"],
+                        help="フォントサイズ（px）")
+    parser.add_argument("--line-spacing", type=float, default=defaults["line_spacing"],
+                        help="行間（フォントサイズに対する倍率）")
+    parser.add_argument("--char-spacing", type=float, default=defaults["char_spacing"],
+                        help="文字間隔（フォントサイズに対する倍率）")
+    parser.add_argument("--line-feed", type=int, default=defaults["line_feed"],
+                        help="強制改行文字数")
+    parser.add_argument("--font-family", default=defaults["font_family"], help="フォントファミリー")
+    parser.add_argument("--font-weight", type=int, default=defaults["font_weight"],
+                        help="フォントウェイト（100〜900）")
+    parser.add_argument("--color", default=defaults["text_color"], help="文字色（#rrggbb）")
+    parser.add_argument("--monospace", action="store_true", default=defaults["force_monospace"],
+                        help="強制的に等幅にする")
+    parser.add_argument("--direction", choices=("right_to_left", "left_to_right"),
+                        default=defaults["text_direction"], help="行の並び方向")
+    parser.add_argument("--vertical-forms", choices=VERTICAL_FORMS_MODES,
+                        default=defaults["vertical_forms"],
+                        help="句読点や括弧の縦書き用の字形（置き換え/文字の向きの指定/そのまま）")
+    parser.add_argument("--measure-fonts", action="store_true",
+                        help="キャンバスの大きさをフォントの送り幅から求める（PyQt5が必要）")
+    parser.add_argument("--writer", choices=SVG_WRITERS, default=None, help="SVGの書き出し方式")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="svg", help="出力形式")
+    parser.add_argument("--background", default=None,
+                        help="PNGの背景色（省略時は透明）")
+    parser.add_argument("--output-dir", "-o", default=None,
+                        help="出力先のディレクトリ（省略時は標準出力）")
+    parser.add_argument("--encoding", default="utf-8",
+                        help="入力ファイルと標準入力の文字コード")
+    parser.add_argument("--manifest", default=None, metavar="JSON_OR_CSV",
+                        help="一括生成するテキストと設定の一覧（--output-dirが必要）")
+    parser.add_argument("--jobs", "-j", type=int, default=None,
+                        help="一括生成のプロセス数（省略時はCPUの数）")
+    return parser
+
+
+def params_from_args(args):
+    """コマンドライン引数から設定の辞書を作成"""
+    return {
+        "font_size": args.font_size,
+        "line_spacing": args.line_spacing,
+        "char_spacing": args.char_spacing,
+        "line_feed": args.line_feed,
+        "font_family": args.font_family,
+        "font_weight": args.font_weight,
+        "text_color": args.color,
+        "force_monospace": args.monospace,
+        "text_direction": args.direction,
+        "vertical_forms": args.vertical_forms,
+    }
+
+
+def read_inputs(inputs, encoding):
+    """(名前, テキスト)を順に返す
+
+    標準入力もロケールの文字コードではなくencodingで読む。
+    """
+    for path in inputs or ["-"]:
+        if path == "-":
+            yield STDIN_NAME, sys.stdin.buffer.read().decode(encoding)
+        else:
+            with open(path, "r", encoding=encoding) as f:
+                text = f.read()
+            yield os.path.splitext(os.path.basename(path))[0], text
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    params = params_from_args(args)
+    metrics_for = measure_font_metrics if args.measure_fonts else None
+
+    if args.manifest is not None:
+        if args.output_dir is None:
+            parser.error("--manifestには--output-dirが必要です")
+        if args.inputs:
+            parser.error("--manifestとテキストファイルは同時に指定できません")
+        return run_manifest(args, params, metrics_for)
+
+    if args.output_dir is None:
+        if len(args.inputs) > 1:
+            parser.error("複数のファイルを処理する場合は--output-dirを指定してください")
+        if args.format == "both":
+            parser.error("--format bothには--output-dirが必要です")
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    for name, text in read_inputs(args.inputs, args.encoding):
+        # ファイル末尾の改行は空の行として扱わない
+        text = text.rstrip("\n")
+
+        if args.format in ("svg", "both"):
+            svg_content = render_svg(text, params, args.writer, metrics_for)
+            if args.output_dir is None:
+                # SVGはUTF-8と宣言しているため、ロケールの文字コードによらずUTF-8で書き出す
+                sys.stdout.buffer.write(svg_content.encode("utf-8"))
+                sys.stdout.flush()
+            else:
+                with open(os.path.join(args.output_dir, name + ".svg"), "w", encoding="utf-8") as f:
+                    f.write(svg_content)
+
+        if args.format in ("png", "both"):
+            try:
+                png_data = render_png(text, params, args.background, metrics_for)
+            except ImportError:
+                print("PNGの出力にはPyQt5が必要です", file=sys.stderr)
+                return 1
+            if args.output_dir is None:
+                sys.stdout.buffer.write(png_data)
+                sys.stdout.flush()
+            else:
+                with open(os.path.join(args.output_dir, name + ".png"), "wb") as f:
+                    f.write(png_data)
+    return 0
+
+
+def run_manifest(args, params, metrics_for=None):
+    """マニフェストのテキストを並列に生成し、処理速度を標準エラーに表示"""
+    try:
+        from .bulk import load_manifest, render_bulk
+    except ImportError:
+        from bulk import load_manifest, render_bulk
+
+    # コマンドラインで指定した設定をマニフェストの初期値にする
+    try:
+        entries = load_manifest(args.manifest, args.encoding, defaults=params)
+    except (OSError, ValueError) as e:
+        print(f"マニフェストを読み込めません: {e}", file=sys.stderr)
+        return 1
+
+    formats = ("svg", "png") if args.format == "both" else (args.format,)
+    report = render_bulk(entries, args.output_dir, formats, args.jobs, args.writer,
+                         args.background, metrics_for=metrics_for)
+    print(report.summary(), file=sys.stderr)
+    return 0
@@ -0,0 +1,166 @@
+"""
+デバッグログの非同期書き出し
+
+メッセージはキューに積むだけで呼び出し元に戻り、ファイルへの書き込みは
+バックグラウンドのスレッドがまとめて行う。ファイルが一定のサイズを超えたら
+古いログを別名に退避する。無効にした場合はキューにも積まない。
+"""
+
+import atexit
+import datetime
+import os
+import queue
+import threading
+import time
+
+# ログファイルのパス
+DEFAULT_LOG_PATH = os.path.join(os.path.expanduser("~"), "krita_plugin_debug.log")
+
+# ログファイルの最大サイズ（バイト）と退避しておく世代数
+MAX_LOG_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# 書き込みをまとめる間隔（秒）
+FLUSH_INTERVAL = 0.5
+
+# 環境変数でログを無効にできる（"0"で無効）
+LOG_ENV_VAR = "R_VERTICAL_TEXT_DEBUG_LOG"
+
+_STOP = object()
+
+
+class DebugLogger:
+    """キューとバックグラウンドスレッドでファイルに書き出すロガー
+
+    enabledが偽の間はlog()が即座に戻るため、呼び出しを残したままでも
+    負荷にならない。メッセージの組み立て自体が重い場合は、呼び出し元で
+    enabledを確認してから組み立てる。
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, max_bytes=MAX_LOG_BYTES,
+                 backup_count=LOG_BACKUP_COUNT, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = enabled
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def set_enabled(self, enabled):
+        """ログの有効・無効を切り替える"""
+        self.enabled = bool(enabled)
+
+    def log(self, message):
+        """メッセージをキューに積む（ファイルへの書き込みは待たない）"""
+        if not self.enabled:
+            return
+        self._queue.put((time.time(), message))
+        if self._thread is None:
+            self._start()
+
+    def flush(self, timeout=5.0):
+        """キューに積まれたメッセージの書き込み完了を待つ"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """残りのメッセージを書き込んでスレッドを終了する"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="debug-log", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            waiters = []
+            stop = False
+            # 少し待ってから、溜まっているメッセージをまとめて取り出す
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if stop or waiters:
+                    # 終了・フラッシュの要求は待たずに残りを取り出す
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                return
+
+    def _write(self, batch):
+        lines = []
+        for timestamp, message in batch:
+            time_text = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            lines.append(f"[{time_text}] {message}\n")
+        try:
+            self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+        except Exception as e:
+            print(f"ログファイル出力エラー: {e}")
+
+    def _rotate(self):
+        """ファイルが最大サイズを超えていれば古いログを退避する"""
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+# プラグイン全体で共有するロガー
+debug_logger = DebugLogger(enabled=os.environ.get(LOG_ENV_VAR, "1") != "0")
+
+
+def log(message):
+    """共有ロガーにメッセージを書き出す"""
+    debug_logger.log(message)
+
+
+@atexit.register
+def _close_logger():
+    """インタープリター終了前に残りのメッセージを書き込む"""
+    debug_logger.close()
@@ -0,0 +1,130 @@
+"""
+診断パネル
+
+処理段階ごとの所要時間の集計（timingモジュール）を表で表示し、
+JSONとして保存できるようにする。縦書きダイアログでCtrl+Shift+Dを押すと開く。
+"""
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog,
+                             QMessageBox)
+from PyQt5.QtCore import Qt
+
+try:
+    from .timing import timings, HISTOGRAM_BOUNDS_MS
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from timing import timings, HISTOGRAM_BOUNDS_MS
+
+# 診断パネルを開くショートカット
+DIAGNOSTICS_SHORTCUT = "Ctrl+Shift+D"
+
+# 表の列（見出し, 集計結果のキー）
+DIAGNOSTICS_COLUMNS = (
+    ("段階", None),
+    ("回数", "count"),
+    ("合計(ms)", "total_ms"),
+    ("平均(ms)", "mean_ms"),
+    ("最小(ms)", "min_ms"),
+    ("p50(ms)", "p50_ms"),
+    ("p95(ms)", "p95_ms"),
+    ("最大(ms)", "max_ms"),
+    ("分布", None),
+)
+
+
+def formatHistogram(histogram):
+    """ヒストグラムを「≤1ms:3 ≤2.5ms:1」の形式の文字列にする"""
+    parts = []
+    for bucket in histogram:
+        if not bucket["count"]:
+            continue
+        if bucket["le_ms"] is None:
+            label = f">{HISTOGRAM_BOUNDS_MS[-1]:g}ms"
+        else:
+            label = f"≤{bucket['le_ms']:g}ms"
+        parts.append(f"{label}:{bucket['count']}")
+    return " ".join(parts)
+
+
+class DiagnosticsDialog(QDialog):
+    """所要時間の集計を表示する診断パネル"""
+
+    def __init__(self, parent=None, source=timings):
+        super().__init__(parent)
+        self.source = source
+        self.setWindowTitle("診断情報")
+        self.resize(760, 360)
+
+        layout = QVBoxLayout()
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        self.table = QTableWidget(0, len(DIAGNOSTICS_COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _ in DIAGNOSTICS_COLUMNS])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.refresh_button = QPushButton("更新")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.reset_button = QPushButton("リセット")
+        self.reset_button.clicked.connect(self.resetTimings)
+        self.save_button = QPushButton("JSONに保存")
+        self.save_button.clicked.connect(self.saveJson)
+        self.close_button = QPushButton("閉じる")
+        self.close_button.clicked.connect(self.accept)
+
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addWidget(self.reset_button)
+        button_layout.addStretch()
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.close_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        """集計結果を表に反映"""
+        stages = self.source.snapshot()["stages"]
+        self.status_label.setText(
+            "計測: " + ("有効" if self.source.enabled else "無効")
+            + f"（{len(stages)}段階）")
+
+        self.table.setRowCount(len(stages))
+        for row, name in enumerate(sorted(stages)):
+            stats = stages[name]
+            for column, (_, key) in enumerate(DIAGNOSTICS_COLUMNS):
+                if column == 0:
+                    text = name
+                elif key is None:
+                    text = formatHistogram(stats["histogram"])
+                elif key == "count":
+                    text = str(stats[key])
+                else:
+                    text = f"{stats[key]:.2f}"
+                item = QTableWidgetItem(text)
+                if key is not None:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+    def resetTimings(self):
+        """集計結果を破棄"""
+        self.source.reset()
+        self.refresh()
+
+    def saveJson(self):
+        """集計結果をJSONファイルに保存"""
+        path, _ = QFileDialog.getSaveFileName(self, "診断情報を保存", "timings.json",
+                                              "JSON (*.json)")
+        if not path:
+            return
+        try:
+            self.source.dump_json(path)
+        except OSError as e:
+            QMessageBox.warning(self, "エラー", f"保存に失敗しました: {e}")
@@ -0,0 +1,83 @@
+"""
+Kritaの拡張機能
+
+Kritaの起動時に読み込まれるのはこのモジュールだけで、メニューの登録
+（createActions）に必要なもの以外はインポートしない。ダイアログ、SVG生成、
+QtSvgなどは最初にダイアログを開いた時に読み込む。
+ダイアログはウィンドウごとに1つ作成して閉じても破棄せず、2回目以降は
+フォントの列挙やウィジェットの構築をせずに前回の設定のまま開く。
+"""
+
+from functools import partial
+
+try:
+    from krita import Extension, Krita
+except ImportError:
+    # Krita環境外でのテスト用
+    class Extension:
+        def __init__(self, parent):
+            self.parent = parent
+        def setup(self):
+            pass
+        def createActions(self, window):
+            pass
+
+    class Krita:
+        @staticmethod
+        def instance():
+            return None
+
+
+def dialogModule():
+    """ダイアログのモジュールを読み込む（2回目以降はインポート済みのものを返す）"""
+    try:
+        from . import r_vertical_text
+    except ImportError:
+        # プラグインディレクトリを直接パスに追加した場合（テスト用）
+        import r_vertical_text
+    return r_vertical_text
+
+
+class RVerticalText(Extension):
+    def __init__(self, parent):
+        super().__init__(parent)
+        # ウィンドウごとのダイアログ（ウィンドウが無い場合のキーはNone）
+        self._dialogs = {}
+
+    def setup(self):
+        pass
+
+    def createActions(self, window):
+        action = window.createAction("rVerticalText", "縦書きテキスト生成", "tools/scripts")
+        action.triggered.connect(partial(self.showVerticalTextDialog, window))
+        # ウィンドウを閉じたらダイアログも破棄する
+        closed = getattr(window, "windowClosed", None)
+        if closed is not None:
+            closed.connect(partial(self.discardDialog, window))
+
+    def dialogFor(self, window=None):
+        """ウィンドウのダイアログを取得（初めての場合は作成する）"""
+        dialog = self._dialogs.get(window)
+        if dialog is None:
+            # ダイアログのクラスは作成する時にモジュールから取得する（テストで差し替えられるように）
+            parent = window.qwindow() if window is not None else None
+            dialog = dialogModule().VerticalTextDialog(parent)
+            self._dialogs[window] = dialog
+        return dialog
+
+    def discardDialog(self, window=None):
+        """ウィンドウのダイアログを破棄"""
+        dialog = self._dialogs.pop(window, None)
+        if dialog is not None:
+            dialog.deleteLater()
+
+    def showVerticalTextDialog(self, window=None, *args):
+        # triggeredのchecked引数は無視する
+        self.dialogFor(window).exec_()
+
+
+def registerExtension():
+    """拡張機能をKritaに追加（Krita環境外では登録しない）"""
+    krita = Krita.instance()
+    if krita is not None:
+        krita.addExtension(RVerticalText(krita))
@@ -0,0 +1,222 @@
+"""
+フォントファミリー選択用のモデル
+
+数千のフォントを一度にコンボボックスへ追加せず、表示に必要な行だけを
+少しずつ読み込む（canFetchMore / fetchMore）。入力中のフォント名の補完は
+前方一致の索引から候補を引くため、一覧を先頭から走査しない。
+フォントが持つウェイトはQFontDatabaseのスタイル情報からファミリーごとに一度だけ求める。
+SVGのキャンバスの大きさに使う文字の送り幅もフォントごとに測って保持する。
+"""
+
+from functools import lru_cache
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QFont, QFontDatabase, QFontMetricsF
+from PyQt5.QtWidgets import QCompleter
+
+try:
+    from .fonts import FontPrefixIndex, AdvanceMetrics
+    from .preview import QT_FONT_WEIGHTS, qtFontWeight
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from fonts import FontPrefixIndex, AdvanceMetrics
+    from preview import QT_FONT_WEIGHTS, qtFontWeight
+
+# 一度に読み込む行数
+FONT_FETCH_BATCH = 100
+
+# 補完候補として表示する最大件数
+FONT_COMPLETION_LIMIT = 50
+
+# 送り幅を測る時のピクセルサイズ（emに対する比を求めるため大きめにする）
+METRICS_PIXEL_SIZE = 100
+
+# 送り幅のメトリクスを保持するフォントの数
+ADVANCE_METRICS_CACHE_SIZE = 32
+
+
+class FontListModel(QAbstractListModel):
+    """フォント一覧を必要な分だけ行として公開するモデル"""
+
+    def __init__(self, fonts=(), parent=None):
+        super().__init__(parent)
+        self._fonts = []
+        self._loaded = 0
+        self._index = FontPrefixIndex()
+        self.setFonts(fonts)
+
+    def fonts(self):
+        """フォント一覧全体を取得"""
+        return self._fonts
+
+    def prefixIndex(self):
+        """前方一致検索用の索引を取得"""
+        return self._index
+
+    def setFonts(self, fonts):
+        """フォント一覧を差し替える"""
+        self.beginResetModel()
+        self._fonts = list(fonts)
+        self._loaded = min(FONT_FETCH_BATCH, len(self._fonts))
+        self._index.set_fonts(self._fonts)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._loaded
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self._loaded:
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._fonts[index.row()]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self._loaded < len(self._fonts)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self._fetchTo(self._loaded + FONT_FETCH_BATCH)
+
+    def _fetchTo(self, count):
+        count = min(count, len(self._fonts))
+        if count <= self._loaded:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, count - 1)
+        self._loaded = count
+        self.endInsertRows()
+
+    def rowForFamily(self, family):
+        """ファミリー名の行番号を取得（必要なら行を読み込む。一覧に無ければ-1）"""
+        row = self._index.row(family)
+        if row >= self._loaded:
+            self._fetchTo(row + 1)
+        return row
+
+
+class FontCompletionModel(QAbstractListModel):
+    """入力中の文字列に前方一致するフォントだけを持つ補完用のモデル"""
+
+    def __init__(self, prefix_index, parent=None):
+        super().__init__(parent)
+        self._prefix_index = prefix_index
+        self._matches = []
+
+    def setPrefix(self, prefix):
+        """候補を入力中の文字列で絞り込む"""
+        matches = self._prefix_index.prefix_matches(prefix, FONT_COMPLETION_LIMIT) if prefix else []
+        if matches == self._matches:
+            return
+        self.beginResetModel()
+        self._matches = matches
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._matches)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._matches):
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._matches[index.row()]
+        return None
+
+
+def createFontCompleter(font_model, line_edit, parent=None):
+    """索引で候補を絞り込む補完を作成してline_editに接続
+
+    候補の絞り込みはモデル側で済ませるため、QCompleter自身の
+    フィルタリング（全候補の走査）は行わない。
+    """
+    completion_model = FontCompletionModel(font_model.prefixIndex(), parent)
+    font_model.modelReset.connect(lambda: completion_model.setPrefix(line_edit.text()))
+
+    completer = QCompleter(completion_model, parent)
+    completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+    completer.setCaseSensitivity(Qt.CaseInsensitive)
+
+    def onTextEdited(text):
+        completion_model.setPrefix(text)
+        if completion_model.rowCount():
+            completer.complete()
+
+    line_edit.textEdited.connect(onTextEdited)
+    return completer
+
+
+def cssFontWeight(qt_weight):
+    """Qtのフォントウェイトを最も近いCSSのフォントウェイトに変換"""
+    return min(QT_FONT_WEIGHTS, key=lambda css: (abs(QT_FONT_WEIGHTS[css] - qt_weight), css))
+
+
+class FontWeightResolver:
+    """ファミリーが持つウェイトをQFontDatabaseのスタイル情報から求める
+
+    結果はファミリーごとに保持するため、2回目以降は辞書の参照だけで済む。
+    """
+
+    def __init__(self):
+        self._database = None
+        self._weights = {}
+
+    def weights(self, family, known_fonts=None):
+        """ファミリーが持つCSSのウェイトを昇順のタプルで取得（不明なファミリーは空）
+
+        known_fonts（FontPrefixIndexなど）を指定した場合、含まれないファミリー名は
+        調べずに空のタプルを返し、保持もしない（入力途中のフォント名で増え続けないように）。
+        """
+        if known_fonts is not None and family not in known_fonts:
+            return ()
+        weights = self._weights.get(family)
+        if weights is None:
+            if self._database is None:
+                self._database = QFontDatabase()
+            database = self._database
+            found = set()
+            for style in database.styles(family):
+                qt_weight = database.weight(family, style)
+                if qt_weight >= 0:
+                    found.add(cssFontWeight(qt_weight))
+            weights = self._weights[family] = tuple(sorted(found))
+        return weights
+
+    def __len__(self):
+        """ウェイトを保持しているファミリーの数"""
+        return len(self._weights)
+
+    def clear(self):
+        """保持しているウェイトを破棄（フォント一覧が変わった場合）"""
+        self._database = None
+        self._weights.clear()
+
+
+# ダイアログをまたいで共有するウェイトの解決結果
+font_weight_resolver = FontWeightResolver()
+
+
+class QtAdvanceMetrics(AdvanceMetrics):
+    """QFontMetricsFで回転する文字の送り幅を測るメトリクス"""
+
+    def __init__(self, family, weight):
+        super().__init__()
+        font = QFont()
+        font.setFamily(family)
+        font.setPixelSize(METRICS_PIXEL_SIZE)
+        font.setWeight(qtFontWeight(weight))
+        self._metrics = QFontMetricsF(font)
+
+    def measure(self, char):
+        return self._metrics.horizontalAdvance(char) / METRICS_PIXEL_SIZE
+
+
+@lru_cache(maxsize=ADVANCE_METRICS_CACHE_SIZE)
+def advanceMetricsFor(family, weight):
+    """フォントごとに共有する送り幅のメトリクスを取得"""
+    return QtAdvanceMetrics(family, weight)
@@ -0,0 +1,284 @@
+"""
+システムフォント一覧の取得とディスクキャッシュ、縦書きの送り幅
+
+並べ替え済みのフォント一覧をJSONとして保存しておき、ダイアログを開く際は
+保存済みの一覧をすぐに使う。フォントディレクトリの更新時刻から作った
+フィンガープリントを別スレッドで計算し、変化していた場合だけ一覧を作り直す。
+"""
+
+import bisect
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import unicodedata
+from functools import lru_cache
+
+# 日本語フォントと判定するキーワード（小文字）
+JAPANESE_FONT_KEYWORDS = ('noto', 'source', 'hiragino', 'yu', 'meiryo', 'ms gothic',
+                          'ms mincho', 'cjk', 'japanese')
+
+# 一覧の先頭に置くデフォルトフォント（この順に並べる）
+DEFAULT_FONTS = ("Noto Serif CJK JP", "Source Han Serif JP", "Hiragino Mincho ProN",
+                 "Yu Mincho", "MS Mincho")
+
+# フォントを取得できない場合のフォールバック用のフォント一覧
+FALLBACK_FONTS = list(DEFAULT_FONTS) + ["serif", "sans-serif"]
+
+# CSSのフォントウェイトと表示名
+FONT_WEIGHT_NAMES = {
+    100: "Thin",
+    200: "Extra Light",
+    300: "Light",
+    400: "Regular",
+    500: "Medium",
+    600: "Semi Bold",
+    700: "Bold",
+    800: "Extra Bold",
+    900: "Black",
+}
+FONT_WEIGHTS = tuple(sorted(FONT_WEIGHT_NAMES))
+
+# フォント名に含まれるウェイトのキーワード
+# 「extra bold」が「bold」に一致しないよう、複合語を先に判定する
+FONT_WEIGHT_KEYWORDS = (
+    (800, ('extra bold', 'extrabold', 'ultra bold', 'ultrabold', '800')),
+    (600, ('semi bold', 'semibold', 'demi bold', 'demibold', '600')),
+    (200, ('extra light', 'extralight', 'ultra light', 'ultralight', '200')),
+    (900, ('black', 'heavy', '900')),
+    (700, ('bold', '700')),
+    (500, ('medium', '500')),
+    (400, ('regular', 'normal', '400')),
+    (300, ('light', '300')),
+    (100, ('thin', 'hairline', '100')),
+)
+
+# キャッシュの形式を変更した場合は値を上げて古いキャッシュを無効にする
+FONT_CACHE_VERSION = 1
+
+
+def is_japanese_font(family):
+    """日本語フォントと思われるファミリー名か"""
+    lower = family.lower()
+    return any(keyword in lower for keyword in JAPANESE_FONT_KEYWORDS)
+
+
+def sort_font_families(families):
+    """フォント一覧を並べ替え
+
+    デフォルトフォントを先頭に、次に日本語フォント、その他のフォントを
+    それぞれアルファベット順に並べる。
+    """
+    available = set(families)
+    defaults = [family for family in DEFAULT_FONTS if family in available]
+    rest = available.difference(defaults)
+
+    japanese_fonts = sorted(family for family in rest if is_japanese_font(family))
+    other_fonts = sorted(rest.difference(japanese_fonts))
+    return defaults + japanese_fonts + other_fonts
+
+
+@lru_cache(maxsize=1024)
+def weight_from_name(font_name):
+    """フォント名に含まれるキーワードからウェイトを推定（キーワードが無ければNone）"""
+    lower = font_name.lower()
+    for weight, keywords in FONT_WEIGHT_KEYWORDS:
+        if any(keyword in lower for keyword in keywords):
+            return weight
+    return None
+
+
+def nearest_weight(weight, weights):
+    """weightsの中からweightに最も近いウェイトを選ぶ（同じ距離なら細い方）"""
+    if not weights:
+        return weight
+    return min(weights, key=lambda candidate: (abs(candidate - weight), candidate))
+
+
+class FontPrefixIndex:
+    """フォント名の前方一致検索用の索引
+
+    小文字にしたファミリー名を整列して保持し、前方一致する範囲を
+    二分探索で求める。完全一致は辞書で行番号を引く。
+    """
+
+    def __init__(self, fonts=()):
+        self.set_fonts(fonts)
+
+    def set_fonts(self, fonts):
+        """索引を作り直す"""
+        self._rows = {}
+        for row, family in enumerate(fonts):
+            self._rows.setdefault(family, row)
+        self._keys = sorted((family.lower(), row, family) for family, row in self._rows.items())
+
+    def row(self, family):
+        """ファミリー名の行番号を取得（一覧に無ければ-1）"""
+        return self._rows.get(family, -1)
+
+    def __contains__(self, family):
+        return family in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def prefix_matches(self, prefix, limit=None):
+        """前方一致するファミリー名を一覧の順に取得"""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._keys, (prefix,))
+        matches = []
+        for key, row, family in itertools.islice(self._keys, start, None):
+            if not key.startswith(prefix):
+                break
+            matches.append((row, family))
+        matches.sort()
+        if limit is not None:
+            matches = matches[:limit]
+        return [family for row, family in matches]
+
+
+# 縦書きで正立する（1em送りになる）文字の東アジアの文字幅
+UPRIGHT_EAST_ASIAN_WIDTHS = frozenset(('W', 'F', 'A'))
+
+
+def is_upright(char):
+    """縦書きで正立する文字か（それ以外は90度回転して横書きの送り幅で並ぶ）"""
+    return unicodedata.east_asian_width(char) in UPRIGHT_EAST_ASIAN_WIDTHS
+
+
+class AdvanceMetrics:
+    """縦書きでの文字の送り幅（フォントサイズに対する比）
+
+    全角の文字は正立して1em送り、半角の英数字などは回転して横書きの送り幅で並ぶ。
+    measureを上書きすると、回転する文字の送り幅をフォントから求められる
+    （既定ではすべて1em）。求めた値は文字ごとに保持し、次からは辞書を引くだけで済む。
+    """
+
+    def __init__(self):
+        self._advances = {}
+
+    def measure(self, char):
+        """回転する文字の送り幅を求める"""
+        return 1.0
+
+    def advance(self, char):
+        """文字の送り幅"""
+        advance = self._advances.get(char)
+        if advance is None:
+            advance = self._advances[char] = 1.0 if is_upright(char) else self.measure(char)
+        return advance
+
+    def total_advance(self, text):
+        """テキストの送り幅の合計"""
+        advances = self._advances
+        for char in set(text).difference(advances):
+            self.advance(char)
+        return sum(map(advances.__getitem__, text))
+
+
+def query_system_fonts():
+    """QFontDatabaseからフォント一覧を取得して並べ替える（UIスレッドから呼び出す）"""
+    from PyQt5.QtGui import QFontDatabase
+    return sort_font_families(QFontDatabase().families())
+
+
+def font_directories():
+    """OSごとのフォントディレクトリの一覧"""
+    home = os.path.expanduser("~")
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        local = os.environ.get("LOCALAPPDATA", os.path.join(home, "AppData", "Local"))
+        return [os.path.join(windir, "Fonts"),
+                os.path.join(local, "Microsoft", "Windows", "Fonts")]
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/Library/Fonts",
+                os.path.join(home, "Library", "Fonts")]
+    data_home = os.environ.get("XDG_DATA_HOME", os.path.join(home, ".local", "share"))
+    return ["/usr/share/fonts", "/usr/local/share/fonts",
+            os.path.join(home, ".fonts"), os.path.join(data_home, "fonts")]
+
+
+def font_fingerprint(directories=None):
+    """フォントディレクトリの状態からフィンガープリントを作成
+
+    ファイルの追加・削除で更新されるディレクトリの更新時刻を
+    サブディレクトリまで含めて集め、ハッシュ値にまとめる。
+    """
+    if directories is None:
+        directories = font_directories()
+
+    digest = hashlib.sha1(str(FONT_CACHE_VERSION).encode())
+    for top in directories:
+        for root, dirs, files in os.walk(top):
+            dirs.sort()
+            try:
+                mtime = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+            digest.update(f"{root}\0{mtime}\0{len(files)}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def font_cache_path():
+    """フォント一覧のキャッシュファイルのパス"""
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA", os.path.join(os.path.expanduser("~"), "AppData", "Local"))
+    elif sys.platform == "darwin":
+        base = os.path.join(os.path.expanduser("~"), "Library", "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "r_vertical_text", "fonts.json")
+
+
+def load_font_cache(path=None):
+    """キャッシュから(フィンガープリント, フォント一覧)を読み込む（無ければNone）"""
+    path = path or font_cache_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get("version") != FONT_CACHE_VERSION:
+        return None
+    fonts = data.get("fonts")
+    if not isinstance(fonts, list) or not fonts:
+        return None
+    return data.get("fingerprint"), fonts
+
+
+def save_font_cache(fingerprint, fonts, path=None):
+    """フォント一覧をキャッシュに保存（書き込み途中のファイルを読まないよう置き換えで保存）"""
+    path = path or font_cache_path()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": FONT_CACHE_VERSION, "fingerprint": fingerprint,
+                       "fonts": fonts}, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        print(f"フォントキャッシュ保存エラー: {e}")
+        return False
+
+
+def compute_fingerprint_async(callback, directories=None):
+    """フィンガープリントを別スレッドで計算し、結果をcallbackに渡す
+
+    callbackはワーカースレッドから呼ばれるため、Qtのオブジェクトを
+    操作する場合はシグナルを経由してUIスレッドへ渡すこと。
+    """
+    def run():
+        try:
+            fingerprint = font_fingerprint(directories)
+        except Exception as e:
+            print(f"フォントフィンガープリント計算エラー: {e}")
+            return
+        callback(fingerprint)
+
+    thread = threading.Thread(target=run, name="font-fingerprint", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,185 @@
+"""
+Kritaのドキュメントへの縦書きテキストの追加
+
+複数のテキストを1つのSVGにまとめ、1回のaddShapesFromSvgと
+1回の再描画でベクターレイヤーに追加する。ダイアログを使わずに
+スクリプトから呼び出せるよう、Qtのウィジェットには依存しない。
+追加先は新しいレイヤーのほか、アクティブなベクターレイヤーや
+名前で指定したレイヤーを選べ、該当するレイヤーが無い場合だけ新しく作成する。
+表示の更新（ドキュメント全体の再合成）はProjectionRefresherで遅らせ、
+続けて追加した場合もまとめて1回で済ませられる。
+
+    from r_vertical_text.insertion import insert_text_blocks
+    insert_text_blocks(doc, [
+        ("吹き出し一", {"font_size": 32}, (100, 80)),
+        ("吹き出し二", {"font_size": 28, "line_feed": 8}, (600, 120)),
+    ])
+"""
+
+from contextlib import contextmanager
+
+try:
+    from .svg_writer import generate_batch_svg
+    from .timing import span
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from svg_writer import generate_batch_svg
+    from timing import span
+
+# 新しく作成するベクターレイヤーの名前
+DEFAULT_LAYER_NAME = "縦書きテキスト"
+
+# 追加先のレイヤーの選び方
+TARGET_NEW_LAYER = "new"          # 毎回新しいレイヤーを作成
+TARGET_ACTIVE_LAYER = "active"    # アクティブなベクターレイヤー
+TARGET_NAMED_LAYER = "named"      # 名前で指定したベクターレイヤー
+INSERT_TARGETS = (TARGET_NEW_LAYER, TARGET_ACTIVE_LAYER, TARGET_NAMED_LAYER)
+
+
+def is_vector_layer(node):
+    """ノードがベクターレイヤーか"""
+    return node is not None and node.type() == "vectorlayer"
+
+
+def find_vector_layer(doc, name):
+    """名前でベクターレイヤーを探す（無ければNone）"""
+    node = doc.nodeByName(name)
+    return node if is_vector_layer(node) else None
+
+
+def resolve_target_layer(doc, target=TARGET_NEW_LAYER, layer_name=DEFAULT_LAYER_NAME):
+    """追加先のベクターレイヤーを決める
+
+    targetに該当するレイヤーがあればそれを返し、無い場合だけlayer_nameの
+    ベクターレイヤーを新しく作成する。(レイヤー, 作成したか)を返す。
+    """
+    if target not in INSERT_TARGETS:
+        raise ValueError(f"不明な追加先です: {target}")
+
+    if target == TARGET_ACTIVE_LAYER:
+        layer = doc.activeNode()
+        if is_vector_layer(layer):
+            return layer, False
+    elif target == TARGET_NAMED_LAYER:
+        layer = find_vector_layer(doc, layer_name)
+        if layer is not None:
+            return layer, False
+
+    return create_vector_layer(doc, layer_name), True
+
+
+def create_vector_layer(doc, name=DEFAULT_LAYER_NAME):
+    """ベクターレイヤーを作成してルートに追加し、アクティブにする"""
+    layer = doc.createVectorLayer(name)
+    doc.rootNode().addChildNode(layer, None)
+    doc.setActiveNode(layer)
+    return layer
+
+
+def refresh_projection(doc, layer):
+    """レイヤーとドキュメントの表示を更新"""
+    with span("krita_update_projection"):
+        layer.updateProjection()
+    with span("krita_refresh_projection"):
+        doc.refreshProjection()
+
+
+class ProjectionRefresher:
+    """レイヤーとドキュメントの表示の更新をまとめる
+
+    deferredが偽の場合はrequest()の時点で更新する。真の場合は更新が必要な
+    レイヤーとドキュメントを記録しておき、flush()でドキュメントごとに1回だけ
+    再合成する。KritaのPython APIには範囲を限定した再描画が無いため、
+    回数を減らすことで再合成のコストを抑える。
+    """
+
+    def __init__(self, deferred=False):
+        self.deferred = deferred
+        # (ドキュメント, 更新が必要なレイヤーの一覧)を追加順に保持
+        self._pending = []
+
+    def request(self, doc, layer):
+        """表示の更新を要求（遅らせる場合は記録だけする）
+
+        Kritaは呼び出しごとに新しいラッパーを返すため、同じドキュメントとレイヤーは
+        idではなく==（Document / Nodeの比較演算子）で判定する。
+        """
+        if not self.deferred:
+            refresh_projection(doc, layer)
+            return
+        for pending_doc, layers in self._pending:
+            if pending_doc == doc:
+                break
+        else:
+            layers = []
+            self._pending.append((doc, layers))
+        if layer not in layers:
+            layers.append(layer)
+
+    def pending(self):
+        """更新を待っているレイヤーの数"""
+        return sum(len(layers) for _, layers in self._pending)
+
+    def flush(self):
+        """記録した更新をまとめて行う"""
+        pending, self._pending = self._pending, []
+        for doc, layers in pending:
+            with span("krita_update_projection"):
+                for layer in layers:
+                    layer.updateProjection()
+            with span("krita_refresh_projection"):
+                doc.refreshProjection()
+
+    def discard(self):
+        """記録した更新を破棄する"""
+        self._pending.clear()
+
+    @contextmanager
+    def batch(self):
+        """withの間の更新を遅らせ、抜けた時に1回だけ更新する（入れ子にできる）"""
+        previous = self.deferred
+        self.deferred = True
+        try:
+            yield self
+        finally:
+            self.deferred = previous
+            if not previous:
+                self.flush()
+
+
+def add_svg_to_layer(doc, layer, svg_content, refresher=None):
+    """SVGをベクターレイヤーに追加して表示を更新し、追加されたシェイプを返す
+
+    refresherを指定した場合、表示の更新はrefresherに任せる。
+    """
+    if not hasattr(layer, 'addShapesFromSvg'):
+        raise RuntimeError("addShapesFromSvgが利用できません（Krita 5のベクターレイヤーが必要です）")
+    with span("krita_add_shapes"):
+        shapes = layer.addShapesFromSvg(svg_content)
+    if refresher is None:
+        refresh_projection(doc, layer)
+    else:
+        refresher.request(doc, layer)
+    return shapes
+
+
+def insert_text_blocks(doc, entries, layer=None, layer_name=DEFAULT_LAYER_NAME, writer=None,
+                       target=TARGET_NEW_LAYER, refresher=None, metrics_for=None):
+    """複数のテキストを1つのSVGにまとめてベクターレイヤーに追加
+
+    entriesは(テキスト, 設定の辞書, 位置)の並び（svg_writer.generate_batch_svgを参照）。
+    layerを省略した場合はtargetに従って追加先を決める（resolve_target_layerを参照）。
+    refresherに遅延モードのProjectionRefresherを渡すと、表示の更新はflush()まで行わない。
+    metrics_forはキャンバスの大きさを求める送り幅のメトリクス（generate_batch_svgを参照）。
+    追加先のレイヤーと追加されたシェイプを返す。
+    """
+    entries = list(entries)
+    if not entries:
+        return layer, []
+
+    with span("insert_batch"):
+        svg_content = generate_batch_svg(entries, writer, metrics_for)
+        if layer is None:
+            layer, _ = resolve_target_layer(doc, target, layer_name)
+        shapes = add_svg_to_layer(doc, layer, svg_content, refresher)
+    return layer, shapes
@@ -0,0 +1,112 @@
+"""
+禁則処理（行分割規則）
+
+JIS X 4051の文字クラスを元にした表を読み込み時に作成し、
+各文字のクラス判定を集合・辞書の参照（O(1)）で行う。
+縦書き用の表示形（vertical_formsモジュールで置き換えた文字）も元の文字と同じクラスに含める。
+"""
+
+# 始め括弧類（JIS X 4051 cl-01）
+OPENING_BRACKETS = frozenset('「『（［｛〈《【〔〘〖｟‘“([{«' '﹁﹃︵︷︹︻︽︿﹇')
+# 終わり括弧類（cl-02）
+CLOSING_BRACKETS = frozenset('」』）］｝〉》】〕〙〗｠’”)]}»' '﹂﹄︶︸︺︼︾﹀﹈')
+# ハイフン類（cl-03）
+HYPHENS = frozenset('‐゠–〜～' '︲')
+# 区切り約物（cl-04）
+DIVIDING_PUNCTUATION = frozenset('？！‼⁇⁈⁉?!' '︖︕')
+# 中点類（cl-05）
+MIDDLE_DOTS = frozenset('・：；:;' '︓︔')
+# 句点類（cl-06）
+FULL_STOPS = frozenset('。．.' '︒')
+# 読点類（cl-07）
+COMMAS = frozenset('、，,' '︑︐')
+# 分離禁止文字（cl-08）
+INSEPARABLE = frozenset('—―…‥〳〴〵' '︙︰')
+# 繰返し記号（cl-09）
+ITERATION_MARKS = frozenset('ヽヾゝゞ々〻')
+# 長音記号（cl-10）
+PROLONGED_SOUND_MARKS = frozenset('ーｰ' '︱')
+
+
+def _char_range(first, last):
+    """コードポイントの範囲を文字列に展開"""
+    return ''.join(chr(code) for code in range(ord(first), ord(last) + 1))
+
+
+# 小書きの仮名（cl-11）。拡張部分は範囲表から展開する
+SMALL_KANA = frozenset(
+    'ぁぃぅぇぉっゃゅょゎゕゖァィゥェォッャュョヮヵヶ'
+    + _char_range('ㇰ', 'ㇿ')   # 片仮名拡張（ㇰ〜ㇿ）
+    + _char_range('ｧ', 'ｯ')   # 半角の小書き片仮名
+)
+
+# 行頭禁則文字（行の先頭に置かない）
+LINE_START_PROHIBITED = (CLOSING_BRACKETS | HYPHENS | DIVIDING_PUNCTUATION | MIDDLE_DOTS
+                         | FULL_STOPS | COMMAS | ITERATION_MARKS | PROLONGED_SOUND_MARKS
+                         | SMALL_KANA)
+# 行末禁則文字（行の末尾に置かない）
+LINE_END_PROHIBITED = OPENING_BRACKETS
+# ぶら下げ組みを許す文字（句読点）
+HANGING_PUNCTUATION = FULL_STOPS | COMMAS
+
+# 文字からクラス名を引く表
+CHAR_CLASSES = {}
+for _name, _chars in (
+        ('opening_bracket', OPENING_BRACKETS),
+        ('closing_bracket', CLOSING_BRACKETS),
+        ('hyphen', HYPHENS),
+        ('dividing_punctuation', DIVIDING_PUNCTUATION),
+        ('middle_dot', MIDDLE_DOTS),
+        ('full_stop', FULL_STOPS),
+        ('comma', COMMAS),
+        ('inseparable', INSEPARABLE),
+        ('iteration_mark', ITERATION_MARKS),
+        ('prolonged_sound_mark', PROLONGED_SOUND_MARKS),
+        ('small_kana', SMALL_KANA)):
+    for _char in _chars:
+        CHAR_CLASSES[_char] = _name
+del _name, _chars, _char
+
+
+def char_class(char):
+    """文字のクラス名を取得（禁則に関係しない文字はNone）"""
+    return CHAR_CLASSES.get(char)
+
+
+def can_break_between(before, after):
+    """2文字の間で改行できるか"""
+    if after in LINE_START_PROHIBITED or before in LINE_END_PROHIBITED:
+        return False
+    # 「……」「——」のような連続は分割しない
+    if before == after and before in INSEPARABLE:
+        return False
+    return True
+
+
+def adjust_break(text, start, end, stop):
+    """禁則を考慮して改行位置を決める
+
+    text[start:end]が強制改行文字数で区切った行、stopは段落の終端。
+    ぶら下げ、追い出し、追い込みの順に試し、実際の改行位置を返す。
+    """
+    if end >= stop or can_break_between(text[end - 1], text[end]):
+        return end
+
+    # ぶら下げ：句読点は1文字だけ行末にはみ出させる
+    if text[end] in HANGING_PUNCTUATION:
+        hang = end + 1
+        if hang >= stop or can_break_between(text[end], text[hang]):
+            return hang
+
+    # 追い出し：改行できる位置まで前に戻り、残りを次の行へ送る
+    position = end - 1
+    while position > start:
+        if can_break_between(text[position - 1], text[position]):
+            return position
+        position -= 1
+
+    # 追い込み：行全体が禁則文字の場合は改行できる位置まで行を延ばす
+    position = end + 1
+    while position < stop and not can_break_between(text[position - 1], text[position]):
+        position += 1
+    return position
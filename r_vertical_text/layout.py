@@ -0,0 +1,387 @@
+"""
+縦書きレイアウトのコア処理
+
+Qtに依存しない純粋なPythonの関数として行分割と文字の配置を提供する。
+ダイアログを生成せずにバッチ処理などから直接利用できる。
+"""
+
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+try:
+    from .kinsoku import adjust_break
+    from .timing import span
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from kinsoku import adjust_break
+    from timing import span
+
+
+def iter_line_spans(text, line_feed, start=0):
+    """行の範囲を(開始位置, 終了位置)として順に返すジェネレーター
+
+    文字列を連結せずに改行位置だけを求めるため、長いテキストでも
+    行の文字列を作り直すコストが掛からない。禁則処理はkinsokuモジュールの
+    規則に従い、テキストを先頭から一度走査するだけで解決する。
+    startに行の開始位置（または行の終了位置）を指定すると、そこから走査を再開する。
+    """
+    line_feed = max(1, line_feed)
+    length = len(text)
+    paragraph_start = start
+
+    while paragraph_start <= length:
+        # 改行文字で段落に区切る（空の段落は行を作らない）
+        paragraph_end = text.find('\n', paragraph_start)
+        if paragraph_end < 0:
+            paragraph_end = length
+
+        start = paragraph_start
+        # 強制改行文字数ごとに区切り、禁則に掛かる場合は改行位置を調整する
+        while paragraph_end - start > line_feed:
+            end = adjust_break(text, start, start + line_feed, paragraph_end)
+            yield start, end
+            start = end
+
+        if start < paragraph_end:
+            yield start, paragraph_end
+
+        paragraph_start = paragraph_end + 1
+
+
+def iter_lines(text, line_feed):
+    """行を順に返すジェネレーター（各行は元のテキストのスライス）"""
+    for start, end in iter_line_spans(text, line_feed):
+        yield text[start:end]
+
+
+def measure_lines(text, line_feed):
+    """行数と最長行の文字数を求める（行の文字列は作らない）"""
+    line_count = 0
+    max_line_length = 0
+    for start, end in iter_line_spans(text, line_feed):
+        line_count += 1
+        if end - start > max_line_length:
+            max_line_length = end - start
+    return line_count, max_line_length
+
+
+def split_text_into_lines(text, line_feed):
+    """テキストを行に分割（改行文字と強制改行を考慮）"""
+    return list(iter_lines(text, line_feed))
+
+
+class Column:
+    """レイアウト済みの1行（縦書きの1列）
+
+    x, y は列の左上の座標（幅はフォントサイズ）。
+    文字列そのものは保持せず、元のテキスト上の範囲だけを持つ。
+    """
+
+    __slots__ = ('index', 'start', 'end', 'x', 'y', 'width', 'height')
+
+    def __init__(self, index, start, end, x, y, width, height):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def center_x(self):
+        """列の中心線のX座標"""
+        return self.x + self.width / 2
+
+    def __repr__(self):
+        return (f"Column(index={self.index}, start={self.start}, end={self.end}, "
+                f"x={self.x}, y={self.y}, width={self.width}, height={self.height})")
+
+
+class LayoutResult:
+    """縦書きレイアウトの計算結果
+
+    SVGの生成とプレビューの描画はどちらもこの結果から座標を取り出すため、
+    同じ設定に対して行分割と外接矩形の計算は一度しか行われない。
+    行の範囲は列（Column）の一覧ではなく開始・終了位置を並べた整数の配列で保持し、
+    列はiter_columnsで必要な時に作成するため、長いテキストでもすべての列を
+    オブジェクトとして同時にメモリに持たない。
+    座標の原点はテキスト全体の左上で、余白は含まない。
+    spansに行の範囲の一覧を渡した場合はそれを保持し、行分割を省略する。
+    """
+
+    def __init__(self, text, font_size, line_spacing, char_spacing, line_feed,
+                 text_direction="right_to_left", spans=None):
+        self.text = text
+        self.font_size = font_size
+        self.line_spacing = line_spacing
+        self.char_spacing = char_spacing
+        self.line_feed = line_feed
+        self.text_direction = text_direction
+
+        # 列の間隔（行送り）と文字の間隔（字送り）
+        self.column_pitch = font_size * line_spacing
+        self.char_pitch = font_size * char_spacing
+
+        # 行の範囲（IncrementalLayoutで計算済みの場合はその一覧）
+        self.spans = spans
+        self._offsets = None
+        if spans is None:
+            # 行分割は一度だけ行い、(開始位置, 終了位置)を交互に並べた配列にする
+            offsets = self._offsets = array('q')
+            max_column_length = 0
+            with span("split_lines"):
+                for start, end in iter_line_spans(text, line_feed):
+                    offsets.append(start)
+                    offsets.append(end)
+                    if end - start > max_column_length:
+                        max_column_length = end - start
+            count = len(offsets) // 2
+            self.max_column_length = max_column_length
+        else:
+            count = len(spans)
+            self.max_column_length = max((end - start for start, end in spans), default=0)
+        self.column_count = count
+        # 直前にcontent_sizeで求めた(メトリクス, 大きさ)
+        self._content_size = None
+
+        # テキスト全体の外接矩形（幅・高さ）
+        self.width = self._extent_columns(count)
+        self.height = self._extent(self.max_column_length)
+
+    def _extent(self, length):
+        """length文字を並べた列の高さ"""
+        if length <= 0:
+            return 0
+        return (length - 1) * self.char_pitch + self.font_size
+
+    def _extent_columns(self, count):
+        """count列を並べた幅"""
+        if count <= 0:
+            return 0
+        return (count - 1) * self.column_pitch + self.font_size
+
+    def iter_spans(self):
+        """行の範囲(開始位置, 終了位置)を順に返す"""
+        if self.spans is not None:
+            return iter(self.spans)
+        offsets = iter(self._offsets)
+        return zip(offsets, offsets)
+
+    def iter_columns(self):
+        """列（Column）を順に返す（行分割はやり直さない）"""
+        count = self.column_count
+        right_to_left = self.text_direction == "right_to_left"
+        for index, (start, end) in enumerate(self.iter_spans()):
+            # テキスト方向に応じて列の並び順を決める
+            # 右から左：最後の行から最初の行へ／左から右：最初の行から最後の行へ
+            slot = count - 1 - index if right_to_left else index
+            yield Column(
+                index, start, end,
+                x=slot * self.column_pitch,
+                y=0,
+                width=self.font_size,
+                height=self._extent(end - start),
+            )
+
+    @property
+    def columns(self):
+        """すべての列の一覧（順に処理する場合はiter_columnsを使う）"""
+        return list(self.iter_columns())
+
+    @property
+    def bounds(self):
+        """外接矩形(x, y, 幅, 高さ)"""
+        return (0, 0, self.width, self.height)
+
+    def content_size(self, metrics=None):
+        """文字の送り幅から求めたテキストの(幅, 高さ)
+
+        metricsはfonts.AdvanceMetricsのように文字列の送り幅の合計（em）を
+        total_advanceで返すオブジェクト。省略した場合はすべての文字を1em送りとみなす
+        （width, heightと同じ）。字送りのうちフォントサイズを超える分は文字間隔として加える。
+        """
+        if metrics is None:
+            return self.width, self.height
+        cached = self._content_size
+        if cached is not None and cached[0] is metrics:
+            return cached[1]
+        letter_spacing = self.font_size * (self.char_spacing - 1)
+        text = self.text
+        height = 0
+        for start, end in self.iter_spans():
+            length = end - start
+            if not length:
+                continue
+            advance = metrics.total_advance(text[start:end])
+            height = max(height, advance * self.font_size + (length - 1) * letter_spacing)
+        size = (self.width, height)
+        # 同じフォントでSVGを生成し直す場合（キャッシュ済みのレイアウト）は測り直さない
+        self._content_size = (metrics, size)
+        return size
+
+    def column_text(self, column):
+        """列の文字列を取得"""
+        return self.text[column.start:column.end]
+
+    def iter_column_glyphs(self, column):
+        """列内の各文字と座標(文字, 中心x, 上端y)を順に返す"""
+        x = column.center_x
+        y = column.y
+        pitch = self.char_pitch
+        for char in self.text[column.start:column.end]:
+            yield char, x, y
+            y += pitch
+
+    def iter_glyphs(self):
+        """全ての文字と座標(列番号, 文字, 中心x, 上端y)を順に返す"""
+        for column in self.iter_columns():
+            for char, x, y in self.iter_column_glyphs(column):
+                yield column.index, char, x, y
+
+
+@lru_cache(maxsize=16)
+def compute_layout(text, font_size, line_spacing, char_spacing, line_feed,
+                   text_direction="right_to_left"):
+    """縦書きレイアウトを計算（同じ設定の結果は再利用する）
+
+    キャッシュするのは行の範囲と外接矩形だけで、列は保持しない（LayoutResultを参照）。
+    """
+    with span("layout"):
+        return LayoutResult(text, font_size, line_spacing, char_spacing, line_feed, text_direction)
+
+
+# 共通部分の長さを求める時に一度に比較する文字数
+_COMPARE_BLOCK = 4096
+
+
+def common_prefix_length(a, b):
+    """2つの文字列の先頭から一致する文字数"""
+    limit = min(len(a), len(b))
+    position = 0
+    # スライスの比較（C実装）でブロック単位に進め、不一致のブロックだけ1文字ずつ調べる
+    while position < limit:
+        end = min(position + _COMPARE_BLOCK, limit)
+        if a[position:end] != b[position:end]:
+            break
+        position = end
+    else:
+        return limit
+    while a[position] == b[position]:
+        position += 1
+    return position
+
+
+def common_suffix_length(a, b, limit=None):
+    """2つの文字列の末尾から一致する文字数（最大limit文字）"""
+    length_a = len(a)
+    length_b = len(b)
+    if limit is None:
+        limit = min(length_a, length_b)
+    count = 0
+    while count < limit:
+        step = min(_COMPARE_BLOCK, limit - count)
+        if a[length_a - count - step:length_a - count] != b[length_b - count - step:length_b - count]:
+            break
+        count += step
+    else:
+        return limit
+    while a[length_a - count - 1] == b[length_b - count - 1]:
+        count += 1
+    return count
+
+
+class IncrementalLayout:
+    """テキストの編集に合わせて行分割を部分的にやり直すレイアウト
+
+    前回の行の範囲を覚えておき、前回のテキストとの共通の先頭部分で
+    改行位置が決まる行はそのまま使う。最初に影響を受ける行から行分割を
+    やり直し、共通の末尾部分で前回の行の開始位置（編集による文字数の
+    増減分ずらした位置）と揃った時点で、残りは前回の行をずらして使う。
+    ダイアログのようにテキストを少しずつ編集する用途のためのもので、
+    結果はcompute_layoutと同じになる。
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """前回の結果を破棄する"""
+        self._text = None
+        self._line_feed = None
+        self._spans = []
+        self._starts = []
+        self._layout_key = None
+        self._layout = None
+        # 直前の計算で行分割をやり直した行数と、前回の結果を使った行数
+        self.computed_spans = 0
+        self.reused_spans = 0
+
+    def spans(self, text, line_feed):
+        """行の範囲の一覧を取得（前回の結果から変わった部分だけ計算する）"""
+        line_feed = max(1, line_feed)
+        if self._text is None or line_feed != self._line_feed:
+            spans = list(iter_line_spans(text, line_feed))
+            self.computed_spans, self.reused_spans = len(spans), 0
+        elif text == self._text:
+            spans = self._spans
+            self.computed_spans, self.reused_spans = 0, len(spans)
+        else:
+            spans = self._patch(text, line_feed)
+
+        if spans is not self._spans:
+            self._text = text
+            self._line_feed = line_feed
+            self._spans = spans
+            self._starts = [start for start, _ in spans]
+        return spans
+
+    def _patch(self, text, line_feed):
+        old_text = self._text
+        old_spans = self._spans
+        prefix = common_prefix_length(old_text, text)
+        suffix = common_suffix_length(old_text, text, min(len(old_text), len(text)) - prefix)
+        delta = len(text) - len(old_text)
+
+        # 改行位置の判定で読む範囲（行の開始位置から強制改行文字数の1文字先まで、
+        # または行の終了位置の1文字先まで）が共通の先頭部分に収まる行は変わらない
+        keep = bisect_left(self._starts, prefix - line_feed - 1)
+        while keep and old_spans[keep - 1][1] + 1 >= prefix:
+            keep -= 1
+        spans = old_spans[:keep]
+        restart = old_spans[keep - 1][1] if keep else 0
+
+        # 共通の末尾部分の中で前回の行の開始位置と揃えば、以降は前回と同じ改行位置になる
+        suffix_start = len(text) - suffix
+        computed = 0
+        for start, end in iter_line_spans(text, line_feed, restart):
+            if start >= suffix_start:
+                index = bisect_left(self._starts, start - delta, keep)
+                if index < len(old_spans) and old_spans[index][0] == start - delta:
+                    spans.extend([(old_start + delta, old_end + delta)
+                                  for old_start, old_end in old_spans[index:]])
+                    break
+            spans.append((start, end))
+            computed += 1
+
+        self.computed_spans = computed
+        self.reused_spans = len(spans) - computed
+        return spans
+
+    def layout(self, text, font_size, line_spacing, char_spacing, line_feed,
+               text_direction="right_to_left"):
+        """縦書きレイアウトを計算（compute_layoutと同じ引数と結果）"""
+        key = (text, font_size, line_spacing, char_spacing, line_feed, text_direction)
+        if key == self._layout_key:
+            return self._layout
+        with span("layout_incremental"):
+            with span("split_lines"):
+                spans = self.spans(text, line_feed)
+            self._layout = LayoutResult(text, font_size, line_spacing, char_spacing, line_feed,
+                                        text_direction, spans)
+        self._layout_key = key
+        return self._layout
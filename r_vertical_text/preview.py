@@ -0,0 +1,377 @@
+"""
+プレビュー更新の制御と描画
+
+設定変更のたびに同期的に描画するのではなく、連続した変更をまとめて
+入力が落ち着いた時点で一度だけプレビューを更新する。
+描画はQThreadPoolのワーカーでQImageに対して行い、UIスレッドでは
+完成した画像の差し替えだけを行う。
+"""
+
+import atexit
+import threading
+import weakref
+from collections import namedtuple
+
+from PyQt5.QtCore import QObject, QPointF, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QFontDatabase, QGlyphRun, QImage, QPainter, QRawFont
+
+try:
+    from .timing import span
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from timing import span
+
+# 最後の変更からプレビューを更新するまでの待ち時間（ミリ秒）
+DEFAULT_PREVIEW_DELAY_MS = 150
+
+# 文字の上端からベースラインまでの距離（フォントサイズに対する比）
+PREVIEW_BASELINE = 0.88
+
+
+class PreviewScheduler(QObject):
+    """連続した更新要求を一回のプレビュー更新にまとめるスケジューラー"""
+
+    def __init__(self, callback, delay_ms=DEFAULT_PREVIEW_DELAY_MS, parent=None):
+        super().__init__(parent)
+        self._callback = callback
+        self._running = False
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._run)
+
+    def delay(self):
+        """待ち時間（ミリ秒）を取得"""
+        return self._timer.interval()
+
+    def setDelay(self, delay_ms):
+        """待ち時間（ミリ秒）を設定"""
+        self._timer.setInterval(max(0, int(delay_ms)))
+
+    def isPending(self):
+        """更新が予約されているか"""
+        return self._timer.isActive()
+
+    def schedule(self, *args):
+        """プレビュー更新を予約（任意のシグナルに接続できるよう引数は無視する）"""
+        # 予約済みの場合はタイマーを再始動し、最後の変更から待ち時間後に一度だけ実行する
+        self._timer.start()
+
+    def cancel(self):
+        """予約済みの更新を取り消す"""
+        self._timer.stop()
+
+    def flush(self):
+        """予約済みの更新があれば直ちに実行する"""
+        if self._timer.isActive():
+            self._timer.stop()
+            self._run()
+
+    def _run(self):
+        if self._running:
+            # 更新中に要求された場合は、更新後にもう一度実行する
+            self._timer.start()
+            return
+        self._running = True
+        try:
+            self._callback()
+        finally:
+            self._running = False
+
+
+# プレビューの描画に必要な設定（計算済みのレイアウトとウィジェットから読み取った値）
+PreviewParams = namedtuple('PreviewParams', [
+    'layout', 'font_family', 'font_weight', 'text_color',
+])
+
+
+# CSSのフォントウェイト（100〜900）とQtのフォントウェイトの対応
+QT_FONT_WEIGHTS = {
+    100: QFont.Thin,
+    200: QFont.ExtraLight,
+    300: QFont.Light,
+    400: QFont.Normal,
+    500: QFont.Medium,
+    600: QFont.DemiBold,
+    700: QFont.Bold,
+    800: QFont.ExtraBold,
+    900: QFont.Black,
+}
+
+
+def qtFontWeight(css_weight):
+    """CSSのフォントウェイトをQtのフォントウェイトに変換"""
+    if css_weight is None:
+        return QFont.Normal
+    # 100単位に丸めて対応表から引く
+    rounded = min(900, max(100, int(round(css_weight / 100.0)) * 100))
+    return QT_FONT_WEIGHTS[rounded]
+
+
+class GlyphCache:
+    """字形のキャッシュ
+
+    (ファミリー, ウェイト, サイズ, 文字)ごとのグリフ番号を保持し、
+    一度シェーピングした文字をプレビューの更新をまたいで再利用する。
+    グリフ番号はスレッド間で共有し、参照・追加はロックで保護する。
+    QRawFontは作成したスレッドでしか使えないため、(ファミリー, ウェイト, サイズ)
+    ごとのQRawFontはスレッドごとに保持する（QThreadPoolのワーカーでは
+    描画のたびに作り直される）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._glyphs = {}
+        # clear()で他のスレッドのQRawFontも無効にするための世代番号
+        self._epoch = 0
+
+    def _threadRawFonts(self):
+        """現在のスレッドのQRawFontの辞書"""
+        local = self._local
+        if getattr(local, 'epoch', None) != self._epoch:
+            local.epoch = self._epoch
+            local.raw_fonts = {}
+        return local.raw_fonts
+
+    def rawFont(self, family, weight, size):
+        """現在のスレッドのQRawFontを取得（無ければ作成）"""
+        key = (family, weight, size)
+        raw_fonts = self._threadRawFonts()
+        raw_font = raw_fonts.get(key)
+        if raw_font is None:
+            font = QFont()
+            font.setFamily(family)
+            font.setPixelSize(size)
+            font.setWeight(qtFontWeight(weight))
+            raw_font = raw_fonts[key] = QRawFont.fromFont(font)
+        return raw_font
+
+    def glyphIndex(self, raw_font, family, weight, size, char):
+        """文字のグリフ番号を取得（フォントに無い文字は0）"""
+        key = (family, weight, size, char)
+        with self._lock:
+            index = self._glyphs.get(key)
+        if index is None:
+            indexes = raw_font.glyphIndexesForString(char) if raw_font.isValid() else []
+            # 1文字が複数のグリフになる場合は通常の文字描画に任せる
+            index = indexes[0] if len(indexes) == 1 else 0
+            with self._lock:
+                self._glyphs[key] = index
+        return index
+
+    def clear(self):
+        """キャッシュを空にする（他のスレッドのQRawFontは次に使う時に作り直す）"""
+        with self._lock:
+            self._epoch += 1
+            self._glyphs.clear()
+        self._local.__dict__.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._glyphs)
+
+
+# プレビューの更新をまたいで共有する字形のキャッシュ
+glyph_cache = GlyphCache()
+
+
+def _drawColumn(painter, raw_font, font_key, chars_and_points):
+    """1行分の文字を1つのグリフランとしてまとめて描画"""
+    glyph_indexes = []
+    positions = []
+    for char, point in chars_and_points:
+        index = glyph_cache.glyphIndex(raw_font, *font_key, char)
+        if index:
+            glyph_indexes.append(index)
+            positions.append(point)
+        else:
+            # フォントに無い文字はフォールバックフォントを使える通常の描画で補う
+            painter.drawText(point, char)
+
+    if glyph_indexes:
+        glyph_run = QGlyphRun()
+        glyph_run.setRawFont(raw_font)
+        glyph_run.setGlyphIndexes(glyph_indexes)
+        glyph_run.setPositions(positions)
+        painter.drawGlyphRun(QPointF(0, 0), glyph_run)
+
+
+def renderPreviewImage(params, width, height, is_cancelled=None, background=None):
+    """縦書きテキストのプレビューをQImageに描画
+
+    ウィジェットに触れないため、UIスレッド以外からも呼び出せる。
+    is_cancelledが真を返した場合は描画を中断してNoneを返す。
+    backgroundを省略した場合は白で塗りつぶす（透明にする場合はQt.transparent）。
+    """
+    with span("preview_render"):
+        return _renderPreviewImage(params, width, height, is_cancelled, background)
+
+
+def _renderPreviewImage(params, width, height, is_cancelled, background):
+    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+    image.fill(QColor(255, 255, 255) if background is None else background)
+
+    painter = QPainter(image)
+    try:
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        layout = params.layout
+        font_size = layout.font_size
+
+        # フォント設定（字形はキャッシュしたQRawFontから取得する）
+        font_key = (params.font_family, params.font_weight, font_size)
+        raw_font = glyph_cache.rawFont(*font_key)
+
+        # フォントに無い文字を描画するためのフォント
+        font = QFont()
+        font.setFamily(params.font_family)
+        font.setPixelSize(font_size)
+        font.setWeight(qtFontWeight(params.font_weight))
+        painter.setFont(font)
+        painter.setPen(QColor(params.text_color))
+
+        # テキスト全体をプレビューエリアの中央に配置
+        offset_x = (width - layout.width) / 2
+        offset_y = (height - layout.height) / 2
+        baseline = font_size * PREVIEW_BASELINE
+
+        # 右から左では列が左へ、左から右では右へ進む
+        right_to_left = layout.text_direction == "right_to_left"
+
+        # 座標はSVGと同じレイアウトの計算結果をそのまま使う
+        for column in layout.iter_columns():
+            # より新しい描画要求があれば途中で打ち切る
+            if is_cancelled is not None and is_cancelled():
+                return None
+
+            draw_x = offset_x + column.x
+            # 画像の外の列は字形を求めずに飛ばし、以降の列も外になれば終える
+            if draw_x >= width:
+                if right_to_left:
+                    continue
+                break
+            if draw_x + column.width <= 0:
+                if right_to_left:
+                    break
+                continue
+            glyphs = [(char, QPointF(draw_x, offset_y + y + baseline))
+                      for char, x, y in layout.iter_column_glyphs(column)
+                      if char.strip()]
+            _drawColumn(painter, raw_font, font_key, glyphs)
+    finally:
+        painter.end()
+
+    return image
+
+
+class _RenderSignals(QObject):
+    """ワーカーからUIスレッドへ結果を届けるためのシグナル"""
+    finished = pyqtSignal(int, QImage)
+
+
+class PreviewRenderTask(QRunnable):
+    """プレビューを描画するワーカー"""
+
+    def __init__(self, generation, params, width, height, is_stale, signals):
+        super().__init__()
+        self.generation = generation
+        self.params = params
+        self.width = width
+        self.height = height
+        self._is_stale = is_stale
+        # UIスレッドで作成したオブジェクトなので、結果はキュー接続でUIスレッドへ届く
+        self.signals = signals
+
+    def run(self):
+        # ワーカー内の未処理の例外はQtの異常終了につながるため、すべてここで捕捉する
+        try:
+            # 実行待ちの間に新しい要求が来ていれば描画しない
+            if self._is_stale(self.generation):
+                return
+            image = renderPreviewImage(self.params, self.width, self.height,
+                                       lambda: self._is_stale(self.generation))
+            if image is not None and not self._is_stale(self.generation):
+                self.signals.finished.emit(self.generation, image)
+        except RuntimeError:
+            # 描画中にダイアログが破棄された場合
+            pass
+        except Exception as e:
+            print(f"プレビュー描画エラー: {e}")
+
+
+# 終了時にワーカーを待つため、生存中のレンダラーを記録する
+_live_renderers = weakref.WeakSet()
+
+
+@atexit.register
+def _waitForRenderers():
+    """インタープリター終了前に描画中のワーカーを打ち切って終了を待つ"""
+    for renderer in list(_live_renderers):
+        try:
+            renderer.cancel()
+            renderer.waitForDone()
+        except RuntimeError:
+            # Qtオブジェクトが既に破棄されている場合
+            pass
+
+
+class PreviewRenderer(QObject):
+    """プレビューをUIスレッド以外で描画し、最新の要求の結果だけを通知する
+
+    要求ごとに世代番号を振り、古い世代の結果は表示せずに破棄する。
+    """
+
+    imageReady = pyqtSignal(QImage)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._generation = 0
+        self._pool = QThreadPool(self)
+        # 古い描画はすぐに打ち切られるため、ワーカーは1つで十分
+        self._pool.setMaxThreadCount(1)
+        # フォント描画をスレッドで行えない環境ではUIスレッドで描画する
+        self.threaded = QFontDatabase.supportsThreadedFontRendering()
+        # ワーカーから結果を受け取るシグナル（ワーカーも参照を持つため親は設定しない）
+        self._signals = _RenderSignals()
+        self._signals.finished.connect(self._onFinished)
+        _live_renderers.add(self)
+
+    def generation(self):
+        """最新の要求の世代番号を取得"""
+        return self._generation
+
+    def isStale(self, generation):
+        """指定した世代より新しい要求があるか"""
+        return generation != self._generation
+
+    def request(self, params, width, height):
+        """プレビューの描画を要求"""
+        self._generation += 1
+
+        if not self.threaded:
+            image = renderPreviewImage(params, width, height)
+            self.imageReady.emit(image)
+            return
+
+        # まだ開始していない古い要求は取り除く
+        self._pool.clear()
+        task = PreviewRenderTask(self._generation, params, width, height,
+                                 self.isStale, self._signals)
+        self._pool.start(task)
+
+    def cancel(self):
+        """描画中・実行待ちの要求をすべて無効にする"""
+        self._generation += 1
+        self._pool.clear()
+
+    def waitForDone(self, msecs=-1):
+        """実行中のワーカーの終了を待つ"""
+        return self._pool.waitForDone(msecs)
+
+    def _onFinished(self, generation, image):
+        # UIスレッドで実行される。古い世代の結果は破棄する
+        if self.isStale(generation):
+            return
+        self.imageReady.emit(image)
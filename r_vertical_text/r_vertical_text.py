@@ -1,43 +1,70 @@
-try:
-    from krita import Extension, Krita
-except ImportError:
-    # Krita環境外でのテスト用
-    class Extension:
-        def __init__(self, parent):
-            self.parent = parent
-        def setup(self):
-            pass
-        def createActions(self, window):
-            pass
-    
-    class Krita:
-        @staticmethod
-        def instance():
-            return None
+import importlib.util
+from functools import lru_cache
 
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                              QSpinBox, QPushButton, 
                              QTextEdit, QCheckBox, QColorDialog, QGroupBox,
                              QFormLayout, QMessageBox, QRadioButton, QButtonGroup,
-                             QComboBox)
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QColor, QFont, QPixmap, QPainter, QFontDatabase
-import xml.etree.ElementTree as ET
+                             QComboBox, QShortcut, QLineEdit)
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QPixmap, QKeySequence
 
-# PyQt5.QtSvgの可用性をチェック
 try:
-    import importlib.util
-    spec = importlib.util.find_spec("PyQt5.QtSvg")
-    QTSVG_AVAILABLE = spec is not None
-    if QTSVG_AVAILABLE:
-        print("PyQt5.QtSvg is available - SVG vector layer support enabled")
-    else:
-        print("PyQt5.QtSvg is not available - SVG vector layer support disabled")
+    from .layout import split_text_into_lines, IncrementalLayout
+    from .preview import (PreviewScheduler, PreviewRenderer, PreviewParams,
+                          renderPreviewImage, DEFAULT_PREVIEW_DELAY_MS)
+    from .svg_writer import generate_svg_from_layout, primary_font_family, svg_font_family
+    from .debug_log import debug_logger
+    from .insertion import (resolve_target_layer, refresh_projection, ProjectionRefresher,
+                            DEFAULT_LAYER_NAME, TARGET_NEW_LAYER, TARGET_ACTIVE_LAYER,
+                            TARGET_NAMED_LAYER)
+    from .diagnostics import DiagnosticsDialog, DIAGNOSTICS_SHORTCUT
+    from .timing import span
+    from .vertical_forms import (apply_vertical_forms, VERTICAL_FORMS_NONE,
+                                 VERTICAL_FORMS_SUBSTITUTE, VERTICAL_FORMS_ORIENTATION,
+                                 DEFAULT_VERTICAL_FORMS)
+    from .extension import Krita, RVerticalText
+    from .font_model import (FontListModel, createFontCompleter, font_weight_resolver,
+                             advanceMetricsFor)
+    from .fonts import (FALLBACK_FONTS, FONT_WEIGHTS, FONT_WEIGHT_NAMES, weight_from_name,
+                        nearest_weight, query_system_fonts, load_font_cache, save_font_cache,
+                        compute_fingerprint_async)
 except ImportError:
-    QTSVG_AVAILABLE = False
-    print("PyQt5.QtSvg is not available - SVG vector layer support disabled")
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from layout import split_text_into_lines, IncrementalLayout
+    from preview import (PreviewScheduler, PreviewRenderer, PreviewParams,
+                         renderPreviewImage, DEFAULT_PREVIEW_DELAY_MS)
+    from svg_writer import generate_svg_from_layout, primary_font_family, svg_font_family
+    from debug_log import debug_logger
+    from insertion import (resolve_target_layer, refresh_projection, ProjectionRefresher,
+                           DEFAULT_LAYER_NAME, TARGET_NEW_LAYER, TARGET_ACTIVE_LAYER,
+                           TARGET_NAMED_LAYER)
+    from diagnostics import DiagnosticsDialog, DIAGNOSTICS_SHORTCUT
+    from timing import span
+    from vertical_forms import (apply_vertical_forms, VERTICAL_FORMS_NONE,
+                                VERTICAL_FORMS_SUBSTITUTE, VERTICAL_FORMS_ORIENTATION,
+                                DEFAULT_VERTICAL_FORMS)
+    from extension import Krita, RVerticalText
+    from font_model import (FontListModel, createFontCompleter, font_weight_resolver,
+                            advanceMetricsFor)
+    from fonts import (FALLBACK_FONTS, FONT_WEIGHTS, FONT_WEIGHT_NAMES, weight_from_name,
+                       nearest_weight, query_system_fonts, load_font_cache, save_font_cache,
+                       compute_fingerprint_async)
+
+
+@lru_cache(maxsize=None)
+def isQtSvgAvailable():
+    """PyQt5.QtSvgが利用できるか（最初にSVGを追加する時に一度だけ調べる）"""
+    try:
+        return importlib.util.find_spec("PyQt5.QtSvg") is not None
+    except ImportError:
+        return False
+
 
 class VerticalTextDialog(QDialog):
+    # フォントディレクトリのフィンガープリントの計算完了（ワーカースレッドから通知）
+    fontFingerprintReady = pyqtSignal(str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("縦書きテキスト生成")
@@ -55,74 +82,104 @@ class VerticalTextDialog(QDialog):
         self.text_color = QColor(0, 0, 0)
         self.force_monospace = False
         self.text_direction = "right_to_left"  # デフォルトは右から左
+        self.vertical_forms = DEFAULT_VERTICAL_FORMS  # 句読点や括弧を縦書き用の字形に置き換える
+        self.preview_delay_ms = DEFAULT_PREVIEW_DELAY_MS  # 設定変更からプレビュー更新までの待ち時間
+        self.insert_target = TARGET_NEW_LAYER  # 追加先（新しいレイヤー／アクティブなレイヤー／名前で指定）
+        self.target_layer_name = DEFAULT_LAYER_NAME  # 新しく作成する・名前で探すレイヤーの名前
+        
+        # 続けて追加する場合に、表示の更新をダイアログを閉じるまでまとめる
+        self.projection_refresher = ProjectionRefresher(deferred=False)
         
-        # システムフォントを取得
+        # テキストの編集では変更の影響を受ける列だけ行分割をやり直す
+        self.incremental_layout = IncrementalLayout()
+        
+        # 連続した設定変更を一回のプレビュー更新にまとめる
+        self.preview_scheduler = PreviewScheduler(self.updatePreview, self.preview_delay_ms, self)
+        
+        # プレビューはワーカースレッドで描画し、完成した画像だけを受け取る
+        self.preview_renderer = PreviewRenderer(self)
+        self.preview_renderer.imageReady.connect(self.onPreviewImageReady)
+        
+        # システムフォントを取得（キャッシュがあればすぐに使い、変更の有無は後で確認する）
+        self.fontFingerprintReady.connect(self.onFontFingerprintReady)
         self.available_fonts = self.getSystemFonts()
         
         self.setupUI()
     
     def getSystemFonts(self):
-        """システムにインストールされているフォントを取得"""
+        """システムにインストールされているフォントを取得
+
+        ディスクに保存した一覧があればそれを返し、フォントが変更されていないかは
+        別スレッドで確認する（onFontFingerprintReady）。
+        """
+        self._fonts_queried = False
+        cached = load_font_cache()
+        if cached is not None:
+            self._font_cache_fingerprint, fonts = cached
+        else:
+            self._font_cache_fingerprint = None
+            try:
+                fonts = query_system_fonts()
+                self._fonts_queried = True
+            except Exception as e:
+                print(f"フォント取得エラー: {e}")
+                # フォールバック用のデフォルトフォントリスト
+                return list(FALLBACK_FONTS)
+
+        compute_fingerprint_async(self._emitFontFingerprint)
+        return fonts
+
+    def _emitFontFingerprint(self, fingerprint):
+        # ワーカースレッドで実行される。シグナル経由でUIスレッドへ渡す
         try:
-            font_db = QFontDatabase()
-            families = font_db.families()
-            
-            # 日本語フォントを優先して並べ替え
-            japanese_fonts = []
-            other_fonts = []
-            
-            for family in families:
-                if any(keyword in family.lower() for keyword in ['noto', 'source', 'hiragino', 'yu', 'meiryo', 'ms gothic', 'ms mincho', 'cjk', 'japanese']):
-                    japanese_fonts.append(family)
-                else:
-                    other_fonts.append(family)
-            
-            # 日本語フォントを先頭に、その他をアルファベット順に
-            sorted_fonts = sorted(japanese_fonts) + sorted(other_fonts)
-            
-            # デフォルトフォントを先頭に追加
-            default_fonts = ["Noto Serif CJK JP", "Source Han Serif JP", "Hiragino Mincho ProN", "Yu Mincho", "MS Mincho"]
-            final_fonts = []
-            
-            for default_font in default_fonts:
-                if default_font in sorted_fonts:
-                    final_fonts.append(default_font)
-                    sorted_fonts.remove(default_font)
-            
-            final_fonts.extend(sorted_fonts)
-            return final_fonts
-            
-        except Exception as e:
-            print(f"フォント取得エラー: {e}")
-            # フォールバック用のデフォルトフォントリスト
-            return ["Noto Serif CJK JP", "Source Han Serif JP", "Hiragino Mincho ProN", "Yu Mincho", "MS Mincho", "serif", "sans-serif"]
-    
+            self.fontFingerprintReady.emit(fingerprint)
+        except RuntimeError:
+            # 計算中にダイアログが破棄された場合
+            pass
+
+    def onFontFingerprintReady(self, fingerprint):
+        """フォントディレクトリのフィンガープリントが得られた時の処理"""
+        if fingerprint == self._font_cache_fingerprint:
+            return
+
+        # フォントが変更されていれば一覧を作り直してキャッシュを更新する
+        if self._fonts_queried:
+            fonts = self.available_fonts
+        else:
+            try:
+                fonts = query_system_fonts()
+            except Exception as e:
+                print(f"フォント取得エラー: {e}")
+                return
+            self._fonts_queried = True
+        save_font_cache(fingerprint, fonts)
+        self._font_cache_fingerprint = fingerprint
+
+        if fonts != self.available_fonts:
+            font_weight_resolver.clear()
+            advanceMetricsFor.cache_clear()
+            self.setAvailableFonts(fonts)
+
+    def setAvailableFonts(self, fonts):
+        """フォント一覧を差し替える（入力中のフォント名は保持する）"""
+        self.available_fonts = fonts
+        current_text = self.font_family_combo.currentText()
+        self.font_family_combo.blockSignals(True)
+        try:
+            self.font_model.setFonts(fonts)
+            row = self.font_model.rowForFamily(current_text)
+            if row >= 0:
+                self.font_family_combo.setCurrentIndex(row)
+            else:
+                self.font_family_combo.setCurrentText(current_text)
+        finally:
+            self.font_family_combo.blockSignals(False)
+
     def detectFontWeight(self, font_name):
         """フォント名からフォントウェイトを検出"""
-        font_name_lower = font_name.lower()
-        
-        # フォント名に含まれるウェイトキーワードを検出
-        if any(keyword in font_name_lower for keyword in ['black', 'heavy', '900']):
-            return 900
-        elif any(keyword in font_name_lower for keyword in ['extra bold', 'ultra bold', '800']):
-            return 800
-        elif any(keyword in font_name_lower for keyword in ['bold', '700']):
-            return 700
-        elif any(keyword in font_name_lower for keyword in ['semi bold', 'demi bold', '600']):
-            return 600
-        elif any(keyword in font_name_lower for keyword in ['medium', '500']):
-            return 500
-        elif any(keyword in font_name_lower for keyword in ['regular', 'normal', '400']):
-            return 400
-        elif any(keyword in font_name_lower for keyword in ['light', '300']):
-            return 300
-        elif any(keyword in font_name_lower for keyword in ['extra light', 'ultra light', '200']):
-            return 200
-        elif any(keyword in font_name_lower for keyword in ['thin', '100']):
-            return 100
-        else:
-            return 400  # デフォルト
-        
+        weight = weight_from_name(font_name)
+        return weight if weight is not None else 400  # デフォルト
+    
     def setupUI(self):
         layout = QVBoxLayout()
         
@@ -133,6 +190,7 @@ class VerticalTextDialog(QDialog):
         self.text_input = QTextEdit()
         self.text_input.setPlainText(self.text)
         self.text_input.setMaximumHeight(100)
+        self.text_input.textChanged.connect(self.preview_scheduler.schedule)
         text_layout.addRow("テキスト:", self.text_input)
         
         text_group.setLayout(text_layout)
@@ -145,15 +203,20 @@ class VerticalTextDialog(QDialog):
         self.font_size_spin = QSpinBox()
         self.font_size_spin.setRange(8, 200)
         self.font_size_spin.setValue(self.font_size)
+        self.font_size_spin.valueChanged.connect(self.preview_scheduler.schedule)
         font_layout.addRow("フォントサイズ:", self.font_size_spin)
         
         # フォント選択用のComboBox
         self.font_family_combo = QComboBox()
         self.font_family_combo.setEditable(True)  # 手動入力も可能にする
-        self.font_family_combo.addItems(self.available_fonts)
+        # 一覧は表示される分だけ読み込み、補完は前方一致の索引から候補を引く
+        self.font_model = FontListModel(self.available_fonts, self)
+        self.font_family_combo.setModel(self.font_model)
+        self.font_family_combo.setCompleter(
+            createFontCompleter(self.font_model, self.font_family_combo.lineEdit(), self))
         
         # デフォルトフォントを設定
-        default_index = self.font_family_combo.findText(self.font_family)
+        default_index = self.font_model.rowForFamily(self.font_family)
         if default_index >= 0:
             self.font_family_combo.setCurrentIndex(default_index)
         else:
@@ -164,23 +227,13 @@ class VerticalTextDialog(QDialog):
         
         font_layout.addRow("フォントファミリー:", self.font_family_combo)
         
-        # フォントウェイト選択用のComboBox
+        # フォントウェイト選択用のComboBox（フォントが持つウェイトだけを表示する）
         self.font_weight_combo = QComboBox()
-        self.font_weight_combo.addItem("Thin (100)", 100)
-        self.font_weight_combo.addItem("Extra Light (200)", 200)
-        self.font_weight_combo.addItem("Light (300)", 300)
-        self.font_weight_combo.addItem("Regular (400)", 400)
-        self.font_weight_combo.addItem("Medium (500)", 500)
-        self.font_weight_combo.addItem("Semi Bold (600)", 600)
-        self.font_weight_combo.addItem("Bold (700)", 700)
-        self.font_weight_combo.addItem("Extra Bold (800)", 800)
-        self.font_weight_combo.addItem("Black (900)", 900)
+        self._weight_rows = {}
+        self.setWeightChoices(self.availableWeights(self.font_family_combo.currentText()))
         
         # デフォルトウェイトを設定
-        for i in range(self.font_weight_combo.count()):
-            if self.font_weight_combo.itemData(i) == self.font_weight:
-                self.font_weight_combo.setCurrentIndex(i)
-                break
+        self.selectWeight(self.font_weight)
         
         # フォントウェイト選択時のイベント接続
         self.font_weight_combo.currentIndexChanged.connect(self.onFontWeightChanged)
@@ -189,6 +242,7 @@ class VerticalTextDialog(QDialog):
         
         self.force_monospace_check = QCheckBox("強制的に等幅にする")
         self.force_monospace_check.setChecked(self.force_monospace)
+        self.force_monospace_check.toggled.connect(self.preview_scheduler.schedule)
         font_layout.addRow("", self.force_monospace_check)
         
         font_group.setLayout(font_layout)
@@ -202,17 +256,20 @@ class VerticalTextDialog(QDialog):
         self.line_spacing_spin.setRange(50, 300)
         self.line_spacing_spin.setValue(int(self.line_spacing * 100))
         self.line_spacing_spin.setSuffix("%")
+        self.line_spacing_spin.valueChanged.connect(self.preview_scheduler.schedule)
         layout_layout.addRow("行間:", self.line_spacing_spin)
         
         self.char_spacing_spin = QSpinBox()
         self.char_spacing_spin.setRange(50, 200)
         self.char_spacing_spin.setValue(int(self.char_spacing * 100))
         self.char_spacing_spin.setSuffix("%")
+        self.char_spacing_spin.valueChanged.connect(self.preview_scheduler.schedule)
         layout_layout.addRow("文字間隔:", self.char_spacing_spin)
         
         self.line_feed_spin = QSpinBox()
         self.line_feed_spin.setRange(1, 50)
         self.line_feed_spin.setValue(self.line_feed)
+        self.line_feed_spin.valueChanged.connect(self.preview_scheduler.schedule)
         layout_layout.addRow("強制改行文字数:", self.line_feed_spin)
         
         # テキスト方向設定
@@ -226,6 +283,7 @@ class VerticalTextDialog(QDialog):
         self.direction_left_to_right = QRadioButton("左から右")
         self.direction_left_to_right.setChecked(self.text_direction == "left_to_right")
         self.direction_button_group.addButton(self.direction_left_to_right, 1)
+        self.direction_button_group.buttonClicked.connect(self.preview_scheduler.schedule)
         
         direction_layout.addWidget(self.direction_right_to_left)
         direction_layout.addWidget(self.direction_left_to_right)
@@ -233,6 +291,15 @@ class VerticalTextDialog(QDialog):
         
         layout_layout.addRow("テキスト方向:", direction_layout)
         
+        # 句読点や括弧の縦書き用の字形
+        self.vertical_forms_combo = QComboBox()
+        self.vertical_forms_combo.addItem("縦書き用の字形に置き換える", VERTICAL_FORMS_SUBSTITUTE)
+        self.vertical_forms_combo.addItem("文字の向きを指定する", VERTICAL_FORMS_ORIENTATION)
+        self.vertical_forms_combo.addItem("そのまま", VERTICAL_FORMS_NONE)
+        self.vertical_forms_combo.setCurrentIndex(self.vertical_forms_combo.findData(self.vertical_forms))
+        self.vertical_forms_combo.currentIndexChanged.connect(self.preview_scheduler.schedule)
+        layout_layout.addRow("句読点・括弧:", self.vertical_forms_combo)
+        
         layout_group.setLayout(layout_layout)
         layout.addWidget(layout_group)
         
@@ -255,6 +322,31 @@ class VerticalTextDialog(QDialog):
         color_group.setLayout(color_layout)
         layout.addWidget(color_group)
         
+        # 追加先グループ（既存のレイヤーに追加し、レイヤーが増え続けないようにする）
+        target_group = QGroupBox("追加先")
+        target_layout = QFormLayout()
+        
+        self.insert_target_combo = QComboBox()
+        self.insert_target_combo.addItem("新しいレイヤー", TARGET_NEW_LAYER)
+        self.insert_target_combo.addItem("アクティブなベクターレイヤー", TARGET_ACTIVE_LAYER)
+        self.insert_target_combo.addItem("名前で指定したレイヤー", TARGET_NAMED_LAYER)
+        self.insert_target_combo.setCurrentIndex(self.insert_target_combo.findData(self.insert_target))
+        self.insert_target_combo.currentIndexChanged.connect(self.onInsertTargetChanged)
+        target_layout.addRow("追加先:", self.insert_target_combo)
+        
+        self.target_layer_name_edit = QLineEdit(self.target_layer_name)
+        self.target_layer_name_edit.textChanged.connect(self.onTargetLayerNameChanged)
+        target_layout.addRow("レイヤー名:", self.target_layer_name_edit)
+        self.onInsertTargetChanged(self.insert_target_combo.currentIndex())
+        
+        self.defer_refresh_check = QCheckBox("表示の更新をダイアログを閉じるまでまとめる")
+        self.defer_refresh_check.setChecked(self.projection_refresher.deferred)
+        self.defer_refresh_check.toggled.connect(self.onDeferRefreshToggled)
+        target_layout.addRow(self.defer_refresh_check)
+        
+        target_group.setLayout(target_layout)
+        layout.addWidget(target_group)
+        
         # プレビューグループ
         preview_group = QGroupBox("プレビュー")
         preview_layout = QVBoxLayout()
@@ -291,240 +383,228 @@ class VerticalTextDialog(QDialog):
         
         self.setLayout(layout)
         
+        # 診断パネル（処理段階ごとの所要時間）を開く隠しショートカット
+        self.diagnostics_shortcut = QShortcut(QKeySequence(DIAGNOSTICS_SHORTCUT), self)
+        self.diagnostics_shortcut.activated.connect(self.showDiagnostics)
+        
         # 初期プレビュー更新（UIの構築を完了させてから実行）
-        from PyQt5.QtCore import QTimer
-        QTimer.singleShot(200, self.updatePreview)
+        self.preview_scheduler.schedule()
         
-        # さらに確実にするため、showEventでも更新
+        # さらに確実にするため、showEventでも更新（予約済みの更新とまとめられる）
         self._initial_preview_done = False
+        # 描画を要求してまだ表示していないか、閉じる時に更新を取り消したか
+        self._preview_requested = False
+        self._preview_stale = False
     
     def onFontFamilyChanged(self, font_family):
         """フォントファミリーが変更された時のイベントハンドラー"""
         self.font_family = font_family
         
-        # フォント名からウェイトを自動検出して設定
-        detected_weight = self.detectFontWeight(font_family)
-        self.font_weight = detected_weight
+        # フォントが持つウェイトだけを選択肢にする（ファミリーごとに一度だけ調べる）
+        weights = self.availableWeights(font_family)
+        self.setWeightChoices(weights)
         
-        # ウェイトコンボボックスの選択を更新
-        for i in range(self.font_weight_combo.count()):
-            if self.font_weight_combo.itemData(i) == detected_weight:
-                self.font_weight_combo.setCurrentIndex(i)
-                break
+        # フォント名から推定したウェイトに最も近いものを選択
+        self.font_weight = nearest_weight(self.detectFontWeight(font_family), weights)
+        self.selectWeight(self.font_weight)
         
-        # プレビューを自動更新
-        self.updatePreview()
+        # プレビューの更新を予約
+        self.preview_scheduler.schedule()
     
+    def availableWeights(self, font_family):
+        """フォントが持つウェイトの一覧（不明なフォントはすべてのウェイト）
+
+        入力中のフォント名のように一覧に無い名前は調べない。
+        """
+        return (font_weight_resolver.weights(primary_font_family(font_family),
+                                             self.font_model.prefixIndex())
+                or FONT_WEIGHTS)
+
+    def setWeightChoices(self, weights):
+        """ウェイトコンボボックスの選択肢を設定"""
+        if tuple(self._weight_rows) == tuple(weights):
+            return
+        self.font_weight_combo.blockSignals(True)
+        try:
+            self.font_weight_combo.clear()
+            self._weight_rows = {}
+            for weight in weights:
+                self._weight_rows[weight] = self.font_weight_combo.count()
+                self.font_weight_combo.addItem(f"{FONT_WEIGHT_NAMES[weight]} ({weight})", weight)
+        finally:
+            self.font_weight_combo.blockSignals(False)
+
+    def selectWeight(self, weight):
+        """ウェイトコンボボックスで指定したウェイトを選択"""
+        row = self._weight_rows.get(weight)
+        if row is not None:
+            self.font_weight_combo.setCurrentIndex(row)
+
     def onFontWeightChanged(self, index):
         """フォントウェイトが変更された時のイベントハンドラー"""
         self.font_weight = self.font_weight_combo.itemData(index)
         # デバッグ情報を出力（開発時のみ）
         if hasattr(self, '_debug_mode') and self._debug_mode:
             print(f"フォントウェイト変更: {self.font_weight}")
-        # プレビューを自動更新
-        self.updatePreview()
+        # プレビューの更新を予約
+        self.preview_scheduler.schedule()
+    
+    def onInsertTargetChanged(self, index):
+        """追加先が変更された時のイベントハンドラー"""
+        self.insert_target = self.insert_target_combo.itemData(index)
+        # レイヤー名は名前で指定する場合と新しく作成する場合に使う
+        self.target_layer_name_edit.setEnabled(self.insert_target != TARGET_ACTIVE_LAYER)
+    
+    def onTargetLayerNameChanged(self, name):
+        """レイヤー名が変更された時のイベントハンドラー"""
+        self.target_layer_name = name.strip() or DEFAULT_LAYER_NAME
+    
+    def onDeferRefreshToggled(self, checked):
+        """表示の更新をまとめるかが変更された時のイベントハンドラー"""
+        self.projection_refresher.deferred = checked
+        if not checked:
+            # 保留していた更新があればすぐに反映する
+            self.flushProjection()
+    
+    def flushProjection(self):
+        """保留している表示の更新をまとめて行う"""
+        try:
+            self.projection_refresher.flush()
+        except Exception as e:
+            print(f"表示の更新エラー: {e}")
+            self.logToFile(f"表示の更新エラー: {e}")
+    
+    def showDiagnostics(self):
+        """診断パネルを表示"""
+        DiagnosticsDialog(self).exec_()
     
     def showEvent(self, event):
         """ダイアログが表示された時のイベント"""
         super().showEvent(event)
-        if not self._initial_preview_done:
-            # 初期プレビューがまだ完了していない場合、更新
-            from PyQt5.QtCore import QTimer
-            QTimer.singleShot(50, self.updatePreview)
+        if not self._initial_preview_done or self._preview_stale:
+            # 初期プレビューがまだ完了していない場合や、前回閉じた時に更新を取り消した場合は
+            # 更新を予約（開き直した場合は前回のプレビューをそのまま使う）
+            self.preview_scheduler.schedule()
             self._initial_preview_done = True
+            self._preview_stale = False
         
     def logToFile(self, message):
-        """デバッグ情報をファイルに出力"""
-        try:
-            import os
-            import datetime
-            
-            # ログファイルのパス
-            log_file = os.path.join(os.path.expanduser("~"), "krita_plugin_debug.log")
-            
-            # タイムスタンプ付きでログを出力
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_message = f"[{timestamp}] {message}\n"
-            
-            with open(log_file, "a", encoding="utf-8") as f:
-                f.write(log_message)
-                
-        except Exception as e:
-            print(f"ログファイル出力エラー: {e}")
+        """デバッグ情報をファイルに出力（書き込みはバックグラウンドでまとめて行う）"""
+        debug_logger.log(message)
     
     def selectColor(self):
         color = QColorDialog.getColor(self.text_color, self)
         if color.isValid():
             self.text_color = color
             self.color_label.setStyleSheet(f"background-color: {color.name()}; border: 1px solid black;")
-            # プレビューを自動更新
-            self.updatePreview()
+            # プレビューの更新を予約
+            self.preview_scheduler.schedule()
+    
+    def setPreviewDelay(self, delay_ms):
+        """設定変更からプレビュー更新までの待ち時間（ミリ秒）を設定"""
+        self.preview_delay_ms = delay_ms
+        self.preview_scheduler.setDelay(delay_ms)
     
     def updatePreview(self):
+        # 直接呼ばれた場合は予約済みの更新を取り消す（二重描画を防ぐ）
+        self.preview_scheduler.cancel()
         try:
-            # 現在の設定を取得
-            text = self.text_input.toPlainText()
-            font_size = self.font_size_spin.value()
-            line_spacing = self.line_spacing_spin.value() / 100.0
-            char_spacing = self.char_spacing_spin.value() / 100.0
-            line_feed = self.line_feed_spin.value()
-            font_family = self.font_family_combo.currentText()
-            font_weight = self.font_weight_combo.currentData()
-            force_monospace = self.force_monospace_check.isChecked()
-            
-            # デバッグ情報を出力（開発時のみ）
-            if hasattr(self, '_debug_mode') and self._debug_mode:
-                print(f"プレビュー更新: フォント='{font_family}', ウェイト={font_weight}, サイズ={font_size}")
-            
             # テキスト方向を取得
             if self.direction_right_to_left.isChecked():
                 text_direction = "right_to_left"
             else:
                 text_direction = "left_to_right"
             
-            # SVGを生成
-            svg_content = self.generateVerticalTextSVG(
-                text, font_size, line_spacing, char_spacing, line_feed, 
-                font_family, font_weight, self.text_color, force_monospace, text_direction
-            )
-            
-            # プレビュー用のQPixmapを生成（プレビューラベルのサイズに合わせる）
-            pixmap = self.svgToPixmap(svg_content, 350, 350, text_direction)
-            
-            # プレビューラベルに設定
-            self.preview_label.setPixmap(pixmap)
-            
-            # プレビューラベルを更新（強制的に再描画）
-            self.preview_label.update()
-            self.preview_label.repaint()
-            
-            # アプリケーションのイベントループを処理
-            from PyQt5.QtWidgets import QApplication
-            QApplication.processEvents()
+            # 現在の設定からレイアウトを計算（SVG生成と共通の結果を使う）
+            params = self.previewParams(text_direction)
             
             # デバッグ情報を出力（開発時のみ）
             if hasattr(self, '_debug_mode') and self._debug_mode:
-                print(f"プレビュー更新完了: テキスト='{text}', ピクセマップサイズ={pixmap.width()}x{pixmap.height()}")
+                print(f"プレビュー更新: フォント='{params.font_family}', ウェイト={params.font_weight}, サイズ={params.layout.font_size}")
+            
+            # プレビューの描画を要求（プレビューラベルのサイズに合わせる）
+            # 描画はワーカースレッドで行われ、完成するとonPreviewImageReadyが呼ばれる
+            self._preview_requested = True
+            self.preview_renderer.request(params, 350, 350)
             
         except Exception as e:
             QMessageBox.warning(self, "エラー", f"プレビューの生成に失敗しました: {str(e)}")
             import traceback
             traceback.print_exc()
     
+    def onPreviewImageReady(self, image):
+        """ワーカーで描画されたプレビュー画像を表示（UIスレッドで実行）"""
+        self._preview_requested = False
+        pixmap = QPixmap.fromImage(image)
+        self.preview_label.setPixmap(pixmap)
+        
+        # デバッグ情報を出力（開発時のみ）
+        if hasattr(self, '_debug_mode') and self._debug_mode:
+            print(f"プレビュー更新完了: ピクセマップサイズ={pixmap.width()}x{pixmap.height()}")
+    
+    def currentLayout(self, text_direction="right_to_left"):
+        """現在のウィジェットの値からレイアウトを計算（前回から変わった列だけ計算する）"""
+        return self.incremental_layout.layout(
+            apply_vertical_forms(self.text_input.toPlainText(), self.vertical_forms_combo.currentData()),
+            self.font_size_spin.value(),
+            self.line_spacing_spin.value() / 100.0,
+            self.char_spacing_spin.value() / 100.0,
+            self.line_feed_spin.value(),
+            text_direction,
+        )
+    
+    def previewParams(self, text_direction="right_to_left"):
+        """現在のウィジェットの値からプレビュー用の設定を作成"""
+        return PreviewParams(
+            layout=self.currentLayout(text_direction),
+            font_family=self.font_family_combo.currentText(),
+            font_weight=self.font_weight_combo.currentData(),
+            text_color=QColor(self.text_color),
+        )
+    
+    def done(self, result):
+        """ダイアログを閉じる時に予約・描画中のプレビューを破棄
+
+        ダイアログは閉じても破棄せずに再利用するため、取り消した更新は次に開いた時に行う。
+        """
+        self._preview_stale = self.preview_scheduler.isPending() or self._preview_requested
+        self._preview_requested = False
+        self.preview_scheduler.cancel()
+        self.preview_renderer.cancel()
+        self.preview_renderer.waitForDone()
+        # 保留している表示の更新があれば1回で反映する
+        self.flushProjection()
+        super().done(result)
+    
     def generateVerticalTextSVG(self, text, font_size, line_spacing, char_spacing, line_feed, 
                                font_family, font_weight, text_color, force_monospace, text_direction="right_to_left"):
         """縦書きテキストのSVGを生成"""
         
         # デバッグ出力（開発時のみ）
         if hasattr(self, '_debug_mode') and self._debug_mode:
+            primary_font = primary_font_family(font_family)
+            family = svg_font_family(font_family)
             print(f"SVG生成 - フォントファミリー: '{font_family}'")
-            self.logToFile(f"SVG生成 - フォントファミリー: '{font_family}'")
-        
-        # テキストを行に分割
-        lines = self.splitTextIntoLines(text, line_feed)
-        
-        # フォント設定（フォールバック対応）
-        # カンマ区切りのフォント名から最初のフォントのみを使用
-        primary_font = font_family.split(',')[0].strip()
-        
-        # フォントウェイトは引数で受け取った値を使用
-        
-        # SVGでのフォント指定を改善
-        # フォント名にスペースが含まれている場合は引用符で囲む
-        if ' ' in primary_font:
-            svg_font_family = f'"{primary_font}"'
-        else:
-            svg_font_family = primary_font
-        
-        # フォールバック用のフォントリストも追加
-        if primary_font not in ['serif', 'sans-serif', 'monospace', 'cursive', 'fantasy']:
-            svg_font_family += ', serif'  # フォールバック用
-            
-        # デバッグ出力（開発時のみ）
-        if hasattr(self, '_debug_mode') and self._debug_mode:
             print(f"SVG生成 - プライマリフォント: '{primary_font}'")
-            print(f"SVG生成 - SVG用フォント名: '{svg_font_family}'")
+            print(f"SVG生成 - SVG用フォント名: '{family}'")
+            self.logToFile(f"SVG生成 - フォントファミリー: '{font_family}'")
             self.logToFile(f"SVG生成 - プライマリフォント: '{primary_font}'")
-            self.logToFile(f"SVG生成 - SVG用フォント名: '{svg_font_family}'")
-        
-        # SVGのサイズを計算（縦書きレイアウト用）
-        max_line_length = max(len(line) for line in lines) if lines else 1
-        svg_width = len(lines) * font_size * line_spacing + 100  # 行数 × 行間 + マージン
-        svg_height = max_line_length * font_size + 100  # 最長行の文字数 × フォントサイズ + マージン
-        
-        # SVGルート要素を作成
-        svg = ET.Element("svg")
-        svg.set("width", str(svg_width))
-        svg.set("height", str(svg_height))
-        svg.set("xmlns", "http://www.w3.org/2000/svg")
-        svg.set("xmlns:xlink", "http://www.w3.org/1999/xlink")
-        
-        # 背景（透明）
-        rect = ET.SubElement(svg, "rect")
-        rect.set("width", "100%")
-        rect.set("height", "100%")
-        rect.set("fill", "none")
-        
-        # 一つのtext要素を作成（縦書き用）
-        text_elem = ET.SubElement(svg, "text")
-        
-        # 縦書き用の属性を設定
-        text_elem.set("text-rendering", "auto")
-        text_elem.set("fill", text_color.name())
-        text_elem.set("stroke-opacity", "0")
-        text_elem.set("stroke", "#000000")
-        text_elem.set("stroke-width", "0")
-        text_elem.set("stroke-linecap", "square")
-        text_elem.set("stroke-linejoin", "bevel")
-        text_elem.set("letter-spacing", "0")
-        text_elem.set("word-spacing", "0")
-        text_elem.set("writing-mode", "vertical-rl")
-        
-        # style属性を設定
-        style_parts = [
-            "text-align: start",
-            "text-align-last: auto",
-            f"font-family: {svg_font_family}",
-            f"font-size: {font_size}",
-            f"font-weight: {font_weight}"
-        ]
-        
-        if force_monospace:
-            style_parts.append("font-variant-numeric: tabular-nums")
-        
-        text_elem.set("style", "; ".join(style_parts))
-        
-        # 各行のテキストをtspanで配置
-        for i, line in enumerate(lines):
-            if not line.strip():  # 空行はスキップ
-                continue
-                
-            # テキスト方向に応じてX座標を計算
-            if text_direction == "right_to_left":
-                # 右から左：最後の行から最初の行へ
-                x_coord = 50 + (len(lines) - 1 - i) * font_size * line_spacing
-            else:
-                # 左から右：最初の行から最後の行へ
-                x_coord = 50 + i * font_size * line_spacing
-            
-            # 最初の文字のY座標
-            y_coord = 50 + font_size
-            
-            # 行のテキストを一つのtspanにまとめる
-            tspan = ET.SubElement(text_elem, "tspan")
-            tspan.set("x", str(x_coord))
-            tspan.set("y", str(y_coord))
-            tspan.text = line
-            
-            # 次の行のためにdx属性で位置調整（縦書きでは行間を調整）
-            if i < len(lines) - 1:  # 最後の行でない場合
-                next_tspan = ET.SubElement(text_elem, "tspan")
-                next_tspan.set("y", "0")
-                next_tspan.set("dx", f"-{int(font_size * line_spacing)}")
-                next_tspan.text = ""  # 空のtspanで位置調整
+            self.logToFile(f"SVG生成 - SVG用フォント名: '{family}'")
+        
+        # SVGの生成はQtに依存しないコア処理に委譲
+        # レイアウトはプレビューと同じIncrementalLayoutから取得し、同じ設定なら同じ結果を使う
+        vertical_forms = self.vertical_forms_combo.currentData()
+        layout = self.incremental_layout.layout(
+            apply_vertical_forms(text, vertical_forms), font_size, line_spacing, char_spacing,
+            line_feed, text_direction)
+        # キャンバスはフォントから測った文字の送り幅で、テキストが収まる最小の大きさにする
+        svg_content = generate_svg_from_layout(
+            layout, font_family, font_weight, text_color, force_monospace,
+            metrics=advanceMetricsFor(primary_font_family(font_family), font_weight),
+            vertical_forms=vertical_forms
+        )
         
         # 生成されたSVGの内容をデバッグ出力（開発時のみ）
-        svg_content = ET.tostring(svg, encoding='unicode')
         if hasattr(self, '_debug_mode') and self._debug_mode:
             print(f"生成されたSVG（最初の500文字）: {svg_content[:500]}")
             self.logToFile(f"生成されたSVG（最初の500文字）: {svg_content[:500]}")
@@ -532,118 +612,22 @@ class VerticalTextDialog(QDialog):
         return svg_content
     
     def splitTextIntoLines(self, text, line_feed):
-        """テキストを行に分割（改行文字と強制改行を考慮）"""
-        lines = []
-        current_line = ""
-        char_count = 0
-        
-        for char in text:
-            if char == '\n':
-                if current_line:
-                    lines.append(current_line)
-                    current_line = ""
-                    char_count = 0
-            else:
-                current_line += char
-                char_count += 1
-                
-                # 強制改行文字数に達した場合
-                if char_count >= line_feed:
-                    # 句読点や括弧の場合は改行しない
-                    if char not in ['。', '、', '」', '』']:
-                        lines.append(current_line)
-                        current_line = ""
-                        char_count = 0
-        
-        if current_line:
-            lines.append(current_line)
-            
-        return lines
+        """テキストを行に分割（改行文字と強制改行を考慮）
+
+        プレビューとSVGの生成では使わない（行分割はレイアウトの計算時に
+        split_linesとして計測される）。
+        """
+        return split_text_into_lines(text, line_feed)
     
     def svgToPixmap(self, svg_content, width, height, text_direction="right_to_left"):
-        """SVGコンテンツをQPixmapに変換"""
-        # 簡単なプレビュー用の実装
-        pixmap = QPixmap(width, height)
-        pixmap.fill(Qt.white)
-        
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        # フォント設定
-        font = QFont()
-        font.setFamily(self.font_family_combo.currentText())
-        font.setPointSize(self.font_size_spin.value())
-        font_weight = self.font_weight_combo.currentData()
-        font.setWeight(font_weight)
-        painter.setFont(font)
+        """SVGコンテンツをQPixmapに変換（UIスレッドで同期的に描画）"""
+        params = self.previewParams(text_direction)
         
         # デバッグ情報を出力（開発時のみ）
         if hasattr(self, '_debug_mode') and self._debug_mode:
-            print(f"プレビュー描画: フォント='{self.font_family_combo.currentText()}', ウェイト={font_weight}, サイズ={self.font_size_spin.value()}")
-        painter.setPen(self.text_color)
-        
-        # テキストを描画
-        text = self.text_input.toPlainText()
-        lines = self.splitTextIntoLines(text, self.line_feed_spin.value())
-        
-        # フォント設定
-        font_size = self.font_size_spin.value()
-        line_spacing = self.line_spacing_spin.value() / 100.0
-        char_spacing = self.char_spacing_spin.value() / 100.0
-        
-        # 縦書きテキストの描画
-        # プレビューエリアの中央に配置するように計算
-        total_lines = len(lines)
-        max_line_length = max(len(line) for line in lines) if lines else 1
-        
-        # プレビューエリアの中央を計算
-        preview_center_x = width // 2
-        preview_center_y = height // 2
-        
-        # テキスト全体のサイズを計算
-        total_text_width = total_lines * font_size * line_spacing
-        total_text_height = max_line_length * font_size
-        
-        # テキストの開始位置を中央から計算
-        start_x = preview_center_x - total_text_width // 2
-        start_y = preview_center_y - total_text_height // 2
-        
-        # 各行のX座標を計算（縦書きでは行が横に並ぶ）
-        if text_direction == "right_to_left":
-            # 右から左：最後の行から最初の行へ
-            x_offset = start_x + total_text_width - font_size * line_spacing
-        else:
-            # 左から右：最初の行から最後の行へ
-            x_offset = start_x
-            
-        for i, line in enumerate(lines):
-            y_offset = start_y
-            for char in line:
-                if char.strip():
-                    # 縦書きでは文字を縦に配置
-                    # フォントサイズを基準にした描画位置
-                    draw_x = int(x_offset + font_size // 2)  # 文字の中央に配置（整数に変換）
-                    draw_y = int(y_offset + font_size)  # ベースライン位置（整数に変換）
-                    painter.drawText(draw_x, draw_y, char)
-                    
-                    y_offset += font_size * char_spacing  # 次の文字は下に配置（文字間隔を適用）
-            
-            # 次の行のX座標を計算（行間を考慮）
-            # 行間は文字の幅 + 余白として計算
-            # 最小行間を確保するため、フォントサイズの1.5倍以上にする
-            min_line_width = int(font_size * 1.5)
-            calculated_line_width = int(font_size * line_spacing)
-            actual_line_width = max(min_line_width, calculated_line_width)
-            
-            if text_direction == "right_to_left":
-                # 右から左：次の行は左に移動
-                x_offset -= actual_line_width
-            else:
-                # 左から右：次の行は右に移動
-                x_offset += actual_line_width
+            print(f"プレビュー描画: フォント='{params.font_family}', ウェイト={params.font_weight}, サイズ={params.layout.font_size}")
         
-        painter.end()
-        return pixmap
+        return QPixmap.fromImage(renderPreviewImage(params, width, height))
     
     def addToKrita(self):
         """生成したSVGをKritaに追加"""
@@ -670,14 +654,15 @@ class VerticalTextDialog(QDialog):
                 QMessageBox.warning(self, "エラー", "アクティブなドキュメントがありません。")
                 return
             
-            # 方法1: Krita 5のaddShapesFromSvgを使用してテキストを追加
-            success = self.addTextWithKrita5SVG(doc, text, font_size, line_spacing, char_spacing, line_feed, font_family, font_weight, self.text_color, force_monospace, text_direction)
-            
-            # 方法1が失敗した場合、クリップボード経由でフォールバック
-            if not success:
-                print("addShapesFromSvgが失敗したため、クリップボード経由でフォールバックします")
-                self.logToFile("addShapesFromSvgが失敗したため、クリップボード経由でフォールバックします")
-                success = self.addTextViaClipboard(doc, text, font_size, line_spacing, char_spacing, line_feed, font_family, font_weight, self.text_color, force_monospace, text_direction)
+            with span("insert"):
+                # 方法1: Krita 5のaddShapesFromSvgを使用してテキストを追加
+                success = self.addTextWithKrita5SVG(doc, text, font_size, line_spacing, char_spacing, line_feed, font_family, font_weight, self.text_color, force_monospace, text_direction)
+                
+                # 方法1が失敗した場合、クリップボード経由でフォールバック
+                if not success:
+                    print("addShapesFromSvgが失敗したため、クリップボード経由でフォールバックします")
+                    self.logToFile("addShapesFromSvgが失敗したため、クリップボード経由でフォールバックします")
+                    success = self.addTextViaClipboard(doc, text, font_size, line_spacing, char_spacing, line_feed, font_family, font_weight, self.text_color, force_monospace, text_direction)
             
             # 結果をユーザーに通知
             if success:
@@ -699,7 +684,7 @@ class VerticalTextDialog(QDialog):
             self.logToFile("=== addTextWithKrita5SVG 開始 ===")
             
             # PyQt5.QtSvgが利用可能かチェック
-            if not QTSVG_AVAILABLE:
+            if not isQtSvgAvailable():
                 print("PyQt5.QtSvg is not available, skipping SVG method")
                 self.logToFile("PyQt5.QtSvg is not available, skipping SVG method")
                 return False
@@ -715,23 +700,16 @@ class VerticalTextDialog(QDialog):
             print(f"SVG生成完了: {len(svg_content)} 文字")
             self.logToFile(f"SVG生成完了: {len(svg_content)} 文字")
             
-            # 新しいベクターレイヤーを作成
-            root = doc.rootNode()
-            print("ドキュメントのルートノードを取得")
-            self.logToFile("ドキュメントのルートノードを取得")
-            
-            vector_layer = doc.createVectorLayer("縦書きテキスト")
-            print("ベクターレイヤーを作成")
-            self.logToFile("ベクターレイヤーを作成")
-            
-            root.addChildNode(vector_layer, None)
-            print("ベクターレイヤーをルートに追加")
-            self.logToFile("ベクターレイヤーをルートに追加")
-            
-            # レイヤーをアクティブにする
-            doc.setActiveNode(vector_layer)
-            print("ベクターレイヤーをアクティブに設定")
-            self.logToFile("ベクターレイヤーをアクティブに設定")
+            # 追加先のベクターレイヤーを決める（該当するレイヤーが無い場合だけ作成）
+            vector_layer, created = resolve_target_layer(
+                doc, getattr(self, 'insert_target', TARGET_NEW_LAYER),
+                getattr(self, 'target_layer_name', DEFAULT_LAYER_NAME))
+            if created:
+                print("ベクターレイヤーを作成してアクティブに設定")
+                self.logToFile("ベクターレイヤーを作成してアクティブに設定")
+            else:
+                print(f"既存のベクターレイヤーに追加: {vector_layer.name()}")
+                self.logToFile(f"既存のベクターレイヤーに追加: {vector_layer.name()}")
             
             # Krita 5のaddShapesFromSvgメソッドを使用
             try:
@@ -743,15 +721,23 @@ class VerticalTextDialog(QDialog):
                     self.logToFile("addShapesFromSvgメソッドが利用可能です")
                     
                     # SVGコンテンツをベクターレイヤーに追加
-                    vector_layer.addShapesFromSvg(svg_content)
+                    with span("krita_add_shapes"):
+                        vector_layer.addShapesFromSvg(svg_content)
                     print("addShapesFromSvgを実行しました")
                     self.logToFile("addShapesFromSvgを実行しました")
                     
-                    # レイヤーを更新
-                    vector_layer.updateProjection()
-                    doc.refreshProjection()
-                    print("レイヤーとドキュメントを更新しました")
-                    self.logToFile("レイヤーとドキュメントを更新しました")
+                    # レイヤーを更新（遅延モードではダイアログを閉じる時にまとめて更新）
+                    refresher = getattr(self, 'projection_refresher', None)
+                    if refresher is None:
+                        refresh_projection(doc, vector_layer)
+                    else:
+                        refresher.request(doc, vector_layer)
+                    if refresher is not None and refresher.deferred:
+                        print("レイヤーとドキュメントの更新を保留しました")
+                        self.logToFile("レイヤーとドキュメントの更新を保留しました")
+                    else:
+                        print("レイヤーとドキュメントを更新しました")
+                        self.logToFile("レイヤーとドキュメントを更新しました")
                     
                     print("Krita 5のaddShapesFromSvgでSVGを追加しました - 成功")
                     self.logToFile("Krita 5のaddShapesFromSvgでSVGを追加しました - 成功")
@@ -818,31 +804,3 @@ Kritaに追加する手順:
             import traceback
             traceback.print_exc()
             return False
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
-
-class RVerticalText(Extension):
-    def __init__(self, parent):
-        super().__init__(parent)
-
-    def setup(self):
-        pass
-
-    def createActions(self, window):
-        action = window.createAction("rVerticalText", "縦書きテキスト生成", "tools/scripts")
-        action.triggered.connect(self.showVerticalTextDialog)
-
-    def showVerticalTextDialog(self):
-        dialog = VerticalTextDialog()
-        dialog.exec_()
-
-# 拡張機能をKritaに追加
-Krita.instance().addExtension(RVerticalText(Krita.instance()))
\ No newline at end of file
@@ -0,0 +1,448 @@
+"""
+縦書きテキストのSVG生成
+
+Qtに依存しない純粋なPythonの関数としてSVGを生成する。
+色はSVG用の文字列（"#rrggbb"）か、name()を持つオブジェクト（QColorなど）で指定する。
+
+SVGの書き出しには2つの方式がある。
+- "fast": エスケープした文字列を直接書き出す（既定）
+- "etree": xml.etree.ElementTreeで要素ツリーを組み立てて文字列化する
+どちらも同じ属性の並びから書き出すため、出力は同一になる。
+generate_batch_svgは複数のテキストをtext要素として1つのSVGにまとめる。
+縦書き用の字形（vertical_formsモジュール）はレイアウトの前にテキストへ適用するか、
+text要素に文字の向きの属性を出力する。
+"""
+
+import io
+import itertools
+from functools import lru_cache
+
+try:
+    from .layout import compute_layout
+    from .timing import span
+    from .vertical_forms import (apply_vertical_forms, check_vertical_forms_mode,
+                                 DEFAULT_VERTICAL_FORMS, VERTICAL_FORMS_ORIENTATION,
+                                 ORIENTATION_ATTRIBUTES, ORIENTATION_STYLES)
+except ImportError:
+    # プラグインディレクトリを直接パスに追加した場合（テスト用）
+    from layout import compute_layout
+    from timing import span
+    from vertical_forms import (apply_vertical_forms, check_vertical_forms_mode,
+                                DEFAULT_VERTICAL_FORMS, VERTICAL_FORMS_ORIENTATION,
+                                ORIENTATION_ATTRIBUTES, ORIENTATION_STYLES)
+
+# テキストの周囲の余白
+SVG_MARGIN = 50
+
+# SVGの書き出し方式
+SVG_WRITERS = ("fast", "etree")
+DEFAULT_SVG_WRITER = "fast"
+
+# 生成したSVGを保持する件数と、キャッシュの対象にするテキストの最大文字数
+SVG_CACHE_SIZE = 32
+SVG_CACHE_MAX_TEXT_LENGTH = 100000
+
+# 列ごとのtspanの文字列を保持する件数（テキストを編集しても変わらない列は再利用する）
+SVG_COLUMN_CACHE_SIZE = 8192
+
+# ElementTreeと同じ規則のエスケープ表（テキスト用・属性値用）
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_ATTRIBUTE_ESCAPES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\r': '&#13;', '\n': '&#10;', '\t': '&#09;',
+})
+
+# フォールバック指定を追加しない総称フォントファミリー
+GENERIC_FONT_FAMILIES = ('serif', 'sans-serif', 'monospace', 'cursive', 'fantasy')
+
+
+def color_name(color):
+    """色をSVG用の文字列に変換"""
+    if hasattr(color, 'name'):
+        return color.name()
+    return str(color)
+
+
+def primary_font_family(font_family):
+    """カンマ区切りのフォント名から最初のフォントを取得"""
+    return font_family.split(',')[0].strip()
+
+
+def svg_font_family(font_family):
+    """SVGのfont-familyに指定する文字列を作成"""
+    primary_font = primary_font_family(font_family)
+
+    # フォント名にスペースが含まれている場合は引用符で囲む
+    if ' ' in primary_font:
+        svg_family = f'"{primary_font}"'
+    else:
+        svg_family = primary_font
+
+    # フォールバック用のフォントリストも追加
+    if primary_font not in GENERIC_FONT_FAMILIES:
+        svg_family += ', serif'
+
+    return svg_family
+
+
+def format_number(value):
+    """SVGの属性値用に数値を整形（浮動小数点の誤差を丸める）"""
+    return f"{round(value, 4):g}"
+
+
+def svg_cache_key(text, font_size, line_spacing, char_spacing, line_feed,
+                  font_family, font_weight, text_color, force_monospace,
+                  text_direction="right_to_left", metrics=None,
+                  vertical_forms=DEFAULT_VERTICAL_FORMS):
+    """SVGのキャッシュに使う正規化した設定のタプルを作成
+
+    generate_vertical_text_svgはキャッシュを使わない場合もこのタプルの値から生成するため、
+    キャッシュの有無で出力は変わらない。値を失う正規化（フォントサイズの切り捨てなど）はしない。
+    metricsはフォントごとに共有するオブジェクトのため、そのままキーに含める。
+    """
+    return (
+        text,
+        round(float(font_size), 4),
+        round(float(line_spacing), 4),
+        round(float(char_spacing), 4),
+        int(line_feed),
+        font_family.strip(),
+        int(font_weight) if font_weight is not None else 400,
+        color_name(text_color).lower(),
+        bool(force_monospace),
+        text_direction,
+        metrics,
+        vertical_forms,
+    )
+
+
+def _render_svg(key, writer=None):
+    """正規化した設定のタプル（svg_cache_key）からSVGを生成"""
+    (text, font_size, line_spacing, char_spacing, line_feed,
+     font_family, font_weight, text_color, force_monospace, text_direction, metrics,
+     vertical_forms) = key
+    layout = compute_layout(text, font_size, line_spacing, char_spacing, line_feed, text_direction)
+    return generate_svg_from_layout(layout, font_family, font_weight, text_color, force_monospace,
+                                    writer, metrics, vertical_forms)
+
+
+@lru_cache(maxsize=SVG_CACHE_SIZE)
+def _cached_svg(key, writer):
+    return _render_svg(key, writer)
+
+
+def svg_cache_info():
+    """SVGキャッシュのヒット数・ミス数などを取得（functools.lru_cacheのCacheInfo）"""
+    return _cached_svg.cache_info()
+
+
+def clear_svg_cache():
+    """SVGキャッシュ（列ごとのキャッシュを含む）を空にする"""
+    _cached_svg.cache_clear()
+    _column_tspan.cache_clear()
+
+
+def generate_vertical_text_svg(text, font_size, line_spacing, char_spacing, line_feed,
+                               font_family, font_weight, text_color, force_monospace,
+                               text_direction="right_to_left", writer=None, metrics=None,
+                               vertical_forms=DEFAULT_VERTICAL_FORMS):
+    """縦書きテキストのSVGを生成
+
+    同じ設定で生成済みのSVGはキャッシュから返す。writerを指定した場合はその方式で
+    生成するよう、書き出し方式もキャッシュのキーに含める（省略時はDEFAULT_SVG_WRITER）。
+    metrics（fonts.AdvanceMetrics）を指定すると、キャンバスの高さを実際の文字の
+    送り幅から求める。vertical_formsには縦書き用の字形の扱い（VERTICAL_FORMS_MODES）を指定する。
+    """
+    writer = writer or DEFAULT_SVG_WRITER
+    if writer not in SVG_WRITERS:
+        raise ValueError(f"不明なSVG書き出し方式です: {writer}")
+
+    # 縦書き用の表示形への置き換えはレイアウトの前に1回で行う
+    text = apply_vertical_forms(text, vertical_forms)
+
+    key = svg_cache_key(text, font_size, line_spacing, char_spacing, line_feed,
+                        font_family, font_weight, text_color, force_monospace,
+                        text_direction, metrics, vertical_forms)
+
+    # 長すぎるテキストはメモリを圧迫するためキャッシュしない
+    if len(text) > SVG_CACHE_MAX_TEXT_LENGTH:
+        return _render_svg(key, writer)
+
+    return _cached_svg(key, writer)
+
+
+def generate_svg_from_layout(layout, font_family, font_weight, text_color, force_monospace,
+                             writer=None, metrics=None, vertical_forms=DEFAULT_VERTICAL_FORMS):
+    """計算済みのレイアウト（LayoutResult）からSVGを生成
+
+    writerには"fast"か"etree"を指定する（省略時はDEFAULT_SVG_WRITER）。
+    縦書き用の表示形への置き換えはレイアウトの前に済ませておく（vertical_formsは
+    VERTICAL_FORMS_ORIENTATIONの場合に文字の向きの属性を出力するためだけに使う）。
+    """
+    block = (layout, font_family, font_weight, text_color, force_monospace,
+             check_vertical_forms_mode(vertical_forms), (SVG_MARGIN, SVG_MARGIN))
+    return _generate(_svg_attributes(layout, metrics), [block], writer)
+
+
+# 一括生成で省略した設定に使う値（ダイアログの初期値と同じ）
+DEFAULT_TEXT_PARAMS = {
+    "font_size": 24,
+    "line_spacing": 1.2,
+    "char_spacing": 1.2,
+    "line_feed": 10,
+    "font_family": "Noto Serif CJK JP, Century, serif",
+    "font_weight": 400,
+    "text_color": "#000000",
+    "force_monospace": False,
+    "text_direction": "right_to_left",
+    "vertical_forms": DEFAULT_VERTICAL_FORMS,
+}
+
+
+def generate_batch_svg(entries, writer=None, metrics_for=None):
+    """複数のテキストを1つのSVGにまとめて生成
+
+    entriesは(テキスト, 設定の辞書, 位置)の並び。設定の辞書のキーは
+    generate_vertical_text_svgの引数名で、省略した値はDEFAULT_TEXT_PARAMSを使う。
+    位置(x, y)はテキストの外接矩形の左上の座標で、テキストごとにtext要素を1つ出力する。
+    metrics_for(フォントファミリー, ウェイト)で送り幅のメトリクスを返す関数を指定すると、
+    キャンバスの大きさを実際の文字の送り幅から求める。このモジュールはQtに依存しないため
+    フォントを測れず、省略した場合はすべての文字を1em送りとみなす（フォントを測れる
+    呼び出し元がfont_model.advanceMetricsForなどを渡す）。
+    """
+    blocks = []
+    width = height = 0
+    for text, params, (x, y) in entries:
+        unknown = set(params).difference(DEFAULT_TEXT_PARAMS)
+        if unknown:
+            raise ValueError(f"不明な設定です: {', '.join(sorted(unknown))}")
+        values = dict(DEFAULT_TEXT_PARAMS, **params)
+        vertical_forms = values["vertical_forms"]
+        layout = compute_layout(apply_vertical_forms(text, vertical_forms), values["font_size"], values["line_spacing"],
+                                values["char_spacing"], values["line_feed"],
+                                values["text_direction"])
+        blocks.append((layout, values["font_family"], values["font_weight"],
+                       values["text_color"], values["force_monospace"], vertical_forms, (x, y)))
+        metrics = None
+        if metrics_for is not None:
+            metrics = metrics_for(values["font_family"], values["font_weight"])
+        content_width, content_height = layout.content_size(metrics)
+        width = max(width, x + content_width)
+        height = max(height, y + content_height)
+
+    svg_attributes = _svg_root_attributes(width + SVG_MARGIN, height + SVG_MARGIN)
+    return _generate(svg_attributes, blocks, writer)
+
+
+def _generate(svg_attributes, blocks, writer):
+    """書き出し方式を選んでSVGを生成"""
+    writer = writer or DEFAULT_SVG_WRITER
+    if writer == "etree":
+        with span("svg_etree"):
+            return _build_etree(svg_attributes, blocks)
+    if writer == "fast":
+        with span("svg"):
+            out = io.StringIO()
+            _write_elements(out.write, svg_attributes, blocks)
+            return out.getvalue()
+    raise ValueError(f"不明なSVG書き出し方式です: {writer}")
+
+
+def _svg_root_attributes(width, height):
+    """svg要素の属性"""
+    return [
+        ("width", format_number(width)),
+        ("height", format_number(height)),
+        ("xmlns", "http://www.w3.org/2000/svg"),
+        ("xmlns:xlink", "http://www.w3.org/1999/xlink"),
+    ]
+
+
+def _svg_attributes(layout, metrics=None):
+    """1つのテキストを余白付きで配置するsvg要素の属性
+
+    キャンバスはテキストの外接矩形（最後の列・最後の文字の後の間隔を含まない）に
+    余白を加えた大きさにする。
+    """
+    width, height = layout.content_size(metrics)
+    return _svg_root_attributes(width + SVG_MARGIN * 2, height + SVG_MARGIN * 2)
+
+
+# 背景（透明）
+_RECT_ATTRIBUTES = [("width", "100%"), ("height", "100%"), ("fill", "none")]
+
+
+def _text_attributes(layout, font_family, font_weight, text_color, force_monospace,
+                     vertical_forms=DEFAULT_VERTICAL_FORMS):
+    """縦書き用のtext要素の属性"""
+    font_size = layout.font_size
+
+    # style属性
+    style_parts = [
+        "text-align: start",
+        "text-align-last: auto",
+        f"font-family: {svg_font_family(font_family)}",
+        f"font-size: {format_number(font_size)}",
+        f"font-weight: {font_weight}"
+    ]
+
+    if force_monospace:
+        style_parts.append("font-variant-numeric: tabular-nums")
+
+    orientation = vertical_forms == VERTICAL_FORMS_ORIENTATION
+    if orientation:
+        # 文字を置き換えずに、縦書き用の字形を使うよう描画側に指定する
+        style_parts.extend(ORIENTATION_STYLES)
+
+    return [
+        ("text-rendering", "auto"),
+        ("fill", color_name(text_color)),
+        ("stroke-opacity", "0"),
+        ("stroke", "#000000"),
+        ("stroke-width", "0"),
+        ("stroke-linecap", "square"),
+        ("stroke-linejoin", "bevel"),
+        # 文字間隔（プレビューと同じ字送りになるよう、フォントサイズを超える分を指定）
+        ("letter-spacing", format_number(font_size * (layout.char_spacing - 1))),
+        ("word-spacing", "0"),
+        ("writing-mode", "vertical-rl"),
+        *(ORIENTATION_ATTRIBUTES if orientation else ()),
+        ("style", "; ".join(style_parts)),
+    ]
+
+
+def _iter_tspans(layout, origin=(SVG_MARGIN, SVG_MARGIN)):
+    """各行のtspanを(属性, テキスト)として順に返す
+
+    originはテキストの外接矩形の左上をSVG上のどこに置くか。
+    """
+    origin_x, origin_y = origin
+    line_count = layout.column_count
+    # 次の行のためのdx属性（縦書きでは行間を調整）
+    spacer = (("y", "0"), ("dx", f"-{int(layout.column_pitch)}"))
+
+    for i, column in enumerate(layout.iter_columns()):
+        line = layout.column_text(column)
+        if not line.strip():  # 空行はスキップ
+            continue
+
+        # 縦書き（vertical-rl）ではXは列の中心線（テキスト方向による並び順はレイアウトで計算済み）
+        x_coord = origin_x + column.center_x
+
+        # Yは最初の文字の上端
+        y_coord = origin_y + column.y
+
+        # 行のテキストを一つのtspanにまとめる
+        yield (("x", format_number(x_coord)), ("y", format_number(y_coord))), line
+
+        if i < line_count - 1:  # 最後の行でない場合
+            yield spacer, ""  # 空のtspanで位置調整
+
+
+def _build_etree(svg_attributes, blocks):
+    """ElementTreeで要素ツリーを組み立ててSVGを生成"""
+    # 既定の書き出し方式では使わないため、必要になった時に読み込む
+    import xml.etree.ElementTree as ET
+
+    svg = ET.Element("svg")
+    for name, value in svg_attributes:
+        svg.set(name, value)
+
+    rect = ET.SubElement(svg, "rect")
+    for name, value in _RECT_ATTRIBUTES:
+        rect.set(name, value)
+
+    for (layout, font_family, font_weight, text_color, force_monospace, vertical_forms,
+         origin) in blocks:
+        # テキストごとに一つのtext要素を作成（縦書き用）
+        text_elem = ET.SubElement(svg, "text")
+        for name, value in _text_attributes(layout, font_family, font_weight, text_color,
+                                            force_monospace, vertical_forms):
+            text_elem.set(name, value)
+
+        # 各行のテキストをtspanで配置
+        for attributes, line in _iter_tspans(layout, origin):
+            tspan = ET.SubElement(text_elem, "tspan")
+            for name, value in attributes:
+                tspan.set(name, value)
+            tspan.text = line
+
+    return ET.tostring(svg, encoding='unicode')
+
+
+def _start_tag(name, attributes, empty=False, escape=True):
+    """開始タグ（空要素の場合は自己終了タグ）の文字列を作成
+
+    数値だけの属性値のようにエスケープが不要な場合はescape=Falseで省略できる。
+    """
+    parts = [f'<{name}']
+    for attr_name, value in attributes:
+        if escape:
+            value = value.translate(_ATTRIBUTE_ESCAPES)
+        parts.append(f' {attr_name}="{value}"')
+    parts.append(' />' if empty else '>')
+    return ''.join(parts)
+
+
+@lru_cache(maxsize=SVG_COLUMN_CACHE_SIZE)
+def _column_tspan(attributes, line):
+    """1列分のtspanのうち、X座標の属性より後ろの文字列
+
+    X座標は列の位置で決まり、右から左の場合は列が増えるとすべての列で変わるため、
+    キャッシュには含めずに書き出す時に付け加える。
+    属性値は数値だけなのでエスケープしない。
+    """
+    parts = [f' {name}="{value}"' for name, value in attributes]
+    parts.append('>')
+    parts.append(line.translate(_TEXT_ESCAPES))
+    parts.append('</tspan>')
+    return ''.join(parts)
+
+
+def write_svg(out, layout, font_family, font_weight, text_color, force_monospace, metrics=None,
+              vertical_forms=DEFAULT_VERTICAL_FORMS):
+    """SVGを要素ツリーを作らずにファイルライクオブジェクトへ直接書き出す
+
+    outはwrite()を持つオブジェクト（io.StringIOやテキストモードのファイル）。
+    ElementTreeで生成した場合と同じ文字列になる。
+    """
+    block = (layout, font_family, font_weight, text_color, force_monospace,
+             check_vertical_forms_mode(vertical_forms), (SVG_MARGIN, SVG_MARGIN))
+    _write_elements(out.write, _svg_attributes(layout, metrics), [block])
+
+
+def _write_elements(write, svg_attributes, blocks):
+    write(_start_tag("svg", svg_attributes))
+    write(_start_tag("rect", _RECT_ATTRIBUTES, empty=True))
+    for block in blocks:
+        _write_text(write, *block)
+    write('</svg>')
+
+
+def _write_text(write, layout, font_family, font_weight, text_color, force_monospace,
+                vertical_forms, origin):
+    """1つのテキストのtext要素を書き出す"""
+    text_attributes = _text_attributes(layout, font_family, font_weight, text_color,
+                                       force_monospace, vertical_forms)
+
+    tspans = _iter_tspans(layout, origin)
+    first = next(tspans, None)
+    if first is None:
+        # tspanが無い場合はElementTreeと同じく自己終了タグにする
+        write(_start_tag("text", text_attributes, empty=True))
+        return
+
+    write(_start_tag("text", text_attributes))
+    # 位置調整用の空のtspanは毎回同じ
+    spacer_tag = None
+    for attributes, line in itertools.chain((first,), tspans):
+        if line:
+            # 先頭の属性はX座標（_iter_tspansを参照）
+            write(f'<tspan x="{attributes[0][1]}"')
+            write(_column_tspan(attributes[1:], line))
+        else:
+            if spacer_tag is None:
+                spacer_tag = _start_tag("tspan", attributes, empty=True, escape=False)
+            write(spacer_tag)
+
+    write('</text>')
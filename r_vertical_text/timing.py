@@ -0,0 +1,170 @@
+"""
+処理段階ごとの所要時間の計測
+
+レイアウト計算、SVG生成、プレビュー描画、Kritaへの追加などの各段階を
+spanで囲み、セッション中の所要時間を段階ごとのヒストグラムに集計する。
+無効にした場合、spanは何もしない共通のコンテキストマネージャーを返す。
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# ヒストグラムの区間の上限（ミリ秒）。最後の区間は上限なし
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# 環境変数で計測を無効にできる（"0"で無効）
+TIMING_ENV_VAR = "R_VERTICAL_TEXT_TIMING"
+
+# 無効時に返す何もしないコンテキストマネージャー（毎回作らずに使い回す）
+_NULL_SPAN = nullcontext()
+
+
+class StageStats:
+    """1つの段階の所要時間の集計"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, elapsed_ms):
+        self.count += 1
+        self.total += elapsed_ms
+        if elapsed_ms < self.min:
+            self.min = elapsed_ms
+        if elapsed_ms > self.max:
+            self.max = elapsed_ms
+        for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[index] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """ヒストグラムから求めた近似のパーセンタイル（区間の上限、ミリ秒）"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                if index < len(HISTOGRAM_BOUNDS_MS):
+                    return min(HISTOGRAM_BOUNDS_MS[index], self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total,
+            "mean_ms": self.mean,
+            "min_ms": self.min if self.count else 0.0,
+            "max_ms": self.max,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "histogram": [
+                {"le_ms": bound, "count": count}
+                for bound, count in zip(HISTOGRAM_BOUNDS_MS + (None,), self.buckets)
+            ],
+        }
+
+
+class _Span:
+    """計測区間（withで囲んだ処理の所要時間を記録する）"""
+
+    __slots__ = ('_timings', '_name', '_start')
+
+    def __init__(self, timings, name):
+        self._timings = timings
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._timings.record(self._name, (time.perf_counter() - self._start) * 1000.0)
+        return False
+
+
+class Timings:
+    """段階ごとの所要時間を集計する
+
+    プレビューはワーカースレッドで描画されるため、集計はロックで保護する。
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._started = time.time()
+
+    def set_enabled(self, enabled):
+        """計測の有効・無効を切り替える"""
+        self.enabled = bool(enabled)
+
+    def span(self, name):
+        """処理をwithで囲んで所要時間を計測する"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, elapsed_ms):
+        """所要時間（ミリ秒）を記録する"""
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats()
+            stats.add(elapsed_ms)
+
+    def stages(self):
+        """記録のある段階名の一覧"""
+        with self._lock:
+            return list(self._stages)
+
+    def snapshot(self):
+        """集計結果を辞書で取得"""
+        with self._lock:
+            stages = {name: stats.to_dict() for name, stats in self._stages.items()}
+        return {
+            "session_started": self._started,
+            "histogram_bounds_ms": list(HISTOGRAM_BOUNDS_MS),
+            "stages": stages,
+        }
+
+    def to_json(self, indent=2):
+        """集計結果をJSON文字列で取得"""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def dump_json(self, path):
+        """集計結果をJSONファイルに保存"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+
+    def reset(self):
+        """集計結果を破棄する"""
+        with self._lock:
+            self._stages.clear()
+            self._started = time.time()
+
+
+# プラグイン全体で共有する計測結果
+timings = Timings(enabled=os.environ.get(TIMING_ENV_VAR, "1") != "0")
+
+
+def span(name):
+    """共有の計測結果に記録する計測区間"""
+    return timings.span(name)
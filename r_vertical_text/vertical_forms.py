@@ -0,0 +1,64 @@
+"""
+縦書き用の字形（縦書き用の表示形）への置き換え
+
+句読点や括弧、長音記号などをUnicodeの縦書き用の表示形（U+FE10〜U+FE19、
+U+FE30〜U+FE4F）に置き換える。置き換え表は読み込み時にstr.maketransで作成し、
+レイアウトの前にstr.translateで1回走査するだけで済ませる。
+置き換えずに、SVGのtext要素に文字の向きの属性（text-orientation /
+glyph-orientation-vertical）を出力して描画側に任せることもできる。
+"""
+
+# 横書きの文字から縦書き用の表示形への対応
+VERTICAL_FORMS = {
+    # 句読点・区切り約物
+    '、': '︑', '。': '︒', '，': '︐', '：': '︓', '；': '︔', '！': '︕', '？': '︖',
+    # 括弧類
+    '「': '﹁', '」': '﹂', '『': '﹃', '』': '﹄',
+    '（': '︵', '）': '︶', '｛': '︷', '｝': '︸', '〔': '︹', '〕': '︺',
+    '【': '︻', '】': '︼', '《': '︽', '》': '︾', '〈': '︿', '〉': '﹀',
+    '［': '﹇', '］': '﹈',
+    # 三点リーダー・二点リーダー
+    '…': '︙', '‥': '︰',
+    # 長音記号・ハイフン類
+    # （ダッシュ「―」は長音記号と同じ︱になり禁則のクラスが変わるため置き換えない。
+    # 波ダッシュ「〜」「～」には縦書き用の表示形が無いため置き換えない）
+    'ー': '︱', '–': '︲',
+    # 下線
+    '＿': '︳',
+}
+
+# str.translate用の置き換え表
+VERTICAL_FORMS_TABLE = str.maketrans(VERTICAL_FORMS)
+
+# 縦書き用の字形の扱い
+VERTICAL_FORMS_NONE = "none"                # そのまま出力
+VERTICAL_FORMS_SUBSTITUTE = "substitute"    # 縦書き用の表示形に置き換える
+VERTICAL_FORMS_ORIENTATION = "orientation"  # 文字の向きの属性を出力して描画側に任せる
+VERTICAL_FORMS_MODES = (VERTICAL_FORMS_NONE, VERTICAL_FORMS_SUBSTITUTE, VERTICAL_FORMS_ORIENTATION)
+
+# 縦書き用の字形の扱いの初期値（SVG生成・一括生成・コマンドライン・ダイアログで共通）
+DEFAULT_VERTICAL_FORMS = VERTICAL_FORMS_SUBSTITUTE
+
+# VERTICAL_FORMS_ORIENTATIONでtext要素に追加する属性とstyleの指定
+# 全角の文字は正立させ、フォントの縦書き用の字形（vert）を使うよう指定する
+ORIENTATION_ATTRIBUTES = [("glyph-orientation-vertical", "auto")]
+ORIENTATION_STYLES = ["text-orientation: mixed", "font-feature-settings: \"vert\" 1"]
+
+
+def check_vertical_forms_mode(mode):
+    """縦書き用の字形の扱いを検査（不明な場合はValueError）"""
+    if mode not in VERTICAL_FORMS_MODES:
+        raise ValueError(f"不明な縦書き用の字形の扱いです: {mode}")
+    return mode
+
+
+def to_vertical_forms(text):
+    """テキストの句読点や括弧などを縦書き用の表示形に置き換える"""
+    return text.translate(VERTICAL_FORMS_TABLE)
+
+
+def apply_vertical_forms(text, mode=DEFAULT_VERTICAL_FORMS):
+    """レイアウトの前にテキストへ適用する（置き換えるのはVERTICAL_FORMS_SUBSTITUTEの場合だけ）"""
+    if check_vertical_forms_mode(mode) == VERTICAL_FORMS_SUBSTITUTE:
+        return text.translate(VERTICAL_FORMS_TABLE)
+    return text
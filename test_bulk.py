@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+台本ファイルからの一括生成のテスト
+PyQt5やKritaが無い環境でも実行可能（SVGのみ）
+"""
+
+import sys
+import os
+import json
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from bulk import make_entries, load_manifest, render_bulk
+from cli import render_svg
+from svg_writer import DEFAULT_TEXT_PARAMS
+
+RECORDS = [
+    {"text": "吹き出し一", "name": "p001", "font_size": 32},
+    {"text": "吹き出し二\n二行目", "line_feed": 4},
+    {"text": "三", "text_color": "#ff0000"},
+]
+
+
+class TestManifest(unittest.TestCase):
+    """マニフェストの読み込みのテスト"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        return path
+
+    def test_defaults_and_names(self):
+        """省略した設定は初期値、名前は順番から付ける"""
+        entries = make_entries(RECORDS)
+        self.assertEqual([entry.name for entry in entries], ["p001", "00002", "00003"])
+        self.assertEqual(entries[0].params["font_size"], 32)
+        self.assertEqual(entries[1].params["font_size"], DEFAULT_TEXT_PARAMS["font_size"])
+        self.assertEqual(entries[1].params["line_feed"], 4)
+
+    def test_csv_values(self):
+        """CSVの文字列の値は初期値と同じ型に変換され、空欄は初期値になる"""
+        path = self.write("manifest.csv",
+                          "name,text,font_size,char_spacing,force_monospace\n"
+                          "a,あいう,30,1.5,true\n"
+                          "b,\"か,き\",,,0\n")
+        first, second = load_manifest(path)
+        self.assertEqual(first.params["font_size"], 30)
+        self.assertEqual(first.params["char_spacing"], 1.5)
+        self.assertIs(first.params["force_monospace"], True)
+        self.assertEqual(second.text, "か,き")
+        self.assertEqual(second.params["font_size"], DEFAULT_TEXT_PARAMS["font_size"])
+        self.assertIs(second.params["force_monospace"], False)
+
+    def test_json_defaults(self):
+        """JSONのdefaultsが省略した設定に使われる"""
+        path = self.write("manifest.json", json.dumps(
+            {"defaults": {"font_size": 40}, "entries": RECORDS}, ensure_ascii=False))
+        entries = load_manifest(path, defaults={"font_size": 20, "line_feed": 7})
+        self.assertEqual(entries[0].params["font_size"], 32)
+        self.assertEqual(entries[1].params["font_size"], 40)
+        self.assertEqual(entries[2].params["line_feed"], 7)
+
+    def test_invalid(self):
+        """不明な設定、不正な値、名前の重複はエラー"""
+        with self.assertRaises(ValueError):
+            make_entries([{"text": "あ", "font_colour": "#000000"}])
+        with self.assertRaises(ValueError):
+            make_entries([{"text": "あ", "font_size": "大"}])
+        with self.assertRaises(ValueError):
+            make_entries([{"text": "あ", "name": "x"}, {"text": "い", "name": "x"}])
+        with self.assertRaises(ValueError):
+            make_entries([{"name": "x"}])
+
+    def test_extra_csv_fields(self):
+        """見出しより列が多いCSVの行はエラー"""
+        path = self.write("manifest.csv", "name,text\na,あ,extra\n")
+        with self.assertRaises(ValueError):
+            load_manifest(path)
+
+    def test_json_entries_not_objects(self):
+        """オブジェクトでないJSONのエントリーはエラー"""
+        for data in (["あ"], [["あ"]], {"entries": [1]}, {"entries": "あ"}, 1,
+                     {"defaults": [], "entries": []}):
+            with self.subTest(data=data):
+                path = self.write("manifest.json", json.dumps(data, ensure_ascii=False))
+                with self.assertRaises(ValueError):
+                    load_manifest(path)
+
+    def test_names(self):
+        """数値の名前は文字列にし、出力先の外を指す名前はエラー"""
+        entries = make_entries([{"text": "あ", "name": 7}, {"text": "い", "name": 0}])
+        self.assertEqual([entry.name for entry in entries], ["7", "0"])
+        for name in ("../x", "a/b", "a\\b", "..", os.path.abspath("x")):
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                make_entries([{"text": "あ", "name": name}])
+
+
+class TestRenderBulk(unittest.TestCase):
+    """一括生成のテスト"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.entries = make_entries(
+            [{"text": f"台詞{i}番目の文章です", "line_feed": 3 + i % 5} for i in range(20)])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_results_in_manifest_order(self):
+        """結果はマニフェストの順番で返り、単独で生成したSVGと同じ内容になる"""
+        progress = []
+        report = render_bulk(self.entries, self.temp_dir, workers=1, chunk_size=6,
+                             progress=lambda done, total: progress.append((done, total)))
+        self.assertEqual([result.name for result in report.results],
+                         [entry.name for entry in self.entries])
+        for entry, result in zip(self.entries, report.results):
+            self.assertEqual(self.read(result.paths[0]), render_svg(entry.text, entry.params))
+        self.assertEqual(progress[-1], (20, 20))
+        self.assertEqual(report.count, 20)
+        self.assertGreater(report.bytes, 0)
+        self.assertIn("20件", report.summary())
+
+    def test_numeric_name(self):
+        """数値の名前でもファイルを書き出せる"""
+        entries = make_entries([{"text": "あ", "name": 12}])
+        report = render_bulk(entries, self.temp_dir, workers=1)
+        self.assertEqual(report.results[0].paths, [os.path.join(self.temp_dir, "12.svg")])
+        self.assertTrue(os.path.exists(report.results[0].paths[0]))
+
+    def test_process_pool(self):
+        """プロセスプールでも同じファイルが同じ順番の結果で生成される"""
+        serial_dir = os.path.join(self.temp_dir, "serial")
+        parallel_dir = os.path.join(self.temp_dir, "parallel")
+        render_bulk(self.entries, serial_dir, workers=1)
+        report = render_bulk(self.entries, parallel_dir, workers=2, chunk_size=3)
+        self.assertEqual(report.workers, 2)
+        self.assertEqual([result.index for result in report.results], list(range(20)))
+        self.assertEqual(sorted(os.listdir(serial_dir)), sorted(os.listdir(parallel_dir)))
+        for name in os.listdir(serial_dir):
+            self.assertEqual(self.read(os.path.join(serial_dir, name)),
+                             self.read(os.path.join(parallel_dir, name)))
+
+    def test_no_qt_application(self):
+        """メトリクスを指定しない限り、SVGの生成ではQtを読み込まない"""
+        code = ("import sys, bulk\n"
+                "entries = bulk.make_entries([{'text': 'あいう'}])\n"
+                "bulk.render_bulk(entries, sys.argv[1], workers=1)\n"
+                "print('PyQt5.QtGui' in sys.modules)\n")
+        result = subprocess.run([sys.executable, "-c", code, self.temp_dir],
+                                cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 'r_vertical_text'),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_metrics_for(self):
+        """metrics_forを指定するとフォントごとのメトリクスでキャンバスを求める"""
+        fonts = []
+
+        def metrics_for(font_family, font_weight):
+            fonts.append((font_family, font_weight))
+            return None
+
+        entries = make_entries([{"text": "あ"}])
+        render_bulk(entries, self.temp_dir, workers=1, metrics_for=metrics_for)
+        self.assertEqual(fonts, [(DEFAULT_TEXT_PARAMS["font_family"],
+                                  DEFAULT_TEXT_PARAMS["font_weight"])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+コマンドラインからの生成のテスト
+python -m r_vertical_text をサブプロセスで実行する（PNGのテストはPyQt5が必要）
+"""
+
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+try:
+    import PyQt5  # noqa: F401
+    PYQT5_AVAILABLE = True
+except ImportError:
+    PYQT5_AVAILABLE = False
+
+
+def run_cli(args, stdin=b"", **env):
+    """python -m r_vertical_text を実行（envは追加する環境変数）"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen", **env)
+    return subprocess.run([sys.executable, "-m", "r_vertical_text"] + args, input=stdin,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ROOT, env=env,
+                          timeout=60)
+
+
+class TestCommandLine(unittest.TestCase):
+    """コマンドラインからの生成のテスト"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_text(self, name, text):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_stdin_to_stdout(self):
+        """標準入力のテキストがSVGとして標準出力に出力される"""
+        result = run_cli(["--font-size", "30", "--color", "#ff0000"],
+                         "こんにちは\n世界\n".encode("utf-8"))
+        self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+        root = ET.fromstring(result.stdout.decode("utf-8"))
+        text = root.find(SVG_NS + "text")
+        self.assertEqual(text.get("fill"), "#ff0000")
+        self.assertIn("font-size: 30", text.get("style"))
+        # 末尾の改行は空の行にならない
+        columns = [tspan.text for tspan in text.findall(SVG_NS + "tspan") if tspan.text]
+        self.assertEqual(columns, ["こんにちは", "世界"])
+
+    def test_locale_encoding(self):
+        """ロケールの文字コードによらず、入力は--encodingで読みUTF-8で出力する"""
+        text = "テスト。（縦）\n"
+        for encoding in ("utf-8", "cp932"):
+            with self.subTest(encoding=encoding):
+                result = run_cli(["--encoding", encoding], text.encode(encoding),
+                                 PYTHONIOENCODING="cp932")
+                self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+                root = ET.fromstring(result.stdout.decode("utf-8"))
+                columns = [tspan.text for tspan in root.iter(SVG_NS + "tspan") if tspan.text]
+                # cp932で表せない縦書き用の表示形もそのまま出力される
+                self.assertEqual(columns, ["テスト︒︵縦︶"])
+
+    def test_output_dir(self):
+        """複数のファイルが同じ名前のSVGとして保存される"""
+        first = self.write_text("a.txt", "あいう")
+        second = self.write_text("b.txt", "かきく")
+        out_dir = os.path.join(self.temp_dir, "out")
+        result = run_cli(["--output-dir", out_dir, first, second])
+        self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+        self.assertEqual(sorted(os.listdir(out_dir)), ["a.svg", "b.svg"])
+        self.assertEqual(result.stdout, b"")
+
+    def test_multiple_inputs_require_output_dir(self):
+        """複数のファイルを標準出力に出そうとするとエラー"""
+        first = self.write_text("a.txt", "あ")
+        second = self.write_text("b.txt", "い")
+        result = run_cli([first, second])
+        self.assertNotEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, b"")
+
+    def test_manifest(self):
+        """マニフェストのテキストが一括生成され、処理速度が表示される"""
+        manifest = self.write_text("volume.csv", "name,text,font_size\np1,あいう,30\np2,かきく,\n")
+        out_dir = os.path.join(self.temp_dir, "out")
+        result = run_cli(["--manifest", manifest, "--jobs", "2", "-o", out_dir])
+        self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+        self.assertEqual(sorted(os.listdir(out_dir)), ["p1.svg", "p2.svg"])
+        self.assertIn("2件", result.stderr.decode("utf-8"))
+
+    @unittest.skipUnless(PYQT5_AVAILABLE, "PyQt5が必要です")
+    def test_measure_fonts(self):
+        """--measure-fontsを指定した場合だけフォントの送り幅でキャンバスを求める"""
+        text = "abcdefgh".encode("utf-8")
+        heights = []
+        for args in ([], ["--measure-fonts"]):
+            result = run_cli(["--font-family", "DejaVu Sans"] + args, text)
+            self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+            heights.append(float(ET.fromstring(result.stdout.decode("utf-8")).get("height")))
+        # 回転する半角の文字は1emより送り幅が小さい
+        self.assertLess(heights[1], heights[0])
+
+    @unittest.skipUnless(PYQT5_AVAILABLE, "PyQt5が必要です")
+    def test_png(self):
+        """PNGとSVGの両方が出力される"""
+        path = self.write_text("page.txt", "縦書き")
+        out_dir = os.path.join(self.temp_dir, "out")
+        result = run_cli(["--format", "both", "--background", "#ffffff", "-o", out_dir, path])
+        self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+        with open(os.path.join(out_dir, "page.png"), "rb") as f:
+            self.assertEqual(f.read(8), PNG_SIGNATURE)
+        self.assertTrue(os.path.exists(os.path.join(out_dir, "page.svg")))
+
+
+    @unittest.skipUnless(PYQT5_AVAILABLE, "PyQt5が必要です")
+    def test_png_same_canvas(self):
+        """--format bothのPNGとSVGは同じ大きさのキャンバスになる"""
+        path = self.write_text("page.txt", "abcdefgh\n縦書き")
+        for args in ([], ["--measure-fonts"]):
+            with self.subTest(args=args):
+                out_dir = os.path.join(self.temp_dir, "out" + "".join(args))
+                result = run_cli(["--format", "both", "--font-family", "DejaVu Sans",
+                                  "-o", out_dir, path] + args)
+                self.assertEqual(result.returncode, 0, result.stderr.decode("utf-8", "replace"))
+                root = ET.parse(os.path.join(out_dir, "page.svg")).getroot()
+                with open(os.path.join(out_dir, "page.png"), "rb") as f:
+                    header = f.read(24)
+                # PNGのIHDRチャンクの幅と高さ（ビッグエンディアン）
+                png_size = (int.from_bytes(header[16:20], "big"),
+                            int.from_bytes(header[20:24], "big"))
+                svg_size = (int(float(root.get("width")) + 0.5),
+                            int(float(root.get("height")) + 0.5))
+                self.assertEqual(png_size, svg_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
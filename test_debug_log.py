@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+デバッグログの非同期書き出しのテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import tempfile
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from debug_log import DebugLogger
+
+
+class TestDebugLogger(unittest.TestCase):
+    """デバッグログのテスト"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "debug.log")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_log(self, path=None):
+        with open(path or self.path, encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def test_write(self):
+        """メッセージが順番どおりにタイムスタンプ付きで書き込まれる"""
+        logger = DebugLogger(self.path)
+        for i in range(100):
+            logger.log(f"メッセージ{i}")
+        self.assertTrue(logger.flush())
+        lines = self.read_log()
+        self.assertEqual(len(lines), 100)
+        self.assertTrue(lines[0].startswith("["))
+        self.assertTrue(lines[-1].endswith("] メッセージ99"))
+        logger.close()
+
+    def test_disabled(self):
+        """無効の場合はファイルもスレッドも作らない"""
+        logger = DebugLogger(self.path, enabled=False)
+        logger.log("書き込まれない")
+        self.assertTrue(logger.flush())
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(logger._thread)
+
+    def test_rotate(self):
+        """最大サイズを超えると古いログを退避する"""
+        logger = DebugLogger(self.path, max_bytes=200, backup_count=2)
+        for i in range(3):
+            logger.log("x" * 300)
+            logger.flush()
+        logger.close()
+        self.assertEqual(len(self.read_log()), 1)
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertTrue(os.path.exists(self.path + ".2"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+
+    def test_close(self):
+        """終了時に残りのメッセージが書き込まれる"""
+        logger = DebugLogger(self.path)
+        logger.log("最後のメッセージ")
+        logger.close()
+        self.assertEqual(len(self.read_log()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
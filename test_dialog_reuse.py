@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+ダイアログの再利用のテスト
+ウィンドウごとに1つのダイアログを作成し、開き直しても設定が保たれることを確認する
+"""
+
+import sys
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtWidgets import QApplication
+from r_vertical_text.extension import RVerticalText
+from r_vertical_text.r_vertical_text import VerticalTextDialog
+
+DIALOG_CLASS = 'r_vertical_text.r_vertical_text.VerticalTextDialog'
+
+
+class TestExtensionDialogReuse(unittest.TestCase):
+    """拡張機能のダイアログの再利用のテスト"""
+
+    def setUp(self):
+        self.extension = RVerticalText(Mock())
+
+    @patch(DIALOG_CLASS)
+    def test_dialog_created_once(self, dialog_class):
+        """2回目以降は同じダイアログを開く"""
+        self.extension.showVerticalTextDialog()
+        self.extension.showVerticalTextDialog()
+        dialog_class.assert_called_once_with(None)
+        self.assertEqual(dialog_class.return_value.exec_.call_count, 2)
+
+    @patch(DIALOG_CLASS)
+    def test_dialog_per_window(self, dialog_class):
+        """ウィンドウごとに別のダイアログを作成し、ウィンドウを閉じたら破棄する"""
+        dialog_class.side_effect = lambda parent: Mock(owner=parent)
+        first, second = Mock(), Mock()
+        self.extension.createActions(first)
+        self.extension.createActions(second)
+
+        # メニューから開く（triggeredのchecked引数付きで呼ばれる）
+        first.createAction.return_value.triggered.connect.call_args[0][0](False)
+        self.extension.showVerticalTextDialog(second)
+        self.assertEqual(dialog_class.call_count, 2)
+        first_dialog = self.extension.dialogFor(first)
+        self.assertIs(first_dialog.owner, first.qwindow.return_value)
+        self.assertIsNot(first_dialog, self.extension.dialogFor(second))
+
+        # windowClosedに接続した処理でダイアログを破棄する
+        first.windowClosed.connect.call_args[0][0]()
+        first_dialog.deleteLater.assert_called_once()
+        self.extension.showVerticalTextDialog(first)
+        self.assertEqual(dialog_class.call_count, 3)
+
+
+class TestDialogReopen(unittest.TestCase):
+    """ダイアログを開き直した場合のテスト"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication(sys.argv)
+
+    def setUp(self):
+        self.dialog = VerticalTextDialog()
+
+    def tearDown(self):
+        self.dialog.preview_renderer.waitForDone()
+        self.dialog.deleteLater()
+
+    def reopen(self):
+        """閉じて開き直す（exec_の代わりにshow/doneを使う）"""
+        self.dialog.done(0)
+        self.dialog.show()
+
+    def test_settings_kept(self):
+        """閉じても入力したテキストと設定が保たれる"""
+        self.dialog.show()
+        self.dialog.text_input.setPlainText("開き直し")
+        self.dialog.font_size_spin.setValue(40)
+        self.reopen()
+        self.assertEqual(self.dialog.text_input.toPlainText(), "開き直し")
+        self.assertEqual(self.dialog.font_size_spin.value(), 40)
+
+    def test_no_preview_on_reopen(self):
+        """プレビューが最新なら開き直してもプレビューを描画し直さない"""
+        self.dialog.show()
+        self.dialog.preview_scheduler.flush()
+        self.dialog.preview_renderer.waitForDone()
+        self.app.processEvents()
+        self.reopen()
+        self.assertFalse(self.dialog.preview_scheduler.isPending())
+
+    def test_cancelled_preview_on_reopen(self):
+        """閉じる時に取り消したプレビューの更新は開き直した時に行う"""
+        self.dialog.show()
+        self.dialog.text_input.setPlainText("閉じる直前の編集")
+        self.assertTrue(self.dialog.preview_scheduler.isPending())
+        self.reopen()
+        self.assertTrue(self.dialog.preview_scheduler.isPending())
+
+
+class TestDialogSharedLayout(unittest.TestCase):
+    """プレビューとSVGの生成でレイアウトを共有するテスト"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication(sys.argv)
+
+    def setUp(self):
+        self.dialog = VerticalTextDialog()
+
+    def tearDown(self):
+        self.dialog.preview_renderer.cancel()
+        self.dialog.preview_renderer.waitForDone()
+        self.dialog.deleteLater()
+
+    def test_svg_uses_preview_layout(self):
+        """追加するSVGはプレビューと同じLayoutResultから生成する"""
+        dialog = self.dialog
+        dialog.text_input.setPlainText("縦書きのテキスト。\n二行目")
+        layout = dialog.currentLayout()
+        with patch('r_vertical_text.r_vertical_text.generate_svg_from_layout',
+                   return_value="<svg />") as generate:
+            dialog.generateVerticalTextSVG(
+                dialog.text_input.toPlainText(), dialog.font_size_spin.value(),
+                dialog.line_spacing_spin.value() / 100.0, dialog.char_spacing_spin.value() / 100.0,
+                dialog.line_feed_spin.value(), dialog.font_family_combo.currentText(),
+                dialog.font_weight_combo.currentData(), dialog.text_color,
+                dialog.force_monospace_check.isChecked())
+        self.assertIs(generate.call_args[0][0], layout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+フォント一覧の並べ替えとディスクキャッシュのテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import tempfile
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from fonts import (sort_font_families, FontPrefixIndex, weight_from_name, nearest_weight, font_fingerprint, load_font_cache, save_font_cache,
+                   FONT_CACHE_VERSION, AdvanceMetrics, is_upright)
+
+
+class TestSortFontFamilies(unittest.TestCase):
+    """フォント一覧の並べ替えのテスト"""
+
+    def test_order(self):
+        """デフォルトフォント、日本語フォント、その他の順に並ぶ"""
+        families = ["Arial", "Yu Mincho", "Noto Sans CJK JP", "Courier", "Noto Serif CJK JP",
+                    "Meiryo"]
+        self.assertEqual(sort_font_families(families),
+                         ["Noto Serif CJK JP", "Yu Mincho", "Meiryo", "Noto Sans CJK JP",
+                          "Arial", "Courier"])
+
+    def test_duplicates(self):
+        """重複したファミリー名は一つにまとめる"""
+        self.assertEqual(sort_font_families(["Arial", "Arial", "MS Mincho"]),
+                         ["MS Mincho", "Arial"])
+
+
+class TestFontWeight(unittest.TestCase):
+    """フォントウェイトの推定のテスト"""
+
+    def test_weight_from_name(self):
+        """複合語のキーワードが単独のキーワードより優先される"""
+        self.assertEqual(weight_from_name("Arial Bold"), 700)
+        self.assertEqual(weight_from_name("Noto Sans Semi Bold"), 600)
+        self.assertEqual(weight_from_name("Source Han ExtraBold"), 800)
+        self.assertEqual(weight_from_name("Yu Gothic Extra Light"), 200)
+        self.assertEqual(weight_from_name("Hiragino Light"), 300)
+        self.assertIsNone(weight_from_name("MS Mincho"))
+
+    def test_nearest_weight(self):
+        """フォントが持つウェイトから最も近いものを選ぶ"""
+        self.assertEqual(nearest_weight(600, (400, 700)), 700)
+        self.assertEqual(nearest_weight(550, (400, 500, 600)), 500)
+        self.assertEqual(nearest_weight(300, ()), 300)
+
+
+class TestFontPrefixIndex(unittest.TestCase):
+    """フォント名の索引のテスト"""
+
+    def setUp(self):
+        self.index = FontPrefixIndex(["Noto Serif CJK JP", "Yu Mincho", "noto sans", "Arial",
+                                      "Noto Mono"])
+
+    def test_row(self):
+        """完全一致で行番号を引ける"""
+        self.assertEqual(self.index.row("Arial"), 3)
+        self.assertEqual(self.index.row("Unknown"), -1)
+
+    def test_prefix_matches(self):
+        """大文字小文字を区別せず前方一致し、一覧の順に返す"""
+        self.assertEqual(self.index.prefix_matches("NOTO"),
+                         ["Noto Serif CJK JP", "noto sans", "Noto Mono"])
+        self.assertEqual(self.index.prefix_matches("noto", limit=2),
+                         ["Noto Serif CJK JP", "noto sans"])
+        self.assertEqual(self.index.prefix_matches("z"), [])
+
+
+class TestAdvanceMetrics(unittest.TestCase):
+    """縦書きの送り幅のテスト"""
+
+    def test_upright(self):
+        self.assertTrue(is_upright("漢"))
+        self.assertTrue(is_upright("。"))
+        self.assertFalse(is_upright("a"))
+        self.assertFalse(is_upright("ｱ"))
+
+    def test_measure_only_rotated(self):
+        """回転する文字だけを一度ずつ測る"""
+        measured = []
+
+        class Metrics(AdvanceMetrics):
+            def measure(self, char):
+                measured.append(char)
+                return 0.6
+
+        metrics = Metrics()
+        self.assertAlmostEqual(metrics.total_advance("ab漢ab"), 0.6 * 4 + 1)
+        self.assertAlmostEqual(metrics.total_advance("ba"), 1.2)
+        self.assertEqual(sorted(measured), ["a", "b"])
+        self.assertEqual(AdvanceMetrics().total_advance("abc"), 3)
+
+
+class TestFontCache(unittest.TestCase):
+    """フォント一覧のキャッシュのテスト"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache", "fonts.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_round_trip(self):
+        """保存した一覧を読み込める"""
+        self.assertIsNone(load_font_cache(self.path))
+        self.assertTrue(save_font_cache("abc", ["明朝", "Arial"], self.path))
+        self.assertEqual(load_font_cache(self.path), ("abc", ["明朝", "Arial"]))
+
+    def test_broken_cache(self):
+        """壊れたキャッシュは無視する"""
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{")
+        self.assertIsNone(load_font_cache(self.path))
+
+    def test_old_version(self):
+        """形式の異なるキャッシュは無視する"""
+        save_font_cache("abc", ["Arial"], self.path)
+        with open(self.path, "r+", encoding="utf-8") as f:
+            data = f.read().replace(f'"version": {FONT_CACHE_VERSION}', '"version": 0')
+            f.seek(0)
+            f.write(data)
+            f.truncate()
+        self.assertIsNone(load_font_cache(self.path))
+
+    def test_fingerprint_changes(self):
+        """フォントの追加でフィンガープリントが変わる"""
+        font_dir = os.path.join(self.temp_dir.name, "fonts")
+        os.makedirs(os.path.join(font_dir, "truetype"))
+        before = font_fingerprint([font_dir])
+        self.assertEqual(before, font_fingerprint([font_dir]))
+
+        with open(os.path.join(font_dir, "truetype", "new.ttf"), "wb"):
+            pass
+        self.assertNotEqual(before, font_fingerprint([font_dir]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+プラグインの読み込みのテスト
+Kritaの起動時に読み込まれるパッケージが、ダイアログやQtを読み込まないことを確認する
+（読み込み時間は環境によって変わるため、bench_import_time.pyで目安として計測する）
+"""
+
+import sys
+import os
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Kritaの起動時には読み込まないモジュール
+DEFERRED_MODULES = ("PyQt5.QtWidgets", "PyQt5.QtSvg", "xml.etree.ElementTree",
+                    "r_vertical_text.r_vertical_text", "r_vertical_text.svg_writer")
+
+try:
+    import PyQt5  # noqa: F401
+    PYQT5_AVAILABLE = True
+except ImportError:
+    PYQT5_AVAILABLE = False
+
+
+def run_python(code):
+    """リポジトリのルートで別のPythonプロセスを実行"""
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, timeout=60)
+
+
+class TestImportTime(unittest.TestCase):
+    """パッケージの読み込みのテスト"""
+
+    def test_no_deferred_modules(self):
+        """パッケージの読み込みではダイアログやQtを読み込まず、何も出力しない"""
+        result = run_python("import sys, r_vertical_text\n"
+                            f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_svg_modules_deferred(self):
+        """メニューの登録だけではSVG生成とQtSvgを読み込まない"""
+        result = run_python(
+            "import sys\n"
+            "from unittest.mock import Mock\n"
+            "import r_vertical_text\n"
+            "r_vertical_text.RVerticalText(Mock()).createActions(Mock())\n"
+            "print('r_vertical_text.svg_writer' in sys.modules, 'PyQt5.QtSvg' in sys.modules)")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "False False")
+
+    @unittest.skipUnless(PYQT5_AVAILABLE, "PyQt5が必要です")
+    def test_dialog_loaded_on_first_use(self):
+        """ダイアログはパッケージから参照した時、または最初に開いた時に読み込まれる"""
+        # 他のテストがプラグインディレクトリをパスに追加していても影響しないよう別のプロセスで実行
+        result = run_python(
+            "import sys\n"
+            "from unittest.mock import Mock, patch\n"
+            "import r_vertical_text\n"
+            "extension = r_vertical_text.RVerticalText(Mock())\n"
+            "with patch('r_vertical_text.r_vertical_text.VerticalTextDialog') as dialog_class:\n"
+            "    extension.showVerticalTextDialog()\n"
+            "    dialog_class.return_value.exec_.assert_called_once()\n"
+            "module = sys.modules['r_vertical_text.r_vertical_text']\n"
+            "assert r_vertical_text.VerticalTextDialog is module.VerticalTextDialog\n")
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+if __name__ == "__main__":
+    unittest.main()
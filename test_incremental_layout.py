@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+部分的な再レイアウト（IncrementalLayout）のテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import random
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from layout import (IncrementalLayout, LayoutResult, iter_line_spans, compute_layout,
+                    common_prefix_length, common_suffix_length)
+from svg_writer import generate_svg_from_layout, clear_svg_cache, _column_tspan
+
+# 禁則に掛かる文字と改行を多めに含めた文字の候補
+ALPHABET = "あいうえおかきく「」（）。、ー…ッゃ\n\nab"
+
+PASSAGE = "吾輩は猫である。名前はまだ無い。「どこで生れたか」とんと見当がつかぬ。\n" * 200
+
+
+class TestCommonLength(unittest.TestCase):
+    """共通部分の長さのテスト"""
+
+    def test_prefix_and_suffix(self):
+        self.assertEqual(common_prefix_length("あいうえ", "あいかえ"), 2)
+        self.assertEqual(common_suffix_length("あいうえ", "あいかえ"), 1)
+        self.assertEqual(common_prefix_length("", "あ"), 0)
+        self.assertEqual(common_suffix_length("xあい", "yあい"), 2)
+        # 長い文字列（比較のブロックをまたぐ場合）
+        long_text = "あ" * 10000
+        self.assertEqual(common_prefix_length(long_text + "い", long_text + "う"), 10000)
+        self.assertEqual(common_suffix_length("い" + long_text, "う" + long_text), 10000)
+        # limitで重なりを防ぐ
+        self.assertEqual(common_suffix_length("ああ", "あああ", 1), 1)
+
+
+class TestIncrementalLayout(unittest.TestCase):
+    """部分的な再レイアウトのテスト"""
+
+    def test_random_edits(self):
+        """ランダムな編集を繰り返しても最初から計算した場合と同じ行になる"""
+        rnd = random.Random(0)
+        for _ in range(300):
+            incremental = IncrementalLayout()
+            line_feed = rnd.randint(1, 8)
+            text = "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 60)))
+            for _ in range(10):
+                start = rnd.randint(0, len(text))
+                end = min(len(text), start + rnd.randint(0, 4))
+                inserted = "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 4)))
+                text = text[:start] + inserted + text[end:]
+                self.assertEqual(incremental.spans(text, line_feed),
+                                 list(iter_line_spans(text, line_feed)), (text, line_feed))
+
+    def test_recomputes_only_affected_columns(self):
+        """段落内の編集では、その段落の列だけ行分割をやり直す"""
+        incremental = IncrementalLayout()
+        incremental.spans(PASSAGE, 10)
+        total = incremental.computed_spans
+        edited = PASSAGE[:3000] + "猫" + PASSAGE[3000:]
+        spans = incremental.spans(edited, 10)
+        self.assertEqual(spans, list(iter_line_spans(edited, 10)))
+        self.assertLessEqual(incremental.computed_spans, 4)
+        self.assertEqual(incremental.computed_spans + incremental.reused_spans, len(spans))
+        self.assertGreater(total, 500)
+
+    def test_same_text_and_line_feed_change(self):
+        """同じテキストは再計算せず、強制改行文字数が変われば全体を計算する"""
+        incremental = IncrementalLayout()
+        incremental.spans(PASSAGE, 10)
+        incremental.spans(PASSAGE, 10)
+        self.assertEqual(incremental.computed_spans, 0)
+        spans = incremental.spans(PASSAGE, 12)
+        self.assertEqual(incremental.computed_spans, len(spans))
+        self.assertEqual(spans, list(iter_line_spans(PASSAGE, 12)))
+
+    def test_layout_matches_compute_layout(self):
+        """レイアウトの結果はcompute_layoutと同じで、同じ引数なら同じオブジェクトを返す"""
+        incremental = IncrementalLayout()
+        incremental.layout("あいう\nえお", 20, 1.5, 1.0, 2)
+        layout = incremental.layout("あいう\nえおか", 20, 1.5, 1.0, 2, "left_to_right")
+        expected = compute_layout("あいう\nえおか", 20, 1.5, 1.0, 2, "left_to_right")
+        self.assertIsInstance(layout, LayoutResult)
+        self.assertEqual([repr(column) for column in layout.columns],
+                         [repr(column) for column in expected.columns])
+        self.assertEqual((layout.width, layout.height), (expected.width, expected.height))
+        self.assertIs(incremental.layout("あいう\nえおか", 20, 1.5, 1.0, 2, "left_to_right"), layout)
+
+    def test_svg_after_edit(self):
+        """列ごとのキャッシュを使っても、編集後のSVGは最初から生成した場合と同じ"""
+        clear_svg_cache()
+        incremental = IncrementalLayout()
+        params = ("Noto Serif CJK JP", 400, "#000000", False)
+        generate_svg_from_layout(incremental.layout(PASSAGE, 24, 1.2, 1.2, 10), *params)
+        edited = PASSAGE.replace("名前", "なまえ&", 1)
+        svg = generate_svg_from_layout(incremental.layout(edited, 24, 1.2, 1.2, 10), *params)
+        clear_svg_cache()
+        self.assertEqual(svg, generate_svg_from_layout(
+            LayoutResult(edited, 24, 1.2, 1.2, 10), *params))
+
+
+    def test_column_cache_right_to_left(self):
+        """右から左で列が増えても、変わっていない列はキャッシュから書き出す"""
+        clear_svg_cache()
+        incremental = IncrementalLayout()
+        params = ("Noto Serif CJK JP", 400, "#000000", False)
+        text = "".join(f"{index:05d}番目の行です。\n" for index in range(300))
+        generate_svg_from_layout(incremental.layout(text, 24, 1.2, 1.2, 20), *params)
+        before = _column_tspan.cache_info()
+
+        edited = "新しい行\n" + text
+        svg = generate_svg_from_layout(incremental.layout(edited, 24, 1.2, 1.2, 20), *params)
+        after = _column_tspan.cache_info()
+        self.assertEqual(after.misses - before.misses, 1)
+        self.assertEqual(after.hits - before.hits, 300)
+
+        clear_svg_cache()
+        self.assertEqual(svg, generate_svg_from_layout(
+            LayoutResult(edited, 24, 1.2, 1.2, 20), *params))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Kritaへの一括追加のテスト（モック版）
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import unittest
+import xml.etree.ElementTree as ET
+from unittest.mock import MagicMock
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from insertion import (insert_text_blocks, resolve_target_layer, ProjectionRefresher, DEFAULT_LAYER_NAME,
+                       TARGET_NEW_LAYER, TARGET_ACTIVE_LAYER, TARGET_NAMED_LAYER)
+from svg_writer import generate_batch_svg
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+ENTRIES = [
+    ("吹き出し一", {"font_size": 20}, (100, 80)),
+    ("吹き出し二\n二行目", {"font_size": 30, "text_color": "#ff0000"}, (400, 10)),
+    ("三", {}, (0, 0)),
+]
+
+
+class TestBatchSVG(unittest.TestCase):
+    """一括生成のSVGのテスト"""
+
+    def test_text_elements(self):
+        """テキストごとにtext要素が出力される"""
+        root = ET.fromstring(generate_batch_svg(ENTRIES))
+        texts = root.findall(SVG_NS + "text")
+        self.assertEqual(len(texts), 3)
+        self.assertEqual(texts[1].get("fill"), "#ff0000")
+        self.assertIn("font-size: 24", texts[2].get("style"))
+
+    def test_positions(self):
+        """位置がテキストの外接矩形の左上になる（xは列の中心線、yは最初の文字の上端）"""
+        root = ET.fromstring(generate_batch_svg(ENTRIES))
+        first = root.find(SVG_NS + "text").find(SVG_NS + "tspan")
+        self.assertEqual((first.get("x"), first.get("y")), ("110", "80"))
+
+    def test_canvas_size(self):
+        """キャンバスがすべてのテキストを含む"""
+        root = ET.fromstring(generate_batch_svg(ENTRIES))
+        # 右端は2つ目のテキスト：2列（幅 36 + 30）
+        self.assertEqual(root.get("width"), str(400 + 66 + 50))
+        # 下端は1つ目のテキスト：5文字（高さ 4 × 24 + 20）
+        self.assertEqual(root.get("height"), str(80 + 116 + 50))
+
+    def test_writers_identical(self):
+        """書き出し方式によらず出力が同じ"""
+        self.assertEqual(generate_batch_svg(ENTRIES, "fast"), generate_batch_svg(ENTRIES, "etree"))
+
+    def test_unknown_parameter(self):
+        """不明な設定はエラーになる"""
+        with self.assertRaises(ValueError):
+            generate_batch_svg([("あ", {"size": 10}, (0, 0))])
+
+
+class TestInsertTextBlocks(unittest.TestCase):
+    """一括追加のテスト"""
+
+    def test_single_parse_and_refresh(self):
+        """1つのレイヤーに1回のaddShapesFromSvgと1回の再描画で追加する"""
+        doc = MagicMock()
+        layer, shapes = insert_text_blocks(doc, ENTRIES)
+
+        doc.createVectorLayer.assert_called_once_with(DEFAULT_LAYER_NAME)
+        self.assertIs(layer, doc.createVectorLayer.return_value)
+        layer.addShapesFromSvg.assert_called_once()
+        layer.updateProjection.assert_called_once()
+        doc.refreshProjection.assert_called_once()
+
+        svg_content = layer.addShapesFromSvg.call_args[0][0]
+        self.assertEqual(svg_content.count("<text "), 3)
+
+    def test_existing_layer(self):
+        """レイヤーを指定した場合は新しいレイヤーを作らない"""
+        doc = MagicMock()
+        target = MagicMock()
+        layer, _ = insert_text_blocks(doc, ENTRIES, layer=target)
+        self.assertIs(layer, target)
+        doc.createVectorLayer.assert_not_called()
+
+    def test_empty(self):
+        """テキストが無い場合は何もしない"""
+        doc = MagicMock()
+        self.assertEqual(insert_text_blocks(doc, []), (None, []))
+        doc.createVectorLayer.assert_not_called()
+
+
+class TestResolveTargetLayer(unittest.TestCase):
+    """追加先のレイヤーの決定のテスト"""
+
+    def make_node(self, node_type):
+        node = MagicMock()
+        node.type.return_value = node_type
+        return node
+
+    def test_new_layer(self):
+        """既定では毎回新しいレイヤーを作成する"""
+        doc = MagicMock()
+        layer, created = resolve_target_layer(doc, TARGET_NEW_LAYER)
+        self.assertTrue(created)
+        doc.createVectorLayer.assert_called_once_with(DEFAULT_LAYER_NAME)
+        doc.rootNode.return_value.addChildNode.assert_called_once_with(layer, None)
+
+    def test_active_vector_layer(self):
+        """アクティブなベクターレイヤーに追加する"""
+        doc = MagicMock()
+        active = self.make_node("vectorlayer")
+        doc.activeNode.return_value = active
+        self.assertEqual(resolve_target_layer(doc, TARGET_ACTIVE_LAYER), (active, False))
+        doc.createVectorLayer.assert_not_called()
+
+    def test_active_paint_layer(self):
+        """アクティブなレイヤーがベクターレイヤーでなければ作成する"""
+        doc = MagicMock()
+        doc.activeNode.return_value = self.make_node("paintlayer")
+        _, created = resolve_target_layer(doc, TARGET_ACTIVE_LAYER)
+        self.assertTrue(created)
+
+    def test_named_layer(self):
+        """名前で指定したレイヤーが無ければその名前で作成する"""
+        doc = MagicMock()
+        named = self.make_node("vectorlayer")
+        doc.nodeByName.side_effect = lambda name: named if name == "写植" else None
+        self.assertEqual(resolve_target_layer(doc, TARGET_NAMED_LAYER, "写植"), (named, False))
+
+        _, created = resolve_target_layer(doc, TARGET_NAMED_LAYER, "2ページ")
+        self.assertTrue(created)
+        doc.createVectorLayer.assert_called_once_with("2ページ")
+
+    def test_unknown_target(self):
+        """不明な追加先はエラーになる"""
+        with self.assertRaises(ValueError):
+            resolve_target_layer(MagicMock(), "somewhere")
+
+
+class KritaWrapper:
+    """Kritaのラッパー（同じオブジェクトを指すものは==で等しいが、同一ではない）"""
+
+    def __init__(self, target):
+        self.target = target
+
+    def __eq__(self, other):
+        return isinstance(other, KritaWrapper) and other.target is self.target
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+
+class TestProjectionRefresher(unittest.TestCase):
+    """表示の更新をまとめる処理のテスト"""
+
+    def test_immediate(self):
+        """遅延しない場合は要求ごとに更新する"""
+        doc, layer = MagicMock(), MagicMock()
+        refresher = ProjectionRefresher()
+        refresher.request(doc, layer)
+        refresher.request(doc, layer)
+        self.assertEqual(doc.refreshProjection.call_count, 2)
+
+    def test_deferred(self):
+        """遅延する場合はflushでドキュメントごとに1回だけ更新する"""
+        doc, other_doc = MagicMock(), MagicMock()
+        layers = [MagicMock(), MagicMock()]
+        refresher = ProjectionRefresher(deferred=True)
+        for _ in range(5):
+            for layer in layers:
+                refresher.request(doc, layer)
+        refresher.request(other_doc, layers[0])
+        doc.refreshProjection.assert_not_called()
+        self.assertEqual(refresher.pending(), 3)
+
+        refresher.flush()
+        doc.refreshProjection.assert_called_once()
+        other_doc.refreshProjection.assert_called_once()
+        for layer in layers:
+            self.assertEqual(layer.updateProjection.call_count, 2 if layer is layers[0] else 1)
+        self.assertEqual(refresher.pending(), 0)
+
+    def test_deferred_equal_wrappers(self):
+        """呼び出しごとに別のラッパーが返っても、同じドキュメントは1回だけ更新する"""
+        doc, layer = MagicMock(), MagicMock()
+        refresher = ProjectionRefresher(deferred=True)
+        for _ in range(4):
+            refresher.request(KritaWrapper(doc), KritaWrapper(layer))
+        refresher.request(KritaWrapper(doc), KritaWrapper(MagicMock()))
+        self.assertEqual(refresher.pending(), 2)
+
+        refresher.flush()
+        doc.refreshProjection.assert_called_once()
+        layer.updateProjection.assert_called_once()
+
+    def test_batch(self):
+        """batchの間の追加は抜けた時に1回だけ更新する"""
+        doc = MagicMock()
+        refresher = ProjectionRefresher()
+        with refresher.batch():
+            for _ in range(3):
+                insert_text_blocks(doc, ENTRIES[:1], refresher=refresher)
+            with refresher.batch():
+                insert_text_blocks(doc, ENTRIES[1:], refresher=refresher)
+            doc.refreshProjection.assert_not_called()
+        doc.refreshProjection.assert_called_once()
+        self.assertFalse(refresher.deferred)
+
+
+if __name__ == "__main__":
+    unittest.main()
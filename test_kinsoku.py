@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+禁則処理（kinsoku）のテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from kinsoku import char_class, can_break_between, LINE_START_PROHIBITED, LINE_END_PROHIBITED
+from layout import split_text_into_lines
+
+
+class TestCharClass(unittest.TestCase):
+    """文字クラス表のテスト"""
+
+    def test_classes(self):
+        """代表的な文字のクラス"""
+        self.assertEqual(char_class('「'), 'opening_bracket')
+        self.assertEqual(char_class('』'), 'closing_bracket')
+        self.assertEqual(char_class('。'), 'full_stop')
+        self.assertEqual(char_class('、'), 'comma')
+        self.assertEqual(char_class('ー'), 'prolonged_sound_mark')
+        self.assertEqual(char_class('ょ'), 'small_kana')
+        self.assertEqual(char_class('ㇷ'), 'small_kana')
+        self.assertIsNone(char_class('あ'))
+
+    def test_prohibited_sets(self):
+        """行頭・行末禁則文字"""
+        self.assertIn('っ', LINE_START_PROHIBITED)
+        self.assertIn('！', LINE_START_PROHIBITED)
+        self.assertIn('（', LINE_END_PROHIBITED)
+        self.assertNotIn('（', LINE_START_PROHIBITED)
+
+    def test_can_break_between(self):
+        """2文字の間の改行可否"""
+        self.assertTrue(can_break_between('あ', 'い'))
+        self.assertFalse(can_break_between('あ', '」'))
+        self.assertFalse(can_break_between('「', 'あ'))
+        self.assertFalse(can_break_between('…', '…'))
+
+
+class TestLineBreaking(unittest.TestCase):
+    """禁則を考慮した行分割のテスト"""
+
+    def test_hanging_punctuation(self):
+        """句読点は行末にぶら下げる"""
+        self.assertEqual(split_text_into_lines("こんにちは。世界", 5), ["こんにちは。", "世界"])
+
+    def test_line_start_prohibited(self):
+        """行頭禁則文字は前の文字と一緒に次の行へ追い出す"""
+        self.assertEqual(split_text_into_lines("あいうえおっと", 5), ["あいうえ", "おっと"])
+        self.assertEqual(split_text_into_lines("スト『です』", 5), ["スト『で", "す』"])
+
+    def test_line_end_prohibited(self):
+        """始め括弧は行末に置かない"""
+        self.assertEqual(split_text_into_lines("あいう「えお」", 4), ["あいう", "「えお」"])
+
+    def test_hanging_followed_by_closing_bracket(self):
+        """句点の後に閉じ括弧が続く場合はぶら下げずに追い出す"""
+        self.assertEqual(split_text_into_lines("あいうえ。」か", 4), ["あいう", "え。」か"])
+
+    def test_inseparable(self):
+        """連続する分離禁止文字は分割しない"""
+        self.assertEqual(split_text_into_lines("あい……", 3), ["あい", "……"])
+
+    def test_all_prohibited(self):
+        """行全体が禁則文字の場合は行を延ばす"""
+        self.assertEqual(split_text_into_lines("」」」あ", 1), ["」」」", "あ"])
+
+    def test_manual_newline(self):
+        """改行文字による手動改行には禁則を適用しない"""
+        self.assertEqual(split_text_into_lines("あいう\n。えお", 5), ["あいう", "。えお"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Qtに依存しないレイアウトコア（layout / svg_writer）のテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import subprocess
+import types
+import unittest
+from unittest.mock import patch
+import xml.etree.ElementTree as ET
+
+# プラグインディレクトリをパスに追加
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text')
+sys.path.insert(0, PLUGIN_DIR)
+
+from layout import (split_text_into_lines, iter_lines, iter_line_spans, measure_lines,
+                    compute_layout, LayoutResult)
+from svg_writer import generate_vertical_text_svg, generate_svg_from_layout, svg_font_family
+from fonts import AdvanceMetrics
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+
+class HalfWidthMetrics(AdvanceMetrics):
+    """回転する文字をすべて0.5emとするメトリクス（テスト用）"""
+
+    def measure(self, char):
+        return 0.5
+
+
+class TestSplitTextIntoLines(unittest.TestCase):
+    """行分割のテスト"""
+
+    def test_basic(self):
+        """基本的なテキスト分割テスト"""
+        self.assertEqual(split_text_into_lines("こんにちは世界", 5), ["こんにちは", "世界"])
+
+    def test_newlines(self):
+        """改行文字を含むテキスト分割テスト"""
+        self.assertEqual(split_text_into_lines("こんにちは\n世界\nテスト", 10),
+                         ["こんにちは", "世界", "テスト"])
+
+    def test_empty(self):
+        """空のテキスト分割テスト"""
+        self.assertEqual(split_text_into_lines("", 5), [])
+
+    def test_iter_lines_is_generator(self):
+        """行を逐次返すジェネレーターであること"""
+        lines = iter_lines("こんにちは世界", 5)
+        self.assertIsInstance(lines, types.GeneratorType)
+        self.assertEqual(next(lines), "こんにちは")
+
+    def test_line_spans(self):
+        """改行位置がインデックスで返ること"""
+        text = "あいう\n\nえおかき"
+        self.assertEqual(list(iter_line_spans(text, 3)), [(0, 3), (5, 8), (8, 9)])
+
+    def test_measure_lines(self):
+        """行数と最長行の文字数"""
+        self.assertEqual(measure_lines("こんにちは。世界", 5), (2, 6))
+        self.assertEqual(measure_lines("", 5), (0, 0))
+
+
+class TestLayoutResult(unittest.TestCase):
+    """レイアウト計算結果のテスト"""
+
+    def test_columns_right_to_left(self):
+        """右から左では最初の行が右端に配置される"""
+        layout = compute_layout("あいう\nえお", 20, 1.5, 1.0, 10, "right_to_left")
+        self.assertEqual([layout.column_text(c) for c in layout.columns], ["あいう", "えお"])
+        self.assertEqual([c.x for c in layout.columns], [30, 0])
+
+    def test_columns_left_to_right(self):
+        """左から右では最初の行が左端に配置される"""
+        layout = compute_layout("あいう\nえお", 20, 1.5, 1.0, 10, "left_to_right")
+        self.assertEqual([c.x for c in layout.columns], [0, 30])
+
+    def test_glyph_positions(self):
+        """文字の座標に字送りが適用される"""
+        layout = compute_layout("あい", 20, 1.0, 1.5, 10, "right_to_left")
+        self.assertEqual(list(layout.iter_glyphs()), [(0, "あ", 10, 0), (0, "い", 10, 30)])
+
+    def test_bounds(self):
+        """外接矩形"""
+        layout = compute_layout("あいう\nえお", 20, 1.5, 1.5, 10, "right_to_left")
+        self.assertEqual(layout.bounds, (0, 0, 50, 80))
+
+    def test_columns_not_kept(self):
+        """キャッシュしたレイアウトは列を保持せず、順に作成する"""
+        text = "あいうえお。\nかき\n" * 100
+        layout = compute_layout(text, 20, 1.2, 1.2, 4)
+        self.assertIsNone(layout.spans)
+        self.assertEqual(layout.column_count, len(split_text_into_lines(text, 4)))
+        self.assertEqual([c.start for c in layout.iter_columns()],
+                         [c.start for c in layout.columns])
+        self.assertEqual(len(layout.columns), layout.column_count)
+
+    def test_split_once(self):
+        """行分割はレイアウトの計算時に一度だけ行い、列・大きさ・SVGの生成ではやり直さない"""
+        text = "あいうえお。abc\nかき\n" * 50
+        layout = LayoutResult(text, 20, 1.2, 1.2, 4)
+        expected = [tuple(span) for span in iter_line_spans(text, 4)]
+        with patch("layout.iter_line_spans", side_effect=AssertionError("再分割")):
+            self.assertEqual(list(layout.iter_spans()), expected)
+            self.assertEqual(len(list(layout.iter_columns())), len(expected))
+            self.assertEqual(layout.content_size(HalfWidthMetrics()),
+                             layout.content_size(HalfWidthMetrics()))
+            generate_svg_from_layout(layout, "serif", 400, "#000000", False,
+                                     metrics=HalfWidthMetrics())
+
+    def test_cached(self):
+        """同じ設定のレイアウトは再計算しない"""
+        self.assertIs(compute_layout("あいう", 20, 1.2, 1.2, 10),
+                      compute_layout("あいう", 20, 1.2, 1.2, 10))
+
+
+class TestGenerateVerticalTextSVG(unittest.TestCase):
+    """SVG生成のテスト"""
+
+    def generate(self, text="テスト\n複数行", **kwargs):
+        params = dict(font_size=24, line_spacing=1.2, char_spacing=1.2, line_feed=10,
+                      font_family="Noto Serif CJK JP, serif", font_weight=400,
+                      text_color="#ff8040", force_monospace=False)
+        params.update(kwargs)
+        return generate_vertical_text_svg(text, **params)
+
+    def test_valid_xml(self):
+        """生成されたSVGがXMLとして解析できること"""
+        root = ET.fromstring(self.generate())
+        self.assertEqual(root.tag, SVG_NS + "svg")
+        tspans = [t.text for t in root.iter(SVG_NS + "tspan") if t.text]
+        self.assertEqual(tspans, ["テスト", "複数行"])
+
+    def test_color_string(self):
+        """色を文字列で指定できること"""
+        self.assertIn('fill="#ff8040"', self.generate())
+
+    def test_color_object(self):
+        """name()を持つオブジェクトでも色を指定できること"""
+        class Color:
+            def name(self):
+                return "#123456"
+        self.assertIn('fill="#123456"', self.generate(text_color=Color()))
+
+    def test_letter_spacing(self):
+        """文字間隔がletter-spacingとして出力される"""
+        self.assertIn('letter-spacing="4.8"', self.generate(char_spacing=1.2))
+        self.assertIn('letter-spacing="0"', self.generate(char_spacing=1.0))
+
+    def test_font_family(self):
+        """SVG用のフォント名の作成"""
+        self.assertEqual(svg_font_family("Noto Serif CJK JP, Century"), '"Noto Serif CJK JP", serif')
+        self.assertEqual(svg_font_family("Arial"), "Arial, serif")
+        self.assertEqual(svg_font_family("sans-serif"), "sans-serif")
+
+    def test_no_qt_import(self):
+        """コアモジュールがQtをインポートしないこと"""
+        code = ("import sys; sys.path.insert(0, sys.argv[1]); "
+                "import layout, svg_writer; "
+                "print(any(name.startswith('PyQt5') for name in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code, PLUGIN_DIR],
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
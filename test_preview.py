@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+プレビューの描画（preview）のテスト
+更新要求のまとめ方、字形のキャッシュ、ワーカーでの描画の世代番号による打ち切りを
+確認する（pytest-qtを使用）
+"""
+
+import sys
+import os
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from PyQt5.QtGui import QImage
+
+from layout import compute_layout
+import preview
+from preview import (GlyphCache, PreviewParams, PreviewRenderer, PreviewScheduler,
+                     renderPreviewImage)
+
+FAMILY = "Noto Serif CJK JP"
+
+
+def make_params(text="縦書き\nテキスト"):
+    return PreviewParams(compute_layout(text, 24, 1.2, 1.2, 10), FAMILY, 400, "#000000")
+
+
+# テスト用のプレビュー更新の待ち時間（ミリ秒）
+DELAY_MS = 100
+
+
+class CallRecorder:
+    """プレビュー更新の呼び出し時刻を記録する"""
+
+    def __init__(self):
+        self.times = []
+
+    def __call__(self):
+        self.times.append(time.monotonic())
+
+
+def test_scheduler_coalesces_burst(qtbot):
+    """連続した要求は待ち時間の後に一回の更新になる"""
+    recorder = CallRecorder()
+    scheduler = PreviewScheduler(recorder, DELAY_MS)
+    for _ in range(10):
+        scheduler.schedule()
+    last_request = time.monotonic()
+    assert scheduler.isPending()
+
+    qtbot.waitUntil(lambda: len(recorder.times) > 0, timeout=2000)
+    qtbot.wait(DELAY_MS * 2)
+    assert len(recorder.times) == 1
+    # QTimerの既定の精度（5%）の範囲で待ち時間より早くは実行されない
+    assert recorder.times[0] - last_request >= DELAY_MS * 0.9 / 1000
+    assert not scheduler.isPending()
+
+
+def test_scheduler_restarts_on_change(qtbot):
+    """待っている間の要求でタイマーが再始動し、最後の要求から待ち時間後に実行される"""
+    recorder = CallRecorder()
+    scheduler = PreviewScheduler(recorder, DELAY_MS)
+    scheduler.schedule()
+    qtbot.wait(DELAY_MS // 2)
+    scheduler.schedule()
+    last_request = time.monotonic()
+
+    qtbot.waitUntil(lambda: len(recorder.times) > 0, timeout=2000)
+    qtbot.wait(DELAY_MS * 2)
+    assert len(recorder.times) == 1
+    assert recorder.times[0] - last_request >= DELAY_MS * 0.9 / 1000
+
+
+def test_scheduler_cancel_and_flush(qtbot):
+    """取り消した要求は実行されず、flush()は予約済みの要求を直ちに実行する"""
+    recorder = CallRecorder()
+    scheduler = PreviewScheduler(recorder, DELAY_MS)
+    scheduler.schedule()
+    scheduler.cancel()
+    qtbot.wait(DELAY_MS * 2)
+    assert recorder.times == []
+
+    scheduler.flush()
+    assert recorder.times == []
+    scheduler.schedule()
+    scheduler.flush()
+    assert len(recorder.times) == 1
+    assert not scheduler.isPending()
+
+
+def test_glyph_cache_reuses_glyphs(qapp):
+    """同じ文字のグリフ番号は一度だけ求め、スレッドをまたいで共有する"""
+    cache = GlyphCache()
+    raw_font = cache.rawFont(FAMILY, 400, 24)
+    first = cache.glyphIndex(raw_font, FAMILY, 400, 24, "あ")
+    assert cache.glyphIndex(raw_font, FAMILY, 400, 24, "あ") == first
+    assert len(cache) == 1
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        cache.glyphIndex(cache.rawFont(FAMILY, 400, 24), FAMILY, 400, 24, "あ")))
+    thread.start()
+    thread.join()
+    assert results == [first]
+    assert len(cache) == 1
+
+
+def test_glyph_cache_raw_font_per_thread(qapp):
+    """QRawFontはスレッドごとに作成し、同じスレッドでは再利用する"""
+    cache = GlyphCache()
+    raw_font = cache.rawFont(FAMILY, 400, 24)
+    assert cache.rawFont(FAMILY, 400, 24) is raw_font
+    assert cache.rawFont(FAMILY, 700, 24) is not raw_font
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(cache.rawFont(FAMILY, 400, 24)))
+    thread.start()
+    thread.join()
+    assert others[0] is not raw_font
+
+
+def test_glyph_cache_clear(qapp):
+    """clear()でグリフ番号とQRawFontを作り直す"""
+    cache = GlyphCache()
+    raw_font = cache.rawFont(FAMILY, 400, 24)
+    cache.glyphIndex(raw_font, FAMILY, 400, 24, "あ")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.rawFont(FAMILY, 400, 24) is not raw_font
+
+
+def test_render_skips_columns_outside_image(qapp):
+    """画像の外の列は描画しない（どちらのテキスト方向でも見える列だけ描く）"""
+    text = "縦書きのテキスト\n" * 2000
+    for direction in ("right_to_left", "left_to_right"):
+        layout = compute_layout(text, 24, 1.2, 1.2, 10, direction)
+        drawn = []
+        with patch.object(preview, "_drawColumn",
+                          side_effect=lambda painter, raw_font, key, glyphs: drawn.append(glyphs)):
+            image = renderPreviewImage(PreviewParams(layout, FAMILY, 400, "#000000"), 350, 350)
+        assert image is not None
+        # 幅350pxに列の間隔28.8pxで並ぶ列（両端の一部だけ見える列を含む）
+        assert 0 < len(drawn) <= 350 / layout.column_pitch + 2
+        for glyphs in drawn:
+            x = glyphs[0][1].x()
+            assert -24 < x < 350
+
+
+def test_renderer_delivers_latest_request(qtbot):
+    """続けて要求した場合は最後の要求の画像だけが届く"""
+    renderer = PreviewRenderer()
+    images = []
+    renderer.imageReady.connect(images.append)
+
+    with qtbot.waitSignal(renderer.imageReady, timeout=5000):
+        for width in (100, 200, 300):
+            renderer.request(make_params(), width, 150)
+    renderer.waitForDone()
+    qtbot.wait(50)
+
+    assert len(images) == 1
+    assert images[0].width() == 300
+    renderer.cancel()
+
+
+def test_renderer_discards_stale_generation(qtbot):
+    """新しい要求や取り消しの後に届いた古い世代の結果は表示しない"""
+    renderer = PreviewRenderer()
+    renderer.threaded = False
+    images = []
+    renderer.imageReady.connect(images.append)
+
+    renderer.request(make_params(), 100, 100)
+    generation = renderer.generation()
+    assert not renderer.isStale(generation)
+    images.clear()
+
+    renderer.cancel()
+    assert renderer.isStale(generation)
+    renderer._onFinished(generation, QImage(10, 10, QImage.Format_ARGB32))
+    assert images == []
+
+    renderer._onFinished(renderer.generation(), QImage(10, 10, QImage.Format_ARGB32))
+    assert len(images) == 1
+
+
+def test_renderer_cancel_stops_pending_work(qtbot):
+    """取り消した要求の画像は届かない"""
+    renderer = PreviewRenderer()
+    images = []
+    renderer.imageReady.connect(images.append)
+
+    renderer.request(make_params("あ" * 20000), 350, 350)
+    renderer.cancel()
+    renderer.waitForDone()
+    qtbot.wait(50)
+    assert images == []
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+SVG書き出し方式（fast / etree）のテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import io
+import unittest
+from unittest.mock import patch
+import xml.etree.ElementTree as ET
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from layout import compute_layout
+import svg_writer
+from svg_writer import (generate_svg_from_layout, generate_vertical_text_svg, generate_batch_svg,
+                        write_svg, svg_cache_info, clear_svg_cache, SVG_MARGIN)
+from fonts import AdvanceMetrics
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+
+class HalfWidthMetrics(AdvanceMetrics):
+    """回転する文字をすべて0.5emとするメトリクス（テスト用）"""
+
+    def measure(self, char):
+        return 0.5
+
+
+class TestSVGWriters(unittest.TestCase):
+    """書き出し方式ごとの出力のテスト"""
+
+    CASES = [
+        ("こんにちは\n世界", "Noto Serif CJK JP", False, "right_to_left"),
+        ("吾輩は猫である。名前はまだ無い。" * 5, "Arial", True, "left_to_right"),
+        ('a<b&c>"d"\n\n  \nテスト', 'A "quoted" & <font>', False, "right_to_left"),
+        ("", "serif", False, "right_to_left"),
+    ]
+
+    def test_identical_output(self):
+        """fastとetreeで同一の文字列が生成されること"""
+        for text, family, monospace, direction in self.CASES:
+            with self.subTest(text=text):
+                layout = compute_layout(text, 24, 1.2, 1.3, 5, direction)
+                fast = generate_svg_from_layout(layout, family, 700, "#ff0000", monospace, "fast")
+                etree = generate_svg_from_layout(layout, family, 700, "#ff0000", monospace, "etree")
+                self.assertEqual(fast, etree)
+
+    def test_write_to_stream(self):
+        """ファイルライクオブジェクトへ直接書き出せること"""
+        layout = compute_layout("テスト", 24, 1.2, 1.2, 10)
+        out = io.StringIO()
+        write_svg(out, layout, "serif", 400, "#000000", False)
+        self.assertEqual(out.getvalue(),
+                         generate_svg_from_layout(layout, "serif", 400, "#000000", False, "etree"))
+
+    def test_writer_switch(self):
+        """書き出し方式の指定（キャッシュ済みの設定でも指定した方式で生成する）"""
+        clear_svg_cache()
+        args = ("テスト", 24, 1.2, 1.2, 10, "serif", 400, "#000000", False)
+        fast = generate_vertical_text_svg(*args)
+        with patch("svg_writer._build_etree", wraps=svg_writer._build_etree) as build_etree:
+            svg = generate_vertical_text_svg(*args, writer="etree")
+        build_etree.assert_called_once()
+        self.assertEqual(svg, fast)
+        self.assertIn("<tspan", svg)
+        with self.assertRaises(ValueError):
+            generate_vertical_text_svg("テスト", 24, 1.2, 1.2, 10, "serif", 400, "#000000",
+                                       False, writer="unknown")
+
+
+class TestSVGCache(unittest.TestCase):
+    """SVGキャッシュのテスト"""
+
+    def setUp(self):
+        clear_svg_cache()
+
+    def generate(self, **kwargs):
+        params = dict(text="テスト", font_size=24, line_spacing=1.2, char_spacing=1.2, line_feed=10,
+                      font_family="serif", font_weight=400, text_color="#FF0000",
+                      force_monospace=False)
+        params.update(kwargs)
+        return generate_vertical_text_svg(**params)
+
+    def test_hit_and_miss(self):
+        """同じ設定はキャッシュから返される"""
+        first = self.generate()
+        second = self.generate()
+        self.assertIs(first, second)
+        info = svg_cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_normalized_key(self):
+        """表記の違いだけの設定は同じキーになる"""
+        self.generate()
+        self.generate(text_color="#ff0000", font_family=" serif ", line_spacing=1.20000001)
+        self.assertEqual(svg_cache_info().hits, 1)
+
+    def test_cache_keeps_output(self):
+        """キャッシュの有無で出力が変わらない（小数のフォントサイズを切り捨てない）"""
+        cached = self.generate(text="あいう", font_size=24.6)
+        self.assertIn("font-size: 24.6", cached)
+        layout = compute_layout("あいう", 24.6, 1.2, 1.2, 10)
+        self.assertEqual(cached, generate_svg_from_layout(layout, "serif", 400, "#ff0000", False))
+
+        with patch("svg_writer.SVG_CACHE_MAX_TEXT_LENGTH", 2):
+            uncached = self.generate(text="あいう", font_size=24.6)
+        self.assertEqual(uncached, cached)
+        self.assertEqual(svg_cache_info().hits, 0)
+
+    def test_different_parameters(self):
+        """設定が異なればキャッシュされない"""
+        self.generate()
+        self.generate(text_color="#00ff00")
+        self.generate(text_direction="left_to_right")
+        self.assertEqual(svg_cache_info().misses, 3)
+
+
+class TestSVGCanvas(unittest.TestCase):
+    """キャンバスの大きさのテスト"""
+
+    def canvas(self, svg):
+        root = ET.fromstring(svg)
+        return float(root.get("width")), float(root.get("height"))
+
+    def test_tight_canvas(self):
+        """キャンバスはテキストの外接矩形に余白を加えた大きさ"""
+        layout = compute_layout("あいう\nえお", 20, 1.5, 1.2, 10)
+        width, height = self.canvas(generate_svg_from_layout(layout, "serif", 400, "#000000", False))
+        # 2列（20 + 30）、3文字（字送り24で 2 × 24 + 20）
+        self.assertEqual((width, height), (50 + SVG_MARGIN * 2, 68 + SVG_MARGIN * 2))
+
+    def test_glyphs_inside_canvas(self):
+        """大きなフォントサイズでも、すべての文字の枠がキャンバスに収まる"""
+        for font_size in (24, 80, 150):
+            for direction in ("right_to_left", "left_to_right"):
+                with self.subTest(font_size=font_size, direction=direction):
+                    layout = compute_layout("あいう\nえお\nか", font_size, 1.2, 1.2, 10, direction)
+                    root = ET.fromstring(generate_svg_from_layout(layout, "serif", 400,
+                                                                  "#000000", False))
+                    width, height = float(root.get("width")), float(root.get("height"))
+                    tspans = [tspan for tspan in root.iter(SVG_NS + "tspan") if tspan.text]
+                    self.assertEqual(len(tspans), 3)
+                    for tspan in tspans:
+                        # vertical-rlではxが列の中心線、yが最初の文字の上端
+                        x, y = float(tspan.get("x")), float(tspan.get("y"))
+                        bottom = y + (len(tspan.text) - 1) * layout.char_pitch + font_size
+                        self.assertGreaterEqual(x - font_size / 2, SVG_MARGIN - 1e-6)
+                        self.assertLessEqual(x + font_size / 2, width - SVG_MARGIN + 1e-6)
+                        self.assertGreaterEqual(y, SVG_MARGIN - 1e-6)
+                        self.assertLessEqual(bottom, height - SVG_MARGIN + 1e-6)
+
+    def test_metrics(self):
+        """メトリクスを指定すると回転する文字の送り幅と文字間隔から高さを求める"""
+        layout = compute_layout("abcd\nあい", 20, 1.5, 1.2, 10)
+        svg = generate_svg_from_layout(layout, "serif", 400, "#000000", False,
+                                       metrics=HalfWidthMetrics())
+        # 半角4文字（4 × 10）と3つの文字間隔（4 × 3）。全角の列（20 + 4 + 20）より長い
+        self.assertEqual(self.canvas(svg)[1], 52 + SVG_MARGIN * 2)
+        self.assertEqual(layout.content_size(HalfWidthMetrics()), (layout.width, 52))
+        self.assertEqual(layout.content_size(), (layout.width, layout.height))
+
+    def test_metrics_in_cache_key(self):
+        """メトリクスが異なればキャッシュを使わない"""
+        clear_svg_cache()
+        args = ("abc", 20, 1.2, 1.2, 10, "serif", 400, "#000000", False)
+        default = generate_vertical_text_svg(*args)
+        narrow = generate_vertical_text_svg(*args, metrics=HalfWidthMetrics())
+        self.assertLess(self.canvas(narrow)[1], self.canvas(default)[1])
+        self.assertEqual(svg_cache_info().misses, 2)
+
+    def test_batch_metrics(self):
+        """一括生成でもフォントごとのメトリクスでキャンバスを求める"""
+        metrics = HalfWidthMetrics()
+        fonts = []
+
+        def metrics_for(font_family, font_weight):
+            fonts.append((font_family, font_weight))
+            return metrics
+
+        entries = [("abcd", {"font_size": 20, "font_family": "serif"}, (0, 0))]
+        svg = generate_batch_svg(entries, metrics_for=metrics_for)
+        self.assertEqual(self.canvas(svg)[1], 0 + 40 + 3 * 4 + SVG_MARGIN)
+        self.assertEqual(fonts, [("serif", 400)])
+
+
+if __name__ == "__main__":
+    unittest.main()
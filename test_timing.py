@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+処理段階ごとの所要時間の計測のテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import json
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from timing import Timings, StageStats, timings
+from layout import compute_layout, IncrementalLayout
+
+
+class TestTimings(unittest.TestCase):
+    """所要時間の集計のテスト"""
+
+    def test_span(self):
+        """spanで囲んだ処理の回数と時間が記録される"""
+        t = Timings()
+        for _ in range(3):
+            with t.span("stage"):
+                pass
+        stats = t.snapshot()["stages"]["stage"]
+        self.assertEqual(stats["count"], 3)
+        self.assertGreaterEqual(stats["max_ms"], stats["min_ms"])
+        self.assertEqual(sum(bucket["count"] for bucket in stats["histogram"]), 3)
+
+    def test_disabled(self):
+        """無効の場合は何も記録せず、共通のコンテキストマネージャーを返す"""
+        t = Timings(enabled=False)
+        self.assertIs(t.span("a"), t.span("b"))
+        with t.span("a"):
+            pass
+        self.assertEqual(t.stages(), [])
+
+    def test_histogram(self):
+        """所要時間が区間ごとに数えられる"""
+        stats = StageStats()
+        for elapsed in (0.05, 0.8, 0.9, 3000):
+            stats.add(elapsed)
+        self.assertEqual(stats.buckets[0], 1)
+        self.assertEqual(stats.buckets[3], 2)
+        self.assertEqual(stats.buckets[-1], 1)
+        self.assertEqual(stats.percentile(0.5), 1)
+        self.assertEqual(stats.percentile(1.0), 3000)
+
+    def test_json(self):
+        """集計結果をJSONとして出力できる"""
+        t = Timings()
+        t.record("svg", 1.5)
+        data = json.loads(t.to_json())
+        self.assertEqual(data["stages"]["svg"]["count"], 1)
+        t.reset()
+        self.assertEqual(json.loads(t.to_json())["stages"], {})
+
+    def test_layout_instrumented(self):
+        """レイアウト計算が共有の計測結果に記録される"""
+        timings.reset()
+        compute_layout("計測対象のテキスト" * 7, 24, 1.2, 1.2, 10)
+        self.assertIn("layout", timings.stages())
+
+    def test_split_lines_instrumented(self):
+        """行分割はレイアウトの計算（通常・差分）の中でsplit_linesとして記録される"""
+        timings.reset()
+        compute_layout.cache_clear()
+        compute_layout("行分割の計測" * 9, 24, 1.2, 1.2, 10)
+        self.assertEqual(timings.snapshot()["stages"]["split_lines"]["count"], 1)
+        IncrementalLayout().layout("行分割の計測" * 9, 24, 1.2, 1.2, 10)
+        self.assertEqual(timings.snapshot()["stages"]["split_lines"]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+縦書き用の字形への置き換え（vertical_forms）のテスト
+PyQt5やKritaが無い環境でも実行可能
+"""
+
+import sys
+import os
+import random
+import unittest
+
+# プラグインディレクトリをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'r_vertical_text'))
+
+from vertical_forms import (VERTICAL_FORMS, to_vertical_forms, apply_vertical_forms,
+                            VERTICAL_FORMS_NONE, VERTICAL_FORMS_SUBSTITUTE,
+                            VERTICAL_FORMS_ORIENTATION, DEFAULT_VERTICAL_FORMS)
+from kinsoku import char_class
+from layout import split_text_into_lines, compute_layout
+from svg_writer import (generate_vertical_text_svg, generate_svg_from_layout, generate_batch_svg,
+                        DEFAULT_TEXT_PARAMS)
+
+
+class TestVerticalForms(unittest.TestCase):
+    """置き換え表のテスト"""
+
+    def test_substitute(self):
+        """句読点・括弧・長音記号が縦書き用の表示形になること"""
+        self.assertEqual(to_vertical_forms("「はい、そうです。」"), "﹁はい︑そうです︒﹂")
+        self.assertEqual(to_vertical_forms("ラーメン（大盛り）…"), "ラ︱メン︵大盛り︶︙")
+        self.assertEqual(to_vertical_forms("漢字とかな"), "漢字とかな")
+
+    def test_wave_dash_not_mapped(self):
+        """縦書き用の表示形が無い波ダッシュは置き換えない（≀は数学記号）"""
+        self.assertEqual(to_vertical_forms("あ〜い～"), "あ〜い～")
+        self.assertNotIn("≀", VERTICAL_FORMS.values())
+
+    def test_single_pass(self):
+        """置き換えた文字が再び置き換えられないこと（表の値はキーに含まれない）"""
+        self.assertFalse(set(VERTICAL_FORMS.values()) & set(VERTICAL_FORMS))
+        text = "".join(VERTICAL_FORMS)
+        self.assertEqual(to_vertical_forms(to_vertical_forms(text)), to_vertical_forms(text))
+
+    def test_modes(self):
+        """置き換えるのはVERTICAL_FORMS_SUBSTITUTEの場合だけ"""
+        text = "はい。"
+        self.assertEqual(apply_vertical_forms(text, VERTICAL_FORMS_SUBSTITUTE), "はい︒")
+        self.assertEqual(apply_vertical_forms(text, VERTICAL_FORMS_NONE), text)
+        self.assertEqual(apply_vertical_forms(text, VERTICAL_FORMS_ORIENTATION), text)
+        with self.assertRaises(ValueError):
+            apply_vertical_forms(text, "vertical")
+
+    def test_kinsoku_classes(self):
+        """縦書き用の表示形も元の文字と同じ禁則のクラスになること"""
+        for char, vertical in VERTICAL_FORMS.items():
+            if char_class(char) is not None:
+                self.assertEqual(char_class(vertical), char_class(char), char)
+
+    def test_same_line_breaks(self):
+        """置き換えの前後で行分割の位置が変わらないこと"""
+        rng = random.Random(25)
+        alphabet = "あいうかきく漢字\n" + "".join(VERTICAL_FORMS)
+        for _ in range(200):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+            line_feed = rng.randint(1, 12)
+            original = [len(line) for line in split_text_into_lines(text, line_feed)]
+            vertical = [len(line) for line in
+                        split_text_into_lines(to_vertical_forms(text), line_feed)]
+            self.assertEqual(vertical, original, (text, line_feed))
+
+
+class TestVerticalFormsSVG(unittest.TestCase):
+    """SVG生成での縦書き用の字形のテスト"""
+
+    ARGS = (24, 1.2, 1.2, 10, "Noto Serif CJK JP", 400, "#000000", False)
+
+    def test_same_default_everywhere(self):
+        """省略時の扱いはSVG生成・一括生成・レイアウト済みからの生成で同じ"""
+        self.assertEqual(DEFAULT_TEXT_PARAMS["vertical_forms"], DEFAULT_VERTICAL_FORMS)
+        svg = generate_vertical_text_svg("はい。", *self.ARGS)
+        self.assertEqual(svg, generate_vertical_text_svg(
+            "はい。", *self.ARGS, vertical_forms=DEFAULT_VERTICAL_FORMS))
+        layout = compute_layout(apply_vertical_forms("はい。"), *self.ARGS[:4])
+        self.assertEqual(svg, generate_svg_from_layout(layout, *self.ARGS[4:]))
+
+    def test_substitute(self):
+        svg = generate_vertical_text_svg("はい。", *self.ARGS, vertical_forms=VERTICAL_FORMS_SUBSTITUTE)
+        self.assertIn("︒", svg)
+        self.assertNotIn("。", svg)
+        self.assertNotIn("glyph-orientation-vertical", svg)
+
+    def test_none(self):
+        svg = generate_vertical_text_svg("はい。", *self.ARGS, vertical_forms=VERTICAL_FORMS_NONE)
+        self.assertIn("。", svg)
+
+    def test_orientation(self):
+        """文字は置き換えず、文字の向きの属性を出力すること（書き出し方式によらない）"""
+        for writer in ("fast", "etree"):
+            svg = generate_vertical_text_svg("はい。", *self.ARGS, writer=writer,
+                                             vertical_forms=VERTICAL_FORMS_ORIENTATION)
+            self.assertIn("。", svg)
+            self.assertIn('glyph-orientation-vertical="auto"', svg)
+            self.assertIn("text-orientation: mixed", svg)
+
+    def test_batch_default(self):
+        """一括生成は設定を省略すると置き換えること"""
+        svg = generate_batch_svg([("はい。", {}, (0, 0)),
+                                  ("いいえ。", {"vertical_forms": VERTICAL_FORMS_NONE}, (100, 0))])
+        self.assertEqual(svg.count("︒"), 1)
+        self.assertEqual(svg.count("。"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,6 +11,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QColor
 from r_vertical_text.r_vertical_text import VerticalTextDialog
+from r_vertical_text.font_model import font_weight_resolver
+from r_vertical_text.fonts import FONT_WEIGHTS
 
 def test_weight_control():
     """フォントウェイト制御機能のテスト"""
@@ -78,5 +80,25 @@ def test_weight_control():
     print("=== フォントウェイト制御機能のテスト完了 ===")
     print("✅ すべてのテストが成功しました！")
 
+def test_partial_family_names_not_cached():
+    """入力途中のフォント名はウェイトを調べず、保持もしない"""
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+
+    dialog = VerticalTextDialog()
+    family = dialog.font_model.fonts()[0]
+    font_weight_resolver.clear()
+    partial_names = [family[:length] for length in range(1, len(family))
+                     if family[:length] not in dialog.font_model.prefixIndex()]
+    for name in partial_names:
+        assert dialog.availableWeights(name) == FONT_WEIGHTS
+    assert len(font_weight_resolver) == 0
+
+    # 一覧にあるフォント名だけを調べて保持する
+    dialog.availableWeights(family)
+    assert len(font_weight_resolver) == 1
+    dialog.close()
+
 if __name__ == "__main__":
     test_weight_control()